@@ -0,0 +1,95 @@
+"""
+File: bench_normalization.py
+
+Purpose:
+    Micro-benchmark of the inference-time text steps in question_processing: normalize_question
+    and smart_fix_sql, before (one str.replace / re.sub / keyword scan at a time, copied below
+    as the legacy versions) and after (precompiled alias regex, precompiled SQL patterns and a
+    single keyword regex with a dispatch table).
+
+    The questions and SQL of a Text-to-SQL split are used as input. Each SQL is also run in a
+    few damaged forms (dropped ANDs, repeated words, flipped comparison) so every rule fires.
+    Outputs of both versions are compared first; the timings are only printed when they agree.
+
+Usage:
+    python bench_normalization.py
+    python bench_normalization.py --data data/processing/phase1/test_text2sql.json --repeat 20
+"""
+
+import argparse
+import json
+import re
+import time
+
+from realestate_text_to_sql_modules.question_processing import HCM_ALIASES, normalize_question, smart_fix_sql
+
+DATA_PATH = "data/processing/phase2/test_text2sql.json"
+
+def legacy_normalize_question(text: str) -> str:
+    text = text.lower().strip()
+    for alias in HCM_ALIASES:
+        if alias in text:
+            text = text.replace(alias, "hồ chí minh")
+    return text
+
+def legacy_smart_fix_sql(sql: str, question: str = "") -> str:
+    sql = re.sub(r"(\d[\)']?)\s+([a-zA-Z_]+\s*=)", r"\1 AND \2", sql)
+    sql = re.sub(r"(\d[\)']?)\s+([a-zA-Z_]+\s*[><])", r"\1 AND \2", sql)
+    sql = re.sub(r"\b(\w+)\b(?:\s+\1\b)+", r"\1", sql)
+    if "từ" in question and "đến" in question:
+        m = re.search(r"price\s*>=\s*(\d+\.?\d*)\s*AND\s*price\s*<=\s*(\d+\.?\d*)", sql)
+        if m:
+            x, y = m.groups()
+            sql = re.sub(
+                r"price\s*>=\s*\d+\.?\d*\s*AND\s*price\s*<=\s*\d+\.?\d*",
+                f"price BETWEEN {x} AND {y}",
+                sql
+            )
+    if any(k in question for k in ['dưới', 'ít hơn', 'rẻ hơn', 'thấp hơn']):
+        sql = re.sub(r"(price|quantity)\s*>=\s*(\d+)", r"\1 < \2", sql)
+    if any(k in question for k in ['trên', 'nhiều hơn', 'cao hơn', 'đắt hơn']):
+        sql = re.sub(r"(price|quantity)\s*<=\s*(\d+)", r"\1 > \2", sql)
+    return sql
+
+def damaged_variants(sql: str) -> list:
+    """The SQL plus versions with the mistakes smart_fix_sql repairs."""
+    return [
+        sql,
+        sql.replace(" AND ", " "),
+        re.sub(r"\b(WHERE|price)\b", r"\1 \1", sql),
+        sql.replace("<", ">=").replace("BETWEEN", ">="),
+    ]
+
+def time_per_call_us(fn, args_list, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for args in args_list:
+            fn(*args)
+    return (time.perf_counter() - start) / (repeat * len(args_list)) * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark normalize_question / smart_fix_sql before and after precompilation.")
+    parser.add_argument("--data", default=DATA_PATH, help="Text-to-SQL JSON file with Question / SQL records.")
+    parser.add_argument("--repeat", type=int, default=10, help="Passes over the inputs per timing.")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    questions = [(r["Question"],) for r in records]
+    fix_inputs = [(sql, normalize_question(r["Question"])) for r in records for sql in damaged_variants(r["SQL"])]
+
+    stages = [
+        ("normalize_question", legacy_normalize_question, normalize_question, questions),
+        ("smart_fix_sql", legacy_smart_fix_sql, smart_fix_sql, fix_inputs),
+    ]
+    for name, legacy_fn, new_fn, inputs in stages:
+        mismatches = [a for a in inputs if legacy_fn(*a) != new_fn(*a)]
+        if mismatches:
+            print(f"[WARN] {name}: {len(mismatches)} / {len(inputs)} outputs differ, e.g. {mismatches[0]!r}")
+            continue
+        before = time_per_call_us(legacy_fn, inputs, args.repeat)
+        after = time_per_call_us(new_fn, inputs, args.repeat)
+        print(f"[INFO] {name:<20} {len(inputs):>6} inputs  before {before:7.2f} µs  after {after:7.2f} µs  ({before / after:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+File: bench_padding.py
+
+Purpose:
+    Measure what fixed-length padding costs in training, compared with unpadded storage,
+    length-grouped batches and per-batch padding (realestate_text_to_sql_modules.training_data).
+
+Steps:
+    1. Tokenize a Text-to-SQL split with the model's tokenizer, once padded to 512 / 128 as in the
+       notebooks' tokenize_fn and once unpadded.
+    2. Print the padding-waste ratio (padded positions / all positions) of the encoder and decoder
+       for: fixed-length padding (before), per-batch padding with random batches, and per-batch
+       padding with length-grouped batches (after).
+    3. Run --steps optimizer steps (forward + backward + AdamW) on CPU for the fixed-length and the
+       length-grouped setups and print steps per second and the speedup.
+
+Usage:
+    python bench_padding.py
+    python bench_padding.py --model-dir model/Phase1_CEonly --data data/processing/phase2/train_text2sql.json --steps 20
+"""
+
+import argparse
+import json
+import time
+
+import torch
+from datasets import Dataset as HFDataset
+from transformers import T5ForConditionalGeneration, T5Tokenizer, default_data_collator
+
+from realestate_text_to_sql_modules.inference_engine import MODEL_DIR
+from realestate_text_to_sql_modules.training_data import (
+    MAX_INPUT_LENGTH,
+    MAX_TARGET_LENGTH,
+    PAD_TO_MULTIPLE_OF,
+    length_grouped_batches,
+    make_collator,
+    padding_waste,
+    random_batches,
+    to_seq2seq_examples,
+    tokenize_dataset,
+)
+
+DATA_PATH = "data/processing/phase2/train_text2sql.json"
+
+def print_waste(name: str, report: dict) -> None:
+    print(f"       {name:<34} encoder {report['encoder_waste']:6.1%}  decoder {report['decoder_waste']:6.1%}  "
+          f"total {report['waste']:6.1%}  ({report['encoder_positions'] + report['decoder_positions']:,} positions)")
+
+def spread(batches: list, k: int) -> list:
+    """k batches evenly spaced over the list."""
+    return [batches[i * len(batches) // k] for i in range(min(k, len(batches)))]
+
+def steps_per_second(model, batches, steps: int, warmup: int = 2) -> float:
+    """Time `steps` training steps (after `warmup` untimed ones) over the given batches."""
+    optimizer = torch.optim.AdamW(model.parameters(), lr=3e-4)
+    model.train()
+    for i in range(warmup + steps):
+        if i == warmup:
+            start = time.perf_counter()
+        batch = batches[i % len(batches)]
+        loss = model(**batch).loss
+        loss.backward()
+        optimizer.step()
+        optimizer.zero_grad()
+    return steps / (time.perf_counter() - start)
+
+def main():
+    parser = argparse.ArgumentParser(description="Padding waste and CPU training speed: fixed-length vs length-grouped padding.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Checkpoint with the tokenizer and model to train.")
+    parser.add_argument("--data", default=DATA_PATH, help="Text-to-SQL JSON split (Question / Schema / SQL).")
+    parser.add_argument("--limit", type=int, default=2000, help="Examples used for the waste report.")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--steps", type=int, default=10, help="Timed training steps per setup.")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads().")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    with open(args.data, "r", encoding="utf-8") as f:
+        records = json.load(f)[:args.limit]
+    tokenizer = T5Tokenizer.from_pretrained(args.model_dir)
+    dataset = HFDataset.from_list(to_seq2seq_examples(records))
+    padded = tokenize_dataset(dataset, tokenizer, padded=True)
+    unpadded = tokenize_dataset(dataset, tokenizer)
+
+    input_lengths = unpadded["length"]
+    target_lengths = [len(ids) for ids in unpadded["labels"]]
+    n = len(unpadded)
+    shuffled = random_batches(n, args.batch_size, args.seed)
+    grouped = length_grouped_batches(input_lengths, args.batch_size, args.seed)
+    print(f"[INFO] {n} examples, input tokens mean {sum(input_lengths) / n:.1f} / max {max(input_lengths)}, "
+          f"target tokens mean {sum(target_lengths) / n:.1f} / max {max(target_lengths)}")
+    print("[INFO] Padding waste (padded positions / all positions):")
+    before = padding_waste(input_lengths, target_lengths, shuffled, MAX_INPUT_LENGTH, MAX_TARGET_LENGTH)
+    print_waste(f"before: fixed {MAX_INPUT_LENGTH} / {MAX_TARGET_LENGTH}", before)
+    print_waste("per-batch, random batches",
+                padding_waste(input_lengths, target_lengths, shuffled, pad_to_multiple_of=PAD_TO_MULTIPLE_OF))
+    after = padding_waste(input_lengths, target_lengths, grouped, pad_to_multiple_of=PAD_TO_MULTIPLE_OF)
+    print_waste("after: per-batch, length-grouped", after)
+
+    model = T5ForConditionalGeneration.from_pretrained(args.model_dir)
+    collator = make_collator(tokenizer, model)
+    columns = ["input_ids", "attention_mask", "labels"]
+    padded, unpadded = padded.select_columns(columns), unpadded.select_columns(columns)
+    # Batches spread over the epoch (length-grouped order starts with the longest batch)
+    padded_batches = [default_data_collator([padded[i] for i in b]) for b in spread(shuffled, args.steps)]
+    grouped_batches = [collator([unpadded[i] for i in b]) for b in spread(grouped, args.steps)]
+    # Same starting weights for both runs
+    state = {k: v.clone() for k, v in model.state_dict().items()}
+    before_sps = steps_per_second(model, padded_batches, args.steps)
+    model.load_state_dict(state)
+    after_sps = steps_per_second(model, grouped_batches, args.steps)
+    print(f"[INFO] CPU training, batch size {args.batch_size}, {args.steps} steps:")
+    print(f"       before: {before_sps:.2f} steps/s   after: {after_sps:.2f} steps/s   ({after_sps / before_sps:.1f}x)")
+
+if __name__ == "__main__":
+    main()
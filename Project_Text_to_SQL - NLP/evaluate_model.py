@@ -0,0 +1,114 @@
+"""
+File: evaluate_model.py
+
+Purpose:
+    Evaluate a Text-to-SQL checkpoint on a test split with metrics, replacing the phase-2
+    notebook's `evaluate_test_set` (one sample at a time, predictions only printed).
+
+Steps:
+    1. Load the model (PyTorch checkpoint or ONNX export) and the test records.
+    2. Generate SQL in batches of --batch-size (inputs grouped by length).
+    3. Score every prediction: exact match (normalized SQL), WHERE-condition match and, with a
+       database, execution accuracy (same result rows as the gold SQL) and executable rate.
+    4. Print the overall and per question type metrics (type inferred from the gold SQL shape),
+       samples per second and p50 / p95 latency; with --baseline, the change against an earlier
+       report. Save the full report as JSON.
+
+Usage:
+    python evaluate_model.py
+    python evaluate_model.py --model-dir model/Phase1_CEonly --test-path data/processing/phase1/test_text2sql.json
+    python evaluate_model.py --backend onnx --model-dir model/Final_model_onnx_int8 --report model/eval_onnx.json --baseline model/eval_report.json
+"""
+
+import argparse
+import json
+import os
+import time
+
+from realestate_text_to_sql_modules.evaluation import (
+    EVAL_BATCH_SIZE,
+    EVAL_MAX_LENGTH,
+    EVAL_REPORT_PATH,
+    compare_reports,
+    evaluate,
+)
+from realestate_text_to_sql_modules.inference_engine import MODEL_DIR, load_model
+from realestate_text_to_sql_modules.sql_utils import DEFAULT_DB_PATH
+
+TEST_PATH = "data/processing/phase2/test_text2sql.json"
+
+def print_metrics(name: str, summary: dict) -> None:
+    cells = [f"{summary['samples']:>5}"]
+    for metric in ("exact_match", "condition_match", "execution_accuracy", "executable"):
+        cells.append(f"{summary[metric]:>8.2%}" if metric in summary else f"{'-':>8}")
+    print(f"       {name:<28} " + " ".join(cells))
+
+def main():
+    parser = argparse.ArgumentParser(description="Batched test-set evaluation of the Text-to-SQL model with a JSON report.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Checkpoint (torch) or export directory (onnx).")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--constrained", action="store_true", help="Grammar-constrained decoding.")
+    parser.add_argument("--test-path", default=TEST_PATH, help="Test split (Question / Schema / SQL records).")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH, help="SQLite database for execution accuracy.")
+    parser.add_argument("--no-execution", action="store_true", help="Only exact / condition match.")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N test records.")
+    parser.add_argument("--batch-size", type=int, default=EVAL_BATCH_SIZE)
+    parser.add_argument("--max-length", type=int, default=EVAL_MAX_LENGTH, help="Max generated tokens.")
+    parser.add_argument("--threads", type=int, default=None, help="torch.set_num_threads().")
+    parser.add_argument("--report", default=EVAL_REPORT_PATH, help="JSON file for the report.")
+    parser.add_argument("--baseline", default=None, help="Earlier report to compare against.")
+    args = parser.parse_args()
+
+    if args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+    with open(args.test_path, "r", encoding="utf-8") as f:
+        records = json.load(f)[:args.limit]
+    db_path = None
+    if not args.no_execution:
+        if os.path.exists(args.db_path):
+            db_path = args.db_path
+        else:
+            print(f"[SKIP] {args.db_path} not found, execution accuracy is not computed")
+
+    model = load_model(args.backend, args.model_dir, max_length=args.max_length, constrained=args.constrained)
+    # Fingerprints chỉ lưu cạnh file test khi đánh giá toàn bộ tập
+    report = evaluate(model, records, batch_size=args.batch_size, db_path=db_path,
+                      dataset_path=args.test_path if args.limit is None else None)
+    report.update({
+        "model_dir": args.model_dir,
+        "backend": args.backend,
+        "constrained": args.constrained,
+        "test_path": args.test_path,
+        "db_path": db_path,
+        "max_length": args.max_length,
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+
+    print(f"[INFO] {report['samples']} test questions, {args.model_dir} ({args.backend}), batch size {args.batch_size}")
+    print(f"       {report['samples_per_second']:.1f} samples/s, latency p50 {report['latency_ms_p50']:.0f} ms / "
+          f"p95 {report['latency_ms_p95']:.0f} ms per batch call")
+    print(f"       {'type':<28} {'n':>5} {'exact':>8} {'conds':>8} {'exec':>8} {'runs':>8}")
+    for name, summary in report["by_type"].items():
+        print_metrics(name, summary)
+    print_metrics("overall", report["overall"])
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        deltas = compare_reports(report, baseline)
+        report["baseline"], report["deltas"] = args.baseline, deltas
+        print(f"[INFO] Change against {args.baseline}:")
+        for key, delta in deltas.items():
+            if key.startswith(("samples", "latency")):
+                print(f"       {key:<28} {delta:+.2f}")
+            elif "." not in key:
+                print(f"       {key:<28} {delta * 100:+.2f} pts")
+
+    os.makedirs(os.path.dirname(args.report) or ".", exist_ok=True)
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"[INFO] Report saved to {args.report}")
+
+if __name__ == "__main__":
+    main()
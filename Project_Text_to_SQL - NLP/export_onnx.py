@@ -0,0 +1,80 @@
+"""
+File: export_onnx.py
+
+Purpose:
+    Convert the fine-tuned ViT5 checkpoint to ONNX for CPU serving and check what it costs.
+
+Steps:
+    1. Export `model/Final_model` to ONNX encoder / decoder graphs with past key values
+       (skipped with --skip-export when the export directory already exists).
+    2. With --quantize, write a dynamically int8-quantized copy of every graph.
+    3. With --parity, generate SQL for the test set with the PyTorch checkpoint and with the
+       exported model (the quantized one when --quantize is given), and print the agreement, the
+       exact-match accuracy of both, the accuracy lost and the per-question latency. The full
+       report is saved as JSON.
+
+Usage:
+    python export_onnx.py
+    python export_onnx.py --quantize --parity
+    python export_onnx.py --skip-export --quantize --parity --limit 200 --threads 4
+"""
+
+import argparse
+import json
+
+from realestate_text_to_sql_modules.inference_engine import MODEL_DIR, Text2SQLModel
+from realestate_text_to_sql_modules.onnx_backend import (
+    ONNX_DIR,
+    PARITY_BATCH_SIZE,
+    QUANTIZED_DIR,
+    ONNXText2SQLModel,
+    export_onnx,
+    parity_check,
+    quantize_onnx,
+)
+
+TEST_PATH = "data/processing/phase2/test_text2sql.json"
+REPORT_PATH = "model/onnx_parity.json"
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the ViT5 Text-to-SQL model to ONNX (optionally int8) and check parity.")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="PyTorch checkpoint to export.")
+    parser.add_argument("--onnx-dir", default=ONNX_DIR, help="Where to write the ONNX export.")
+    parser.add_argument("--skip-export", action="store_true", help="Reuse an existing export in --onnx-dir.")
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 copy to --quantized-dir.")
+    parser.add_argument("--quantized-dir", default=QUANTIZED_DIR, help="Where to write the quantized graphs.")
+    parser.add_argument("--parity", action="store_true", help="Compare against the PyTorch model on --test-path.")
+    parser.add_argument("--test-path", default=TEST_PATH, help="Test split (Question / Schema / SQL records).")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N test records.")
+    parser.add_argument("--batch-size", type=int, default=PARITY_BATCH_SIZE, help="Inputs per generate call in the parity check.")
+    parser.add_argument("--threads", type=int, default=None, help="ONNX Runtime intra-op threads.")
+    parser.add_argument("--report", default=REPORT_PATH, help="JSON file for the parity report.")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        export_onnx(args.model_dir, args.onnx_dir)
+    serve_dir = args.onnx_dir
+    if args.quantize:
+        serve_dir = quantize_onnx(args.onnx_dir, args.quantized_dir)
+
+    if args.parity:
+        with open(args.test_path, "r", encoding="utf-8") as f:
+            records = json.load(f)[:args.limit]
+        reference = Text2SQLModel(args.model_dir, device="cpu")
+        candidate = ONNXText2SQLModel(serve_dir, num_threads=args.threads)
+        report = parity_check(reference, candidate, records, batch_size=args.batch_size)
+        report["reference_dir"], report["candidate_dir"] = args.model_dir, serve_dir
+
+        print(f"[INFO] {report['samples']} test questions, {serve_dir} vs {args.model_dir}")
+        print(f"       agreement with PyTorch : {report['agreement']:.2%}")
+        print(f"       exact match PyTorch    : {report['exact_match_reference']:.2%}")
+        print(f"       exact match ONNX       : {report['exact_match_candidate']:.2%} "
+              f"(lost {report['exact_match_lost']:+.2%})")
+        print(f"       latency per question   : {report['reference_ms_per_question']:.1f} ms -> "
+              f"{report['candidate_ms_per_question']:.1f} ms ({report['speedup']:.2f}x)")
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"[INFO] Report saved to {args.report}")
+
+if __name__ == "__main__":
+    main()
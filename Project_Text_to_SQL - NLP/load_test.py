@@ -0,0 +1,86 @@
+"""
+File: load_test.py
+
+Purpose:
+    Closed-loop load test of a running Text-to-SQL HTTP service (serve.py).
+
+Steps:
+    1. Read test questions from a Text-to-SQL split.
+    2. Run --concurrency clients for --duration seconds; each client posts the next question to
+       the endpoint as soon as its previous request has been answered.
+    3. Print requests per second, p50 / p95 latency of successful requests and the count of each
+       status code (503 = rejected by backpressure, 504 = timed out), then the server's /health.
+
+Usage:
+    python serve.py &
+    python load_test.py --concurrency 32 --duration 30
+    python load_test.py --url http://localhost:8080 --endpoint /sql --concurrency 128
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from collections import Counter
+
+import aiohttp
+
+from realestate_text_to_sql_modules.inference_engine import percentile_ms
+
+DATA_PATH = "data/processing/phase2/test_text2sql.json"
+
+async def client(session, url: str, questions, deadline: float, latencies: list, statuses: Counter):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            async with session.post(url, json={"question": next(questions)}) as resp:
+                await resp.read()
+                status = resp.status
+        except aiohttp.ClientError as e:
+            status = type(e).__name__
+        statuses[status] += 1
+        if status == 200:
+            latencies.append(time.perf_counter() - start)
+
+async def run(args, questions):
+    latencies, statuses = [], Counter()
+    cycle = itertools.cycle(questions)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        await asyncio.gather(*(
+            client(session, args.url + args.endpoint, cycle, deadline, latencies, statuses)
+            for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+        try:
+            async with session.get(args.url + "/health") as resp:
+                health = await resp.json()
+        except aiohttp.ClientError as e:
+            health = {"error": str(e)}
+    return latencies, statuses, elapsed, health
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the Text-to-SQL HTTP service.")
+    parser.add_argument("--url", default="http://localhost:8080")
+    parser.add_argument("--endpoint", choices=["/sql", "/query"], default="/query")
+    parser.add_argument("--data", default=DATA_PATH, help="Text-to-SQL JSON file with Question records.")
+    parser.add_argument("--concurrency", type=int, default=32, help="Simultaneous clients.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to run.")
+    args = parser.parse_args()
+
+    with open(args.data, "r", encoding="utf-8") as f:
+        questions = [r["Question"] for r in json.load(f)]
+
+    latencies, statuses, elapsed, health = asyncio.run(run(args, questions))
+    total = sum(statuses.values())
+    print(f"[INFO] {args.concurrency} clients x {elapsed:.1f}s on {args.endpoint}: {total} requests")
+    print(f"       throughput     : {total / elapsed:.1f} req/s ({statuses[200] / elapsed:.1f} ok/s)")
+    print(f"       latency (200)  : p50 {percentile_ms(latencies, 50):.1f} ms  p95 {percentile_ms(latencies, 95):.1f} ms")
+    print(f"       status codes   : {dict(statuses)}")
+    print(f"       server health  : {json.dumps(health, ensure_ascii=False)}")
+
+if __name__ == "__main__":
+    main()
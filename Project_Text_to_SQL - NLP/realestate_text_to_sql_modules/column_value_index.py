@@ -0,0 +1,164 @@
+"""
+Module: column_value_index.py
+
+Purpose:
+    Precompute, once per cleaned DataFrame, every value pool that NaturalQueryGenerator.generate_query
+    used to rebuild from the full frame on each call (dropna, type filtering, `> 0` filtering, sorting).
+
+Key Components:
+    - ColumnValueIndex(df): holds pre-filtered NumPy arrays per column, pre-sorted arrays for range
+      queries, categorical vocabularies for text columns, the per-location LocationTable and the full schema.
+    - ColumnValueIndex.for_dataframe(df): returns a cached index for a DataFrame object.
+    - ColumnValueIndex.rows_matching(cols, vals): row positions behind a location condition (a dict
+      lookup in the LocationTable), used by the generator's constrained mode to pick thresholds that
+      match at least one listing.
+    - sample_one(values): draws one element exactly like `pd.Series.sample(1)` does.
+
+Note:
+    Arrays keep the original row order and the draws consume the `random` / NumPy global RNGs
+    the same way as the pandas code they replace, so a fixed seed still yields the same samples.
+    The index is a snapshot: rebuild it if the DataFrame is modified.
+
+Usage:
+    from realestate_text_to_sql_modules.column_value_index import ColumnValueIndex
+
+    index = ColumnValueIndex.for_dataframe(df_cleaned)
+    col = random.choice(index.candidate_columns)
+    value = index.draw(col)
+"""
+
+import random
+import weakref
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from realestate_text_to_sql_modules.location_utils import LocationTable
+from realestate_text_to_sql_modules.schema_generator import SchemaGenerator
+
+CANDIDATE_COLUMNS = [
+    'price', 'area', 'frontage', 'access_road',
+    'floors', 'bedrooms', 'bathrooms',
+    'house_direction', 'legal_status', 'furniture_state'
+]
+TEXT_COLUMNS = ['house_direction', 'legal_status', 'furniture_state']
+NUMERIC_COLUMNS = ['price', 'area', 'frontage', 'access_road', 'floors', 'bedrooms', 'bathrooms']
+RANGE_COLUMNS = ['price', 'area', 'frontage', 'access_road']
+
+def sample_one(values: np.ndarray):
+    """
+    Draw one element the same way `pd.Series(values).sample(1).values[0]` does.
+
+    Raises:
+        ValueError: If `values` is empty (same error as pandas/NumPy).
+    """
+    pos = np.random.choice(len(values), size=1, replace=False)[0]
+    return values[pos]
+
+class ColumnValueIndex:
+    # id(df) -> (weakref to df, index)
+    _cache: Dict[int, tuple] = {}
+
+    def __init__(self, df: pd.DataFrame):
+        """Build every value pool from the cleaned DataFrame in a single pass per column."""
+        from realestate_text_to_sql_modules.natural_query_generator import is_value_type_valid
+
+        self.columns = list(df.columns)
+        self.schema = dict(zip(self.columns, SchemaGenerator.generate_schema(df)))
+
+        # Columns with at least 10 non-null values, in the generator's preference order
+        self.candidate_columns = [
+            c for c in CANDIDATE_COLUMNS
+            if c in df.columns and df[c].dropna().shape[0] >= 10
+        ]
+
+        # Values drawn by `random.choice` for comparison / count / fallback queries.
+        # Text columns are stored as integer codes into a vocabulary.
+        self.value_codes: Dict[str, np.ndarray] = {}
+        self.vocabularies: Dict[str, np.ndarray] = {}
+        self.valid_values: Dict[str, np.ndarray] = {}
+        for col in self.candidate_columns:
+            values = df[col][df[col].notna()]
+            values = values[values.apply(lambda v: is_value_type_valid(col, v))]
+            if col in TEXT_COLUMNS:
+                values = values[~values.astype(str).str.lower().isin(['unk', 'unknown'])]
+                codes, vocab = pd.factorize(values.values)
+                self.value_codes[col] = codes
+                self.vocabularies[col] = np.asarray(vocab, dtype=object)
+            else:
+                self.valid_values[col] = values[values > 0].values
+
+        # Non-null values (original order) and their sorted copy for OR / BETWEEN queries
+        self.notna_values: Dict[str, np.ndarray] = {}
+        self.sorted_values: Dict[str, np.ndarray] = {}
+        for col in NUMERIC_COLUMNS:
+            if col in df.columns:
+                self.notna_values[col] = df[col][df[col].notna()].values
+                self.sorted_values[col] = np.sort(self.notna_values[col], kind='stable')
+
+        # Strictly positive values for price / area thresholds
+        self.positive_values: Dict[str, np.ndarray] = {}
+        for col in ['price', 'area']:
+            if col in df.columns:
+                self.positive_values[col] = df[col][df[col] > 0].dropna().values
+        self.sorted_positive_prices = np.sort(self.positive_values.get('price', np.array([])), kind='stable')
+
+        # Vocabulary of cities for LIKE queries
+        city_codes, city_vocab = pd.factorize(df['city'].dropna().values) if 'city' in df.columns else (np.array([], dtype=int), np.array([]))
+        self.city_codes = city_codes
+        self.city_vocabulary = np.asarray(city_vocab, dtype=object)
+
+        # (city, district, ward) triples and per-location row positions / price-area statistics
+        self.locations = LocationTable.for_dataframe(df) if {'city', 'district', 'ward'} <= set(df.columns) else None
+
+        # Full-length columns sharing row positions, to look up the rows behind a location
+        self.num_rows = len(df)
+        self.row_values: Dict[str, np.ndarray] = {
+            c: df[c].values for c in ['city', 'district', 'ward'] + NUMERIC_COLUMNS if c in df.columns
+        }
+
+    @classmethod
+    def for_dataframe(cls, df: pd.DataFrame) -> "ColumnValueIndex":
+        """Return the index built for this DataFrame object, building it on first use."""
+        entry = cls._cache.get(id(df))
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+        index = cls(df)
+        cls._cache = {k: v for k, v in cls._cache.items() if v[0]() is not None}
+        cls._cache[id(df)] = (weakref.ref(df), index)
+        return index
+
+    def draw(self, col: str):
+        """Pick one valid value of `col` with the same draw as `random.choice(valid_values.values)`."""
+        if col in self.value_codes:
+            codes = self.value_codes[col]
+            if len(codes) == 0:
+                raise ValueError(f"Không có giá trị hợp lệ cho cột {col}")
+            return self.vocabularies[col][codes[random.randrange(len(codes))]]
+        values = self.valid_values[col]
+        if len(values) == 0:
+            raise ValueError(f"Không có giá trị hợp lệ cho cột {col}")
+        return values[random.randrange(len(values))]
+
+    def sample_city(self) -> str:
+        """Same draw as `df['city'].dropna().sample(1).values[0]`."""
+        return self.city_vocabulary[sample_one(self.city_codes)]
+
+    def rows_matching(self, cols: List[str], vals: List[str]) -> np.ndarray:
+        """Positions of the rows where every column in `cols` equals the matching value in `vals`."""
+        if self.locations is not None and tuple(cols) in self.locations.levels:
+            return self.locations.rows(cols, vals)
+        mask = np.ones(self.num_rows, dtype=bool)
+        for col, val in zip(cols, vals):
+            mask &= self.row_values[col] == val
+        return np.flatnonzero(mask)
+
+    def positive_values_at(self, col: str, rows: np.ndarray) -> np.ndarray:
+        """Strictly positive, non-null values of `col` at the given row positions."""
+        values = self.row_values[col][rows].astype(float)
+        return values[values > 0]
+
+    def generate_schema(self, relevant_columns: List[str]) -> List[str]:
+        """Same output as `SchemaGenerator.generate_schema(df, relevant_columns)` without slicing the frame."""
+        return [self.schema[c] for c in relevant_columns]
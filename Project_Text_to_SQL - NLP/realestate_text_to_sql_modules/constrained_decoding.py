@@ -0,0 +1,412 @@
+"""
+Module: constrained_decoding.py
+
+Purpose:
+    Grammar-constrained greedy decoding for the ViT5 Text-to-SQL model. At every step only the
+    tokens that keep the output a valid prefix of our SQL subset are allowed, and spans the grammar
+    leaves no choice about (e.g. "SELECT" at the start, "FROM price_house" after the select list)
+    are fed to the decoder in one forward call instead of being generated token by token.
+
+Key Components:
+    - SQLGrammar: character-level recognizer of the subset
+        SELECT * | COUNT(*) FROM price_house
+        [WHERE cond {AND | OR cond}] [ORDER BY column [ASC | DESC]] [LIMIT int]
+        cond := column (= | != | < | > | <= | >=) value | column BETWEEN num AND num | column LIKE 'text'
+      over the columns of SCHEMA_DEFINITION; numeric columns take numbers, text columns take
+      quoted strings (and only = / != / LIKE). Two word-like lexemes (keyword, column, table,
+      number) are separated by one space; around punctuation and operators the space is optional.
+      Runs of spaces are never valid, so e.g. "SELECTCOUNT(*)", "price_houseWHERE" or "SELECT  "
+      are rejected.
+    - GrammarConstraint(tokenizer): per grammar state, the token ids that keep the output valid
+      (cached), the forced continuation of a prefix, and prefix_allowed_tokens_fn for HF generate().
+    - constrained_generate(model, tokenizer, input_texts, constraint): batched greedy loop with
+      KV cache; returns the SQL strings and decoding counters (decoder calls, forced tokens, ...).
+
+Note:
+    Grammar states are hashable tuples, so allowed-token lists and token transitions are computed
+    once per state and reused across steps, sequences and requests. torch is only imported by
+    constrained_generate().
+
+Usage:
+    from realestate_text_to_sql_modules.constrained_decoding import GrammarConstraint, constrained_generate
+
+    constraint = GrammarConstraint(tokenizer)
+    sqls, stats = constrained_generate(model, tokenizer, ["Câu hỏi: ... | Schema: ..."], constraint)
+
+    # or with HF generate (beam search, ONNX Runtime models)
+    model.generate(**inputs, prefix_allowed_tokens_fn=constraint.prefix_allowed_tokens_fn)
+"""
+
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from realestate_text_to_sql_modules.constants import SCHEMA_DEFINITION
+
+MAX_LENGTH = 64
+TABLE_NAME = "price_house"
+NUMERIC_OPERATORS = ["=", "!=", "<", ">", "<=", ">="]
+TEXT_OPERATORS = ["=", "!="]
+
+State = Tuple
+
+def schema_columns(schema: List[str] = SCHEMA_DEFINITION) -> Dict[str, str]:
+    """["price[float]", ...] -> {"price": "num", "city": "str", ...}"""
+    columns = {}
+    for entry in schema:
+        name, dtype = entry.rstrip("]").split("[")
+        columns[name] = "str" if dtype == "str" else "num"
+    return columns
+
+class SQLGrammar:
+    """
+    Character-level recognizer of the SQL subset (see module docstring).
+
+    The grammar is a graph of nodes; each node has literal options (keyword -> next node), at most
+    one open class ("num", "int" or "str" -> next node) and an accepting flag. A state is one of
+        ("at", node, after)        between lexemes; `after` is what was read last, "space" or "punct"
+        ("lit", node, prefix)      part of a literal option of `node` read
+        ("num", next, phase)       inside a number (phase "int" / "dot" / "frac"; "int_only" for LIMIT)
+        ("str", next)              inside a quoted string
+
+    >>> g = SQLGrammar()
+    >>> def ok(sql): return g.accepts(g.feed(g.initial_state, sql))
+    >>> ok("SELECT COUNT(*) FROM price_house WHERE price>1 AND city = 'A' ORDER BY price DESC LIMIT 5")
+    True
+    >>> ok("SELECTCOUNT(*)FROMprice_houseWHEREprice>1")
+    False
+    >>> ok("SELECT * FROM price_houseWHEREcity='A'ORDER BYpriceDESC")
+    False
+    >>> ok("SELECT * FROM price_house WHERE bedrooms = 3LIMIT 5")
+    False
+    >>> g.feed(g.initial_state, "SELECT  ") is None
+    True
+    """
+
+    def __init__(self, schema: List[str] = SCHEMA_DEFINITION, table: str = TABLE_NAME):
+        self.columns = schema_columns(schema)
+        self.literals: Dict[str, Dict[str, str]] = {}
+        self.open_class: Dict[str, Tuple[str, str]] = {}
+        self.accepting = set()
+        # Nodes whose lexeme is written right after the previous one, as in "COUNT(*)"
+        self.tight = set()
+
+        self._node("start", {"SELECT": "select"})
+        self._node("select", {"*": "from", "COUNT": "count_open"})
+        self._node("count_open", {"(": "count_star"}, tight=True)
+        self._node("count_star", {"*": "count_close"}, tight=True)
+        self._node("count_close", {")": "from"}, tight=True)
+        self._node("from", {"FROM": "table"})
+        self._node("table", {table: "tail"})
+        self._node("tail", {"WHERE": "cond", "ORDER BY": "order_col", "LIMIT": "limit"}, accepting=True)
+        self._node("cond", {col: f"op_{kind}" for col, kind in self.columns.items()})
+        self._node("op_num", {**{op: "value_num" for op in NUMERIC_OPERATORS}, "BETWEEN": "between_low"})
+        self._node("op_str", {**{op: "value_str" for op in TEXT_OPERATORS}, "LIKE": "value_str"})
+        self._node("value_num", {}, open_class=("num", "cond_end"))
+        self._node("value_str", {}, open_class=("str", "cond_end"))
+        self._node("between_low", {}, open_class=("num", "between_and"))
+        self._node("between_and", {"AND": "between_high"})
+        self._node("between_high", {}, open_class=("num", "cond_end"))
+        self._node("cond_end", {"AND": "cond", "OR": "cond", "ORDER BY": "order_col", "LIMIT": "limit"}, accepting=True)
+        self._node("order_col", {col: "order_dir" for col in self.columns})
+        self._node("order_dir", {"ASC": "order_end", "DESC": "order_end", "LIMIT": "limit"}, accepting=True)
+        self._node("order_end", {"LIMIT": "limit"}, accepting=True)
+        self._node("limit", {}, open_class=("int", "end"))
+        self._node("end", {}, accepting=True)
+
+    def _node(self, name: str, literals: Dict[str, str], open_class: Tuple[str, str] = None,
+              accepting: bool = False, tight: bool = False):
+        self.literals[name] = literals
+        if open_class:
+            self.open_class[name] = open_class
+        if accepting:
+            self.accepting.add(name)
+        if tight:
+            self.tight.add(name)
+
+    @property
+    def initial_state(self) -> State:
+        return ("at", "start", "punct")
+
+    @staticmethod
+    def _word_char(ch: str) -> bool:
+        return ch.isalnum() or ch == "_"
+
+    def _enter(self, node: str, ch: str, after: str) -> Optional[State]:
+        """
+        First character of the lexeme after `node`'s boundary. `after` is what was read last:
+        "space", "punct" or "word" (the end of a keyword, identifier or number).
+        """
+        if ch == " ":
+            # Một dấu cách giữa hai lexeme, không bao giờ hai
+            return ("at", node, "space") if after != "space" else None
+        if after == "word" and self._word_char(ch):
+            return None
+        kind, nxt = self.open_class.get(node, (None, None))
+        if kind in ("num", "int") and ch.isdigit():
+            return ("num", nxt, "int" if kind == "num" else "int_only")
+        if kind == "str" and ch == "'":
+            return ("str", nxt)
+        if any(lit.startswith(ch) for lit in self.literals[node]):
+            return ("lit", node, ch)
+        return None
+
+    def step(self, state: State, ch: str) -> Optional[State]:
+        """State after reading one more character, or None if the text is no longer a valid prefix."""
+        tag = state[0]
+        if tag == "at":
+            return self._enter(state[1], ch, state[2])
+        if tag == "lit":
+            node, prefix = state[1], state[2]
+            extended = prefix + ch
+            if any(lit.startswith(extended) for lit in self.literals[node]):
+                return ("lit", node, extended)
+            # The literal read so far is complete: the character starts the next lexeme
+            if prefix in self.literals[node]:
+                after = "word" if self._word_char(prefix[-1]) else "punct"
+                return self._enter(self.literals[node][prefix], ch, after)
+            return None
+        if tag == "num":
+            nxt, phase = state[1], state[2]
+            if ch.isdigit():
+                return ("num", nxt, "frac" if phase == "dot" else phase)
+            if ch == "." and phase == "int":
+                return ("num", nxt, "dot")
+            if phase == "dot":
+                return None
+            return self._enter(nxt, ch, "word")
+        return ("at", state[1], "punct") if ch == "'" else state
+
+    def feed(self, state: Optional[State], text: str) -> Optional[State]:
+        i = 0
+        while i < len(text) and state is not None:
+            if state[0] == "str":
+                # Everything up to the closing quote stays inside the string
+                i = text.find("'", i)
+                if i < 0:
+                    return state
+            state = self.step(state, text[i])
+            i += 1
+        return state
+
+    def accepts(self, state: Optional[State]) -> bool:
+        """Whether the text read so far is a complete query."""
+        if state is None:
+            return False
+        tag = state[0]
+        if tag == "at":
+            return state[1] in self.accepting
+        if tag == "lit":
+            nxt = self.literals[state[1]].get(state[2])
+            return nxt is not None and nxt in self.accepting
+        if tag == "num":
+            return state[2] != "dot" and state[1] in self.accepting
+        return False
+
+    def forced_text(self, state: State) -> str:
+        """
+        Text that every valid continuation of `state` starts with, following single-option nodes
+        (e.g. " FROM price_house" after "SELECT *"). Empty when the next lexeme is a real choice.
+        """
+        parts = []
+        if state[0] == "lit":
+            node, prefix = state[1], state[2]
+            options = [lit for lit in self.literals[node] if lit.startswith(prefix)]
+            if len(options) != 1:
+                return ""
+            parts.append(options[0][len(prefix):])
+            node = self.literals[node][options[0]]
+        elif state[0] == "at":
+            node = state[1]
+        else:
+            return ""
+        while node not in self.accepting and node not in self.open_class and len(self.literals[node]) == 1:
+            separator = "" if node in self.tight else " "
+            literal, node = next(iter(self.literals[node].items()))
+            parts.append(separator + literal)
+        return "".join(parts)
+
+class GrammarConstraint:
+    """
+    SQLGrammar applied to a tokenizer's vocabulary.
+
+    Each token is reduced to the text it adds when decoded (sentencepiece "▁" -> space, added
+    tokens such as "SELECT" / "price_house" with a leading space), and a token is allowed in a
+    state when that text keeps the output a valid prefix. End-of-sequence is allowed only when
+    the output is a complete query.
+
+    Args:
+        tokenizer: HF tokenizer of the model (T5Tokenizer for ViT5).
+        grammar (SQLGrammar, optional): Defaults to the SCHEMA_DEFINITION grammar.
+    """
+
+    def __init__(self, tokenizer, grammar: SQLGrammar = None):
+        self.tokenizer = tokenizer
+        self.grammar = grammar or SQLGrammar()
+        self.eos_token_id = tokenizer.eos_token_id
+        special = set(tokenizer.all_special_ids)
+        added = set(tokenizer.get_added_vocab().values())
+        self.surfaces: Dict[int, str] = {}
+        for token_id, piece in enumerate(tokenizer.convert_ids_to_tokens(list(range(len(tokenizer))))):
+            if token_id in special or piece is None:
+                continue
+            text = " " + piece if token_id in added else piece.replace("▁", " ")
+            if text:
+                self.surfaces[token_id] = text
+        # Tokens grouped by first character: most states reject a whole group at once
+        self._by_first_char: Dict[str, List[int]] = {}
+        for token_id, text in self.surfaces.items():
+            self._by_first_char.setdefault(text[0], []).append(token_id)
+        self._allowed: Dict[State, List[int]] = {}
+        self._transitions: Dict[Tuple[State, int], Optional[State]] = {}
+
+    @property
+    def initial_state(self) -> State:
+        return self.grammar.initial_state
+
+    def advance(self, state: Optional[State], token_id: int) -> Optional[State]:
+        """Grammar state after a token (None once the output is invalid)."""
+        if state is None:
+            return None
+        key = (state, token_id)
+        if key not in self._transitions:
+            text = self.surfaces.get(token_id)
+            self._transitions[key] = self.grammar.feed(state, text) if text is not None else None
+        return self._transitions[key]
+
+    def allowed_ids(self, state: Optional[State]) -> List[int]:
+        """Token ids allowed after `state` (cached per state)."""
+        if state is None:
+            return [self.eos_token_id]
+        allowed = self._allowed.get(state)
+        if allowed is None:
+            allowed = []
+            for first, token_ids in self._by_first_char.items():
+                if self.grammar.step(state, first) is None:
+                    continue
+                allowed.extend(t for t in token_ids if self.advance(state, t) is not None)
+            if self.grammar.accepts(state):
+                allowed.append(self.eos_token_id)
+            self._allowed[state] = allowed
+        return allowed
+
+    def state_of(self, token_ids: List[int]) -> Optional[State]:
+        state = self.initial_state
+        for token_id in token_ids:
+            state = self.advance(state, token_id)
+        return state
+
+    def forced_ids(self, token_ids: List[int], state: State) -> List[int]:
+        """
+        Token ids of the forced continuation of the output `token_ids`, tokenized the way the
+        tokenizer splits the whole text (as in the training labels). Empty when nothing is forced
+        or the tokenization does not extend `token_ids`.
+        """
+        forced = self.grammar.forced_text(state)
+        if not forced:
+            return []
+        prefix_text = self.tokenizer.decode(token_ids, skip_special_tokens=True)
+        if not prefix_text or prefix_text.endswith(" "):
+            forced = forced.lstrip(" ")
+        full = self.tokenizer(prefix_text + forced, add_special_tokens=False).input_ids
+        if full[:len(token_ids)] != list(token_ids) or len(full) == len(token_ids):
+            return []
+        extra = full[len(token_ids):]
+        check = state
+        for token_id in extra:
+            check = self.advance(check, token_id)
+        return extra if check is not None else []
+
+    def prefix_allowed_tokens_fn(self, batch_id: int, input_ids) -> List[int]:
+        """For `model.generate(prefix_allowed_tokens_fn=...)`; input_ids start with the decoder start token."""
+        return self.allowed_ids(self.state_of([int(t) for t in input_ids[1:]]))
+
+def constrained_generate(model, tokenizer, input_texts: List[str], constraint: GrammarConstraint,
+                         max_length: int = MAX_LENGTH, device=None) -> Tuple[List[str], Counter]:
+    """
+    Greedy decoding restricted to the grammar, with forced spans fed in one decoder call.
+
+    Each step, every unfinished sequence either takes the most likely allowed token, followed
+    by the grammar's forced continuation, or keeps feeding a forced span. The decoder is called
+    once per step on the same number of new tokens for all sequences (the shortest pending span),
+    so a lone request gets a whole forced span in one call.
+
+    Returns:
+        (list of SQL strings, Counter with sequences / decoder_calls / tokens (output tokens) /
+        forced_tokens (fed without being chosen from the logits) / truncated)
+    """
+    import torch
+
+    device = device or next(model.parameters()).device
+    inputs = tokenizer(list(input_texts), return_tensors="pt", padding="longest", truncation=True).to(device)
+    n = len(input_texts)
+    stats = Counter(sequences=n)
+    pad_id = tokenizer.pad_token_id
+    masks: Dict[State, "torch.Tensor"] = {}
+
+    def allowed_mask(state, vocab_size):
+        mask = masks.get(state)
+        if mask is None:
+            mask = torch.zeros(vocab_size, dtype=torch.bool, device=device)
+            ids = [t for t in constraint.allowed_ids(state) if t < vocab_size]
+            mask[ids] = True
+            masks[state] = mask
+        return mask
+
+    # The query always starts the same way: feed it with the decoder start token
+    first = constraint.forced_ids([], constraint.initial_state)
+    state = constraint.initial_state
+    for token_id in first:
+        state = constraint.advance(state, token_id)
+    outputs: List[List[int]] = [list(first) for _ in range(n)]
+    states = [state] * n
+    pending: List[List[int]] = [[] for _ in range(n)]
+    done = [False] * n
+    stats["forced_tokens"] += len(first) * n
+
+    with torch.inference_mode():
+        encoder_outputs = model.get_encoder()(input_ids=inputs.input_ids, attention_mask=inputs.attention_mask)
+        decoder_input = torch.tensor([[model.config.decoder_start_token_id] + first] * n, dtype=torch.long, device=device)
+        past = None
+        while True:
+            out = model(encoder_outputs=encoder_outputs, attention_mask=inputs.attention_mask,
+                        decoder_input_ids=decoder_input, past_key_values=past, use_cache=True)
+            stats["decoder_calls"] += 1
+            past = out.past_key_values
+            logits = out.logits[:, -1, :]
+
+            for i in range(n):
+                if done[i] or pending[i]:
+                    continue
+                if len(outputs[i]) >= max_length - 1:
+                    done[i] = True
+                    stats["truncated"] += 1
+                    continue
+                scores = logits[i].masked_fill(~allowed_mask(states[i], logits.shape[-1]), float("-inf"))
+                token_id = int(scores.argmax())
+                if token_id == constraint.eos_token_id:
+                    done[i] = True
+                    continue
+                state = constraint.advance(states[i], token_id)
+                forced = constraint.forced_ids(outputs[i] + [token_id], state) if state is not None else []
+                forced = forced[:max(0, max_length - 2 - len(outputs[i]))]
+                pending[i] = [token_id] + forced
+                stats["forced_tokens"] += len(forced)
+
+            active = [i for i in range(n) if not done[i]]
+            if not active:
+                break
+            width = min(len(pending[i]) for i in active)
+            chunk = []
+            for i in range(n):
+                if done[i]:
+                    chunk.append([pad_id] * width)
+                    continue
+                step_ids, pending[i] = pending[i][:width], pending[i][width:]
+                for token_id in step_ids:
+                    states[i] = constraint.advance(states[i], token_id)
+                outputs[i].extend(step_ids)
+                chunk.append(step_ids)
+            decoder_input = torch.tensor(chunk, dtype=torch.long, device=device)
+
+    stats["tokens"] = sum(len(ids) for ids in outputs)
+    return tokenizer.batch_decode(outputs, skip_special_tokens=True), stats
@@ -5,10 +5,17 @@ Purpose:
     Preprocess and normalize raw real estate tabular data before training a Text-to-SQL model.
 
 Main Function:
-    - clean_dataframe(df, save_path=None, sqlite_path=None):
+    - clean_dataframe(df, save_path=None, sqlite_path=None, parquet_path=None):
         + Normalize column names to snake_case.
         + Transform values: price units, label mapping, type casting.
-        + Optionally export the cleaned data to CSV and/or SQLite.
+        + Optionally export the cleaned data to CSV, SQLite and/or Parquet.
+    - export_sqlite(df, sqlite_path): typed table, bulk insert in one transaction, indexes on the
+      filter columns (price, area, city, district, ward and (city, district, ward)).
+    - export_parquet(df, parquet_path) / load_cleaned_parquet(parquet_path): columnar artifact that
+      later runs memory-map instead of re-cleaning the raw CSV (needs pyarrow).
+    - load_or_clean(raw_path, ...): content-addressed cache. The raw file bytes and CLEANING_RULES
+      are hashed into a fingerprint stored in a manifest next to the artifacts; when it matches,
+      cleaning and the SQLite rebuild are skipped and the existing artifacts are reused.
 
 Usage:
     from realestate_text_to_sql_modules.data_preprocessing import clean_dataframe
@@ -17,22 +24,125 @@ Usage:
     df_cleaned = clean_dataframe(
         df_raw,
         save_path="data/processing/df_cleaned.csv",
-        sqlite_path="data/processing/SQLite_real_estate.db"
+        sqlite_path="data/processing/SQLite_real_estate.db",
+        parquet_path="data/processing/df_cleaned.parquet"
+    )
+
+    # Clean only when the raw file or the rules changed
+    df_cleaned = load_or_clean(
+        "data/raw/vietnam_housing_dataset_cleaned.csv",
+        save_path="data/processing/df_cleaned.csv",
+        sqlite_path="data/processing/SQLite_real_estate.db",
+        parquet_path="data/processing/df_cleaned.parquet"
     )
 
 Args:
     df (pd.DataFrame): Raw housing dataset.
     save_path (str, optional): Output path to save cleaned CSV.
     sqlite_path (str, optional): Output path to save SQLite database.
+    parquet_path (str, optional): Output path to save the Parquet artifact.
 
 Returns:
     pd.DataFrame: Cleaned and normalized DataFrame.
 """
 
+import hashlib
+import json
+import os
 import pandas as pd
 import sqlite3
 
-def clean_dataframe(df, save_path=None, sqlite_path=None):
+# Everything clean_dataframe() does to the data; part of the cache fingerprint, so editing a rule
+# here invalidates cached artifacts. Bump CLEANING_VERSION when changing the code path itself.
+CLEANING_VERSION = 1
+CLEANING_RULES = {
+    'label_maps': {
+        'Legal status': {
+            'Have certificate': 'Đã có sổ',
+            'Sale contract': 'Hợp đồng mua bán',
+            'Unk': 'Không rõ pháp lý'
+        },
+        'Furniture state': {
+            'Basic': 'Nội thất cơ bản',
+            'Full': 'Nội thất đầy đủ',
+            'Unk': 'Không rõ nội thất'
+        },
+    },
+    'price_multiplier': 1_000_000_000,
+    'drop_columns': ['House_Level', 'is_project', 'Cluster_Label', 'Access Road'],
+    'int_columns': ['Floors', 'Bedrooms', 'Bathrooms'],
+    # Applied after column names are converted to snake_case
+    'value_fixes': {
+        'ward': {'5': 'Phường 5'},
+        'district': {'5': 'Quận 5'},
+    },
+}
+MANIFEST_NAME = 'clean_manifest.json'
+
+SQLITE_TABLE = 'price_house'
+# Columns used in generated WHERE clauses, and the location triple used together
+SQLITE_INDEXES = [['price'], ['area'], ['city'], ['district'], ['ward'], ['city', 'district', 'ward']]
+
+def sqlite_type(dtype) -> str:
+    """Declared SQLite column type for a pandas dtype."""
+    if pd.api.types.is_bool_dtype(dtype) or pd.api.types.is_integer_dtype(dtype):
+        return 'INTEGER'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'REAL'
+    return 'TEXT'
+
+def export_sqlite(df, sqlite_path, table=SQLITE_TABLE):
+    """
+    Write the cleaned DataFrame to a fresh SQLite database.
+
+    The table is created with declared column types, filled with a single executemany in one
+    transaction, then indexed and analyzed. The database is built next to `sqlite_path` and
+    moved into place at the end, so readers never see a half-written file.
+    """
+    tmp_path = sqlite_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    columns = ", ".join(f'"{col}" {sqlite_type(df[col].dtype)}' for col in df.columns)
+    placeholders = ", ".join("?" * len(df.columns))
+    # Python scalars with None for missing values, as sqlite3 expects
+    rows = zip(*[
+        (s.astype(object).where(s.notna(), None) if s.hasnans else s).tolist()
+        for _, s in df.items()
+    ])
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # Scratch file until os.replace, so durability pragmas are not needed while building
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        with conn:
+            conn.execute(f'CREATE TABLE {table} ({columns})')
+            conn.executemany(f'INSERT INTO {table} VALUES ({placeholders})', rows)
+            for index_cols in SQLITE_INDEXES:
+                if all(col in df.columns for col in index_cols):
+                    conn.execute(f'CREATE INDEX idx_{table}_{"_".join(index_cols)} ON {table} ({", ".join(index_cols)})')
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    os.replace(tmp_path, sqlite_path)
+
+def export_parquet(df, parquet_path):
+    """
+    Save the cleaned DataFrame as Parquet. Returns False (with a warning) when pyarrow is missing.
+    """
+    try:
+        df.to_parquet(parquet_path, index=False)
+    except ImportError as e:
+        print(f"[WARN] Parquet export skipped, later runs will re-clean the raw CSV: {e}")
+        return False
+    return True
+
+def load_cleaned_parquet(parquet_path):
+    """Memory-map a Parquet artifact written by export_parquet()."""
+    return pd.read_parquet(parquet_path, memory_map=True)
+
+def clean_dataframe(df, save_path=None, sqlite_path=None, parquet_path=None):
     """
     Clean and normalize a real estate DataFrame.
 
@@ -45,39 +155,137 @@ def clean_dataframe(df, save_path=None, sqlite_path=None):
         df (pd.DataFrame): The raw DataFrame.
         save_path (str, optional): Path to export cleaned CSV file.
         sqlite_path (str, optional): Path to export SQLite database.
+        parquet_path (str, optional): Path to export the Parquet artifact.
 
     Returns:
         pd.DataFrame: The cleaned DataFrame.
     """
-    df['Legal status'] = df['Legal status'].replace({
-        'Have certificate': 'Đã có sổ',
-        'Sale contract': 'Hợp đồng mua bán',
-        'Unk': 'Không rõ pháp lý'
-    })
+    # Work on a copy: the caller's DataFrame is left untouched
+    df = df.copy()
 
-    df['Furniture state'] = df['Furniture state'].replace({
-        'Basic': 'Nội thất cơ bản',
-        'Full': 'Nội thất đầy đủ',
-        'Unk': 'Không rõ nội thất'
-    })
+    for col, mapping in CLEANING_RULES['label_maps'].items():
+        df[col] = df[col].replace(mapping)
 
-    df['Price'] = (df['Price'] * 1_000_000_000).round()
+    df['Price'] = (df['Price'] * CLEANING_RULES['price_multiplier']).round()
 
-    df.drop(columns=['House_Level','is_project','Cluster_Label','Access Road'], inplace=True)
+    df = df.drop(columns=CLEANING_RULES['drop_columns'])
 
-    df[['Floors', 'Bedrooms', 'Bathrooms']] = df[['Floors', 'Bedrooms', 'Bathrooms']].astype('int')
+    int_columns = CLEANING_RULES['int_columns']
+    df[int_columns] = df[int_columns].astype('int')
 
     df.columns = [col.lower().strip().replace(" ", "_") for col in df.columns]
 
-    df['ward'] = df['ward'].replace('5', 'Phường 5')
-    df['district'] = df['district'].replace('5', 'Quận 5')
-    
+    for col, mapping in CLEANING_RULES['value_fixes'].items():
+        df[col] = df[col].replace(mapping)
+
     if sqlite_path:
-        conn = sqlite3.connect(sqlite_path)
-        df.to_sql('price_house', conn, if_exists='replace', index=False)
-        conn.close()
+        export_sqlite(df, sqlite_path)
 
     if save_path:
         df.to_csv(save_path, index=False, encoding='utf-8-sig')
 
+    if parquet_path:
+        export_parquet(df, parquet_path)
+
+    return df
+
+def rules_fingerprint():
+    """SHA-256 of CLEANING_VERSION and CLEANING_RULES."""
+    payload = json.dumps({'version': CLEANING_VERSION, 'rules': CLEANING_RULES}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def cleaning_fingerprint(raw_path, chunk_size=1 << 20):
+    """
+    SHA-256 of the raw file bytes and rules_fingerprint().
+
+    Returns:
+        str: Hex digest identifying one (raw data, cleaning rules) combination.
+    """
+    h = hashlib.sha256(rules_fingerprint().encode('utf-8'))
+    with open(raw_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def read_manifest(manifest_path):
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_manifest(manifest_path, manifest):
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+def load_or_clean(raw_path, save_path=None, sqlite_path=None, parquet_path=None, manifest_path=None):
+    """
+    Return the cleaned DataFrame, re-running clean_dataframe() only when the raw data or the rules changed.
+
+    The manifest (default: `clean_manifest.json` next to the SQLite file) stores the fingerprint of
+    the last clean together with the raw file's size and mtime. If size and mtime are unchanged the
+    stored fingerprint is trusted, so a warm start does not even read the raw file; otherwise the
+    file is hashed. On a match, and when every requested artifact exists, the cleaned data is
+    loaded from Parquet (or the cleaned CSV without pyarrow) and the database is left as is.
+
+    Args:
+        raw_path (str): Raw CSV file.
+        save_path, sqlite_path, parquet_path (str, optional): Artifacts, as in clean_dataframe().
+        manifest_path (str, optional): Where to keep the manifest.
+
+    Returns:
+        pd.DataFrame: The cleaned DataFrame.
+    """
+    if manifest_path is None:
+        out_path = sqlite_path or parquet_path or save_path
+        manifest_path = os.path.join(os.path.dirname(out_path) if out_path else '.', MANIFEST_NAME)
+    artifacts = {'csv': save_path, 'sqlite': sqlite_path, 'parquet': parquet_path}
+    artifacts = {k: v for k, v in artifacts.items() if v}
+
+    stat = os.stat(raw_path)
+    manifest = read_manifest(manifest_path)
+    if manifest and manifest.get('raw_size') == stat.st_size and manifest.get('raw_mtime_ns') == stat.st_mtime_ns:
+        fingerprint = manifest['fingerprint']
+        # The rules may have changed even if the raw file did not
+        if manifest.get('rules_fingerprint') != rules_fingerprint():
+            fingerprint = cleaning_fingerprint(raw_path)
+    else:
+        fingerprint = cleaning_fingerprint(raw_path)
+
+    if manifest and manifest.get('fingerprint') == fingerprint \
+            and all(manifest.get('artifacts', {}).get(k) == v and os.path.exists(v) for k, v in artifacts.items()):
+        df = None
+        if parquet_path and manifest.get('parquet_written'):
+            try:
+                df = load_cleaned_parquet(parquet_path)
+            except ImportError as e:
+                print(f"[WARN] Cannot read {parquet_path}: {e}")
+        if df is None and save_path:
+            df = pd.read_csv(save_path, encoding='utf-8-sig')
+        if df is not None:
+            print(f"[INFO] Cleaned artifacts are up to date ({fingerprint[:12]}), skipping cleaning")
+            if manifest.get('raw_mtime_ns') != stat.st_mtime_ns:
+                # Same content, new mtime (e.g. re-downloaded): remember it to skip hashing next time
+                write_manifest(manifest_path, {**manifest, 'raw_size': stat.st_size, 'raw_mtime_ns': stat.st_mtime_ns})
+            return df
+
+    for path in artifacts.values():
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    df = clean_dataframe(pd.read_csv(raw_path), save_path=save_path, sqlite_path=sqlite_path)
+    parquet_written = bool(parquet_path) and export_parquet(df, parquet_path)
+
+    # Written last: a crash while exporting leaves no manifest, so the next run cleans again
+    write_manifest(manifest_path, {
+        'fingerprint': fingerprint,
+        'rules_fingerprint': rules_fingerprint(),
+        'raw_path': raw_path,
+        'raw_size': stat.st_size,
+        'raw_mtime_ns': stat.st_mtime_ns,
+        'artifacts': artifacts,
+        'parquet_written': parquet_written,
+    })
     return df
@@ -0,0 +1,150 @@
+"""
+Module: dataset_writer.py
+
+Purpose:
+    Stream accepted Text-to-SQL samples to disk as they are validated, instead of keeping the
+    whole dataset in memory and dumping pretty-printed JSON at the end.
+
+Key Components:
+    - split_for(question): deterministic train / val / test assignment from a hash of the question,
+      so no second pass (train_test_split) is needed and a question always lands in the same split.
+    - StreamingDatasetWriter: appends one JSON object per line to `{split}_text2sql.jsonl`,
+      fsyncs every `fsync_every` samples, and records a checkpoint (generation state + byte
+      offset of each file) that `resume=True` rolls back to after a crash.
+
+Note:
+    On resume every file is truncated to the offsets of the last checkpoint, which drops half-written
+    lines and any samples past it; the caller regenerates them from the saved state.
+
+Usage:
+    from realestate_text_to_sql_modules.dataset_writer import StreamingDatasetWriter
+
+    writer = StreamingDatasetWriter("data/processing", resume=True)
+    writer.write({"Question": ..., "SQL": ..., "Schema": ...})
+    writer.checkpoint({"next_shard": 12})
+    writer.close()
+"""
+
+import hashlib
+import json
+import os
+from typing import Dict, Iterator, List, Tuple
+
+SPLITS = ['train', 'val', 'test']
+# Same proportions as the former train_test_split(0.15) + train_test_split(1/3): 85 / 10 / 5
+SPLIT_RATIOS = {'train': 0.85, 'val': 0.10, 'test': 0.05}
+CHECKPOINT_FILE = "checkpoint.json"
+
+def split_for(question: str, ratios: Dict[str, float] = SPLIT_RATIOS) -> str:
+    """Map a question to a split with a stable hash (independent of PYTHONHASHSEED)."""
+    h = int.from_bytes(hashlib.blake2b(question.encode("utf-8"), digest_size=8).digest(), "big")
+    u = h / 2**64
+    cumulative = 0.0
+    for split, ratio in ratios.items():
+        cumulative += ratio
+        if u < cumulative:
+            return split
+    return split
+
+class StreamingDatasetWriter:
+    """
+    Append-only JSONL writer for train / val / test splits with checkpoint-based resume.
+
+    Args:
+        out_dir (str): Folder for `{split}_text2sql.jsonl` and `checkpoint.json`.
+        resume (bool): Keep existing files (rolled back to the last checkpoint) instead of starting over.
+        fsync_every (int): Flush and fsync the files after this many written samples.
+    """
+
+    def __init__(self, out_dir: str, resume: bool = False, fsync_every: int = 200):
+        self.out_dir = out_dir
+        self.fsync_every = fsync_every
+        self.paths = {s: os.path.join(out_dir, f"{s}_text2sql.jsonl") for s in SPLITS}
+        self.checkpoint_path = os.path.join(out_dir, CHECKPOINT_FILE)
+        self.counts = {s: 0 for s in SPLITS}
+        self.state: dict = None
+        self._unsynced = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+        checkpoint = self._read_checkpoint() if resume else None
+        if checkpoint is not None:
+            self.state = checkpoint["state"]
+            self.counts = dict(checkpoint["counts"])
+            for split, path in self.paths.items():
+                offset = checkpoint["offsets"][split]
+                if not os.path.exists(path) or os.path.getsize(path) < offset:
+                    raise ValueError(f"{path} is shorter than its checkpoint; cannot resume")
+                with open(path, "r+b") as f:
+                    f.truncate(offset)
+            print(f"[INFO] Resuming from {self.checkpoint_path}: {len(self)} samples kept")
+        elif resume:
+            print(f"[INFO] No checkpoint in {out_dir}, starting a new dataset")
+
+        mode = "a" if checkpoint is not None else "w"
+        self._files = {s: open(p, mode + "b") for s, p in self.paths.items()}
+        if checkpoint is None and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def _read_checkpoint(self) -> dict:
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def records(self) -> Iterator[Tuple[str, dict]]:
+        """Yield (split, sample) for every sample already written, e.g. to rebuild dedup state on resume."""
+        self.flush()
+        for split, path in self.paths.items():
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    yield split, json.loads(line)
+
+    def write(self, sample: dict) -> str:
+        """Append one sample to the split chosen by its question. Returns the split name."""
+        split = split_for(sample["Question"])
+        self._files[split].write((json.dumps(sample, ensure_ascii=False) + "\n").encode("utf-8"))
+        self.counts[split] += 1
+        self._unsynced += 1
+        if self._unsynced >= self.fsync_every:
+            self.flush(sync=True)
+        return split
+
+    def flush(self, sync: bool = False) -> None:
+        for f in self._files.values():
+            f.flush()
+            if sync:
+                os.fsync(f.fileno())
+        if sync:
+            self._unsynced = 0
+
+    def checkpoint(self, state: dict) -> None:
+        """
+        Durably record `state` together with the current end of every split file.
+
+        The data files are fsynced first and the checkpoint is replaced atomically, so a crash
+        at any point leaves a checkpoint that only refers to bytes already on disk.
+        """
+        self.flush(sync=True)
+        self.state = state
+        payload = {
+            "state": state,
+            "counts": self.counts,
+            "offsets": {s: f.tell() for s, f in self._files.items()},
+        }
+        tmp_path = self.checkpoint_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def close(self) -> None:
+        self.flush(sync=True)
+        for f in self._files.values():
+            f.close()
+
+    def summary(self) -> List[str]:
+        return [f"{split}: {self.counts[split]} samples -> {self.paths[split]}" for split in SPLITS]
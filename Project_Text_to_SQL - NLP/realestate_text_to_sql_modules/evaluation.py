@@ -0,0 +1,323 @@
+"""
+Module: evaluation.py
+
+Purpose:
+    Test-set evaluation with metrics. `evaluate_test_set` in the phase-2 notebook generates SQL one
+    sample at a time and only prints the predicted and gold SQL. Here the test records go through
+    batched generation (batches of similar input length), and every prediction is scored on exact
+    match, WHERE-condition match and execution result, overall and per question type inferred
+    from the gold SQL shape, together with throughput and latency. The report is a JSON dict, so
+    runs can be stored and compared.
+
+Key Components:
+    - sql_shape(sql): question type from the SQL shape, named like SQLTypeManager's sql_type
+      (count_where, select_where_between_and, select_where_or, select_where_like,
+      select_orderby_desc_limit_k, select_orderby_desc_limit, select_orderby_asc_limit,
+      select_where_and, select_where, select).
+    - where_conditions(sql): canonical WHERE tree from a small dedicated parser (AND / OR kept,
+      BETWEEN x AND y as one condition, `!=` / `<>`, case-sensitive string literals).
+    - condition_match(pred_sql, gold_sql): same sql_components() (COUNT, WHERE tree, ORDER BY,
+      LIMIT), i.e. exact match up to condition order and formatting.
+    - generate_predictions(model, input_texts, batch_size): raw SQL per input plus the latency of
+      each sample (wall time of the generate_batch() call it was part of).
+    - evaluate(model, records, ...): report with `overall` and `by_type` metrics (exact_match,
+      condition_match, execution_accuracy, executable), samples/s, latency p50 / p95 and a few
+      failed samples.
+    - compare_reports(report, baseline): metric deltas against an earlier report.
+
+Note:
+    Execution accuracy compares result fingerprints (rewards.result_fingerprint) of the predicted
+    and gold SQL on a read-only SQLite database; gold fingerprints come from the on-disk
+    GoldFingerprintStore of the test split. Without `db_path` only the string metrics are computed.
+    Predictions are the raw model output, as in the notebook (no smart_fix_sql / location fixing).
+
+Usage:
+    from realestate_text_to_sql_modules.evaluation import evaluate
+    from realestate_text_to_sql_modules.inference_engine import load_model
+
+    model = load_model("torch", "model/Final_model", max_length=128)
+    report = evaluate(model, records, batch_size=32, db_path="data/processing/SQLite_real_estate.db",
+                      dataset_path="data/processing/phase2/test_text2sql.json")
+    print(report["overall"], report["latency_ms_p95"])
+"""
+
+import re
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from realestate_text_to_sql_modules.dedup import normalize_sql
+from realestate_text_to_sql_modules.inference_engine import percentile_ms
+from realestate_text_to_sql_modules.onnx_backend import model_input
+from realestate_text_to_sql_modules.rewards import ExecutionReward, GoldFingerprintStore
+
+EVAL_BATCH_SIZE = 32
+# max_len của generate_sql trong notebook
+EVAL_MAX_LENGTH = 128
+EVAL_REPORT_PATH = "model/eval_report.json"
+MAX_FAILURES = 20
+METRICS = ("exact_match", "condition_match", "execution_accuracy", "executable")
+
+COUNT_RE = re.compile(r"^\s*select\s+count\s*\(", re.IGNORECASE)
+WHERE_CLAUSE_RE = re.compile(r"\bwhere\b(.*?)(?:\border\s+by\b|\blimit\b|;|$)", re.IGNORECASE | re.DOTALL)
+ORDER_RE = re.compile(r"\border\s+by\s+(\w+)(?:\s+(asc|desc))?", re.IGNORECASE)
+LIMIT_RE = re.compile(r"\blimit\s+(\d+)", re.IGNORECASE)
+STRING_LITERAL_RE = re.compile(r"'[^']*'")
+# String literal ('' escapes a quote), number, identifier, two-char operator, single char
+SQL_TOKEN_RE = re.compile(r"'(?:[^']|'')*'|\d+(?:\.\d+)?(?:e[+-]?\d+)?|\w+|<>|!=|>=|<=|==|\S", re.IGNORECASE)
+COMPARISON_OPS = {"=": "=", "==": "=", "!=": "!=", "<>": "!=", ">": ">", "<": "<", ">=": ">=", "<=": "<="}
+
+def sql_shape(sql: str) -> str:
+    """Question type of a SQL query, from its shape (the sql_type names of SQLTypeManager)."""
+    if COUNT_RE.match(sql):
+        return "count_where"
+    where = WHERE_CLAUSE_RE.search(sql)
+    if where:
+        # Bỏ chuỗi trong dấu nháy để "and" / "or" trong tên địa điểm không bị tính
+        clause = STRING_LITERAL_RE.sub("''", where.group(1)).lower()
+        if re.search(r"\bbetween\b", clause):
+            return "select_where_between_and"
+        if re.search(r"\bor\b", clause):
+            return "select_where_or"
+        if re.search(r"\blike\b", clause):
+            return "select_where_like"
+    order = ORDER_RE.search(sql)
+    if order:
+        limit = LIMIT_RE.search(sql)
+        if (order.group(2) or "asc").lower() == "asc":
+            return "select_orderby_asc_limit"
+        return "select_orderby_desc_limit_k" if limit and int(limit.group(1)) > 1 else "select_orderby_desc_limit"
+    if where:
+        return "select_where_and" if re.search(r"\band\b", clause) else "select_where"
+    return "select"
+
+class _WhereParser:
+    """
+    Recursive-descent parser of a WHERE clause into a canonical condition tree:
+
+        expr := term (OR term)* ; term := factor (AND factor)* ; factor := "(" expr ")" | condition
+        condition := field [NOT] BETWEEN value AND value | field [NOT] LIKE value | field op value
+
+    AND / OR nodes keep their connective and sort their children (order-insensitive), BETWEEN is
+    one condition with both bounds, `<>` is read as `!=`, field names are lower-cased, numbers
+    compared as numbers and string literals kept case-sensitive (SQLite `=` is).
+    """
+
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def take(self, keyword: str = None) -> str:
+        token = self.peek()
+        if token is None or (keyword and token.lower() != keyword):
+            raise ValueError(f"expected {keyword or 'token'} at {token!r}")
+        self.pos += 1
+        return token
+
+    def accept(self, keyword: str) -> bool:
+        token = self.peek()
+        if token is not None and token.lower() == keyword:
+            self.pos += 1
+            return True
+        return False
+
+    def parse(self) -> tuple:
+        tree = self.expr()
+        if self.peek() is not None:
+            raise ValueError(f"unexpected {self.peek()!r}")
+        return tree
+
+    def _node(self, connective: str, children: List[tuple]) -> tuple:
+        flat = []
+        for child in children:
+            # (a AND b) AND c == a AND b AND c
+            flat.extend(child[1] if child[0] == connective else [child])
+        return flat[0] if len(flat) == 1 else (connective, tuple(sorted(flat, key=repr)))
+
+    def expr(self) -> tuple:
+        children = [self.term()]
+        while self.accept("or"):
+            children.append(self.term())
+        return self._node("or", children)
+
+    def term(self) -> tuple:
+        children = [self.factor()]
+        while self.accept("and"):
+            children.append(self.factor())
+        return self._node("and", children)
+
+    def factor(self) -> tuple:
+        if self.accept("("):
+            tree = self.expr()
+            self.take(")")
+            return tree
+        field = self.take().lower()
+        negated = self.accept("not")
+        if self.accept("between"):
+            low = self.value()
+            self.take("and")
+            return ("cond", field, "not between" if negated else "between", (low, self.value()))
+        if self.accept("like"):
+            return ("cond", field, "not like" if negated else "like", self.value())
+        op = self.take()
+        if negated or op not in COMPARISON_OPS:
+            raise ValueError(f"unknown operator {op!r}")
+        return ("cond", field, COMPARISON_OPS[op], self.value())
+
+    def value(self):
+        token = self.take()
+        if token.startswith("'"):
+            return token[1:-1].replace("''", "'")
+        try:
+            return float(token)
+        except ValueError:
+            return token.lower()
+
+def where_conditions(sql: str) -> Optional[tuple]:
+    """
+    Canonical condition tree of the WHERE clause (see _WhereParser), None without WHERE, or
+    ("unparsed", clause) for a clause the grammar does not cover (then only an identical clause matches).
+    """
+    tokens = SQL_TOKEN_RE.findall(sql)
+    lowered = [t.lower() for t in tokens]
+    if "where" not in lowered:
+        return None
+    start = lowered.index("where") + 1
+    end = start
+    while end < len(tokens) and lowered[end] not in ("order", "limit", "group", ";"):
+        end += 1
+    try:
+        return _WhereParser(tokens[start:end]).parse()
+    except ValueError:
+        return ("unparsed", " ".join(tokens[start:end]))
+
+def sql_components(sql: str) -> tuple:
+    """COUNT or not, WHERE condition tree, ORDER BY column / direction, LIMIT."""
+    order = ORDER_RE.search(sql)
+    limit = LIMIT_RE.search(sql)
+    return (
+        bool(COUNT_RE.match(sql)),
+        where_conditions(sql),
+        (order.group(1).lower(), (order.group(2) or "asc").lower()) if order else None,
+        int(limit.group(1)) if limit else None,
+    )
+
+def condition_match(pred_sql: str, gold_sql: str) -> bool:
+    """Same WHERE conditions (connectives kept, order ignored), and the same COUNT / ORDER BY / LIMIT."""
+    return sql_components(pred_sql) == sql_components(gold_sql)
+
+def generate_predictions(model, input_texts: Sequence[str], batch_size: int = EVAL_BATCH_SIZE) -> Tuple[List[str], List[float]]:
+    """
+    Batched generation in order of input length (less padding per batch), results in input order.
+
+    Returns:
+        (predictions, latencies): raw SQL per input and the seconds its generate_batch() call took.
+    """
+    order = sorted(range(len(input_texts)), key=lambda i: len(input_texts[i]))
+    predictions = [None] * len(input_texts)
+    latencies = [0.0] * len(input_texts)
+    for start in range(0, len(order), batch_size):
+        batch = order[start:start + batch_size]
+        t0 = time.perf_counter()
+        outputs = model.generate_batch([input_texts[i] for i in batch])
+        elapsed = time.perf_counter() - t0
+        for i, sql in zip(batch, outputs):
+            predictions[i] = sql
+            latencies[i] = elapsed
+    return predictions, latencies
+
+def _summarize(rows: List[dict], with_execution: bool) -> Dict[str, float]:
+    n = len(rows)
+    summary = {"samples": n}
+    for metric in METRICS:
+        if metric in ("execution_accuracy", "executable") and not with_execution:
+            continue
+        summary[metric] = sum(r[metric] for r in rows) / n if n else 0.0
+    return summary
+
+def evaluate(model, records: List[dict], batch_size: int = EVAL_BATCH_SIZE, db_path: str = None,
+             dataset_path: str = None, execution_timeout: float = None) -> Dict:
+    """
+    Evaluate a model on Text-to-SQL test records.
+
+    Args:
+        model: Object with generate_batch(input_texts) (inference_engine.load_model()).
+        records (list): Test records with Question / Schema / SQL.
+        batch_size (int): Inputs per generate_batch() call.
+        db_path (str, optional): SQLite database for execution accuracy (skipped when None).
+        dataset_path (str, optional): Test split file, to keep its gold fingerprints on disk
+            (GoldFingerprintStore.for_dataset); otherwise they are computed in memory.
+        execution_timeout (float, optional): Seconds per predicted query (rewards.EXECUTION_TIMEOUT).
+
+    Returns:
+        dict: samples, samples_per_second, latency_ms_p50 / p95, overall and by_type metrics,
+            failures (first MAX_FAILURES samples that are not an exact match).
+    """
+    input_texts = [model_input(r) for r in records]
+    start = time.perf_counter()
+    predictions, latencies = generate_predictions(model, input_texts, batch_size)
+    generation_s = time.perf_counter() - start
+
+    execution = None
+    if db_path:
+        if dataset_path:
+            store = GoldFingerprintStore.for_dataset(dataset_path, db_path=db_path)
+        else:
+            store = GoldFingerprintStore(db_path)
+            store.build(r["SQL"] for r in records)
+        kwargs = {"timeout": execution_timeout} if execution_timeout else {}
+        execution = ExecutionReward(store, fallback=None, **kwargs)
+
+    rows = []
+    for record, pred in zip(records, predictions):
+        gold = record["SQL"]
+        row = {
+            "type": sql_shape(gold),
+            "exact_match": normalize_sql(pred) == normalize_sql(gold),
+            "condition_match": condition_match(pred, gold),
+        }
+        if execution is not None:
+            row["execution_accuracy"] = execution(pred, gold) == 1.0
+            row["executable"] = execution.fingerprint(pred) is not None
+        rows.append(row)
+    if execution is not None:
+        execution.pool.close()
+
+    by_type = defaultdict(list)
+    for row in rows:
+        by_type[row["type"]].append(row)
+    n = len(records)
+    failures = [
+        {"question": r["Question"], "type": row["type"], "predicted": pred, "gold": r["SQL"]}
+        for r, pred, row in zip(records, predictions, rows) if not row["exact_match"]
+    ]
+    return {
+        "samples": n,
+        "batch_size": batch_size,
+        "generation_s": generation_s,
+        "samples_per_second": n / generation_s if generation_s else 0.0,
+        "latency_ms_p50": percentile_ms(latencies, 50),
+        "latency_ms_p95": percentile_ms(latencies, 95),
+        "overall": _summarize(rows, execution is not None),
+        "by_type": {t: _summarize(group, execution is not None) for t, group in sorted(by_type.items())},
+        "failures": failures[:MAX_FAILURES],
+    }
+
+def compare_reports(report: Dict, baseline: Dict) -> Dict[str, float]:
+    """Deltas (report - baseline) of the overall metrics, per-type metrics and throughput / latency."""
+    deltas = {}
+    for key in ("samples_per_second", "latency_ms_p50", "latency_ms_p95"):
+        if key in report and key in baseline:
+            deltas[key] = report[key] - baseline[key]
+    for metric in METRICS:
+        if metric in report["overall"] and metric in baseline.get("overall", {}):
+            deltas[metric] = report["overall"][metric] - baseline["overall"][metric]
+    for t, summary in report["by_type"].items():
+        old = baseline.get("by_type", {}).get(t, {})
+        for metric in METRICS:
+            if metric in summary and metric in old:
+                deltas[f"{t}.{metric}"] = summary[metric] - old[metric]
+    return deltas
@@ -0,0 +1,213 @@
+"""
+Module: http_service.py
+
+Purpose:
+    Asynchronous HTTP API for the Text-to-SQL model, replacing the notebook's blocking Gradio
+    `handle_query` for serving. The event loop only parses requests and awaits results: model
+    inference runs on the InferenceEngine's micro-batching thread, SQLite reads on a small thread
+    pool, so slow requests never block the loop.
+
+Key Components:
+    - Text2SQLService(engine, db_path, ...): the request pipeline (normalize -> extract location
+      -> generate -> fix SQL -> run query) with:
+        + backpressure: at most `max_pending` requests in flight, the rest get 503 + Retry-After
+          instead of queueing without bound; a slot is held until the request's model / SQLite
+          work finishes, even when the client already got its 504;
+        + per-request timeout: 504 once `request_timeout` seconds have passed;
+        + graceful shutdown: new requests get 503, in-flight ones are allowed to finish (up to
+          `shutdown_timeout`), then the engine's queue is drained and the pools are closed.
+    - create_app(service): aiohttp application with
+        + POST /sql    {"question": "..."} -> {"sql", "normalized_question", "location", "latency_ms"}
+        + POST /query  {"question": "...", "page": 0} -> the same plus {"columns", "rows",
+          "row_count", "page"} (one page of `max_rows` rows, read through a pooled read-only
+          connection), or status 422 with {"error"} when SQLite rejects or times out the SQL
+        + GET  /health -> in-flight / served / rejected / timed-out counters and batcher stats
+
+Usage:
+    python serve.py --port 8080 --max-pending 64 --timeout 10
+
+    curl -X POST localhost:8080/query -H "Content-Type: application/json" \\
+         -d '{"question": "Nhà dưới 3 tỷ ở Gò Vấp"}'
+"""
+
+import asyncio
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from aiohttp import web
+
+from realestate_text_to_sql_modules.sql_utils import DEFAULT_DB_PATH, ConnectionPool, run_query
+
+MAX_PENDING = 64
+REQUEST_TIMEOUT = 10.0
+DB_WORKERS = 4
+MAX_ROWS = 200
+SHUTDOWN_TIMEOUT = 30.0
+
+class Text2SQLService:
+    """
+    Question -> SQL -> rows, with bounded concurrency and timeouts.
+
+    Args:
+        engine: InferenceEngine (prepare() on the loop thread, submit_prepared() for the model).
+        db_path (str): SQLite database queried by /query.
+        max_pending (int): Requests allowed in flight before new ones are rejected with 503.
+        request_timeout (float): Seconds before a request is answered with 504.
+        db_workers (int): Threads for SQLite reads (and pooled connections).
+        max_rows (int): Row limit of /query results.
+        shutdown_timeout (float): How long shutdown waits for in-flight requests.
+    """
+
+    def __init__(self, engine, db_path: str = DEFAULT_DB_PATH, max_pending: int = MAX_PENDING,
+                 request_timeout: float = REQUEST_TIMEOUT, db_workers: int = DB_WORKERS, max_rows: int = MAX_ROWS,
+                 shutdown_timeout: float = SHUTDOWN_TIMEOUT):
+        self.engine = engine
+        self.db_path = db_path
+        self.max_pending = max_pending
+        self.request_timeout = request_timeout
+        self.max_rows = max_rows
+        self.shutdown_timeout = shutdown_timeout
+        self.db_pool = ThreadPoolExecutor(max_workers=db_workers, thread_name_prefix="sqlite")
+        self.connections = ConnectionPool(db_path, size=db_workers)
+        self.in_flight = 0
+        self.draining = False
+        self.counters = Counter()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._background = set()
+
+    def _admit(self) -> bool:
+        """Reserve an in-flight slot (the check and the reservation happen together on the loop)."""
+        if self.in_flight >= self.max_pending:
+            return False
+        self.in_flight += 1
+        self._idle.clear()
+        return True
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    def _release_when_done(self, pending: list) -> None:
+        """
+        Free the slot once the request's model / SQLite work has finished. After a 504 the engine
+        still generates for the request, so its slot stays taken until that future resolves and
+        the model queue never holds more than `max_pending` requests.
+        """
+        running = [f for f in pending if not f.done()]
+        if not running:
+            self._release()
+            return
+
+        async def wait_and_release():
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in running), return_exceptions=True)
+            self._release()
+
+        task = asyncio.ensure_future(wait_and_release())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _sql(self, raw_question: str, pending: list) -> dict:
+        prepared = self.engine.prepare(raw_question)
+        future = self.engine.submit_prepared(prepared)
+        pending.append(future)
+        sql = await asyncio.wrap_future(future)
+        return {"sql": sql, "normalized_question": prepared["question"], "location": prepared["location"]}
+
+    async def _query(self, raw_question: str, pending: list, page: int = 0) -> dict:
+        result = await self._sql(raw_question, pending)
+        future = self.db_pool.submit(run_query, result["sql"], self.db_path, self.max_rows, page=page,
+                                     pool=self.connections)
+        pending.append(future)
+        df = await asyncio.wrap_future(future)
+        if list(df.columns) == ["Lỗi"]:
+            result["error"] = str(df.iloc[0, 0])
+            return result
+        table = json.loads(df.to_json(orient="split", index=False, force_ascii=False))
+        result.update({"columns": table["columns"], "rows": table["data"], "row_count": len(df), "page": page})
+        return result
+
+    async def handle(self, request: web.Request, step) -> web.Response:
+        """Admission control, timeout and JSON framing around one pipeline step."""
+        if self.draining:
+            self.counters["rejected"] += 1
+            return web.json_response({"error": "Service is shutting down"}, status=503)
+        if not self._admit():
+            self.counters["rejected"] += 1
+            return web.json_response({"error": "Too many requests in flight"}, status=503, headers={"Retry-After": "1"})
+
+        # Futures of the engine / SQLite work started for this request; the slot is freed with them
+        pending = []
+        try:
+            try:
+                body = await request.json() if request.can_read_body else dict(request.query)
+            except ValueError:
+                return web.json_response({"error": "Body must be JSON"}, status=400)
+            question = body.get("question") if isinstance(body, dict) else None
+            if not isinstance(question, str) or not question.strip():
+                return web.json_response({"error": "Missing 'question'"}, status=400)
+            kwargs = {}
+            if step == self._query:
+                try:
+                    kwargs["page"] = max(int(body.get("page", 0)), 0)
+                except (TypeError, ValueError):
+                    return web.json_response({"error": "'page' must be an integer"}, status=400)
+
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(step(question, pending, **kwargs), self.request_timeout)
+            except asyncio.TimeoutError:
+                self.counters["timed_out"] += 1
+                return web.json_response({"error": f"Timed out after {self.request_timeout:g}s"}, status=504)
+            except Exception as e:
+                self.counters["failed"] += 1
+                return web.json_response({"error": str(e)}, status=500)
+        finally:
+            self._release_when_done(pending)
+        self.counters["served"] += 1
+        result["latency_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return web.json_response(result, status=422 if "error" in result else 200,
+                                 dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+    async def sql_endpoint(self, request: web.Request) -> web.Response:
+        return await self.handle(request, self._sql)
+
+    async def query_endpoint(self, request: web.Request) -> web.Response:
+        return await self.handle(request, self._query)
+
+    async def health_endpoint(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "status": "draining" if self.draining else "ok",
+            "in_flight": self.in_flight,
+            "max_pending": self.max_pending,
+            **self.counters,
+            "batcher": self.engine.stats(),
+        })
+
+    async def drain(self, app: web.Application = None) -> None:
+        """Stop admitting requests and wait for the ones in flight."""
+        self.draining = True
+        print(f"[INFO] Shutting down, waiting for {self.in_flight} in-flight request(s)")
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.shutdown_timeout)
+        except asyncio.TimeoutError:
+            print(f"[WARN] {self.in_flight} request(s) still running after {self.shutdown_timeout:g}s")
+
+    async def close(self, app: web.Application = None) -> None:
+        """Let the engine finish its queue, then release the thread pools."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.engine.close)
+        self.db_pool.shutdown(wait=True)
+        self.connections.close()
+        print(f"[INFO] Stopped: {dict(self.counters)}")
+
+def create_app(service: Text2SQLService) -> web.Application:
+    app = web.Application()
+    app.router.add_post("/sql", service.sql_endpoint)
+    app.router.add_post("/query", service.query_endpoint)
+    app.router.add_get("/health", service.health_endpoint)
+    app.on_shutdown.append(service.drain)
+    app.on_cleanup.append(service.close)
+    return app
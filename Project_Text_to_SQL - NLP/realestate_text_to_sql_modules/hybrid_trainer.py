@@ -0,0 +1,201 @@
+"""
+Module: hybrid_trainer.py
+
+Purpose:
+    Phase-2 HybridTrainer (CE + reward loss) from `notebooks/Phase_2_CE+RL_final_model.ipynb`,
+    with the reward path made cheap enough that hybrid epochs cost close to CE-only ones:
+        - the rollout reuses the encoder output of the CE forward pass (generate() gets
+          `encoder_outputs` instead of re-encoding input_ids),
+        - rewards go through rewards.RewardScorer (memoized per (pred, gold) across steps and
+          epochs, misses scored on a process pool),
+        - with `rollout_every=k`, a new rollout is generated every k steps and the last reward
+          is reused in between.
+
+Key Components:
+    - HybridTrainer(reward_fn, tokenizer, ..., reward_workers, rollout_every): transformers.Trainer
+      whose compute_loss logs ce_loss / reward / hybrid_loss plus the cost of each part of the step.
+    - LogLossToCSVCallback(log_path): one CSV row per logging step (CE loss) and per hybrid step
+      (reward, hybrid loss, ce_ms / rollout_ms / reward_ms / step_ms, reward cache hit rate,
+      whether the rollout was refreshed).
+
+Note:
+    As in the notebook, `reward_loss = 1 - mean reward` is a constant with respect to the model
+    parameters, so the gradient is alpha * grad(CE) either way: `rollout_every` only changes how
+    often the logged reward / hybrid loss are refreshed, not the updates.
+
+Usage:
+    from realestate_text_to_sql_modules.hybrid_trainer import HybridTrainer, LogLossToCSVCallback
+    from realestate_text_to_sql_modules.rewards import reward_fn_simple, reward_fn_v3
+
+    trainer = HybridTrainer(
+        model=model, args=training_args, train_dataset=tokenized_train, eval_dataset=tokenized_val,
+        data_collator=data_collator, tokenizer=tokenizer,
+        reward_fn=reward_fn_v3, reward_fn_simple=reward_fn_simple, hybrid_start_epoch=2, alpha=0.7, beta=0.3,
+        reward_workers=4, rollout_every=4,
+        callbacks=[LogLossToCSVCallback(log_path="model/logs/training_log_phase2.csv")],
+    )
+    trainer.train()
+
+    # Execution-based reward: gold result fingerprints precomputed once next to the dataset
+    from realestate_text_to_sql_modules.rewards import ExecutionReward, GoldFingerprintStore
+    store = GoldFingerprintStore.for_dataset("data/processing/phase3/train_text2sql.json")
+    trainer = HybridTrainer(..., reward_fn=ExecutionReward(store), reward_workers=4)
+"""
+
+import csv
+import time
+
+from transformers import Trainer, TrainerCallback
+from transformers.modeling_outputs import BaseModelOutput
+
+from realestate_text_to_sql_modules.rewards import REWARD_CACHE_SIZE, RewardScorer
+
+ROLLOUT_MAX_LENGTH = 64
+
+class HybridTrainer(Trainer):
+    """Custom trainer that combines cross-entropy loss with a logic-based reward loss."""
+
+    def __init__(self, reward_fn, tokenizer, reward_fn_simple=None,
+                 hybrid_start_epoch=1, alpha=0.7, beta=0.3, reward_workers=0, reward_cache_size=REWARD_CACHE_SIZE,
+                 rollout_every=1, rollout_max_length=ROLLOUT_MAX_LENGTH, *args, **kwargs):
+        """Initializes hybrid trainer with reward function and loss weights.
+        Args:
+            reward_fn (callable): Computes logic-aware reward between prediction and gold.
+            tokenizer (PreTrainedTokenizer): Tokenizer for decoding sequences.
+            reward_fn_simple (callable, optional): Fallback reward function.
+            hybrid_start_epoch (int): Epoch to start applying reward-based loss.
+            alpha (float): Weight for CE loss.
+            beta (float): Weight for reward loss.
+            reward_workers (int): Processes scoring rewards (0: in the training process).
+            reward_cache_size (int): Memoized (pred, gold) rewards.
+            rollout_every (int): Generate a new rollout every k hybrid compute_loss calls, reuse the
+                last reward in between.
+            rollout_max_length (int): max_length of the rollout generate().
+        """
+        kwargs.pop("tokenizer", None)
+        super().__init__(*args, **kwargs)
+
+        self.tokenizer = tokenizer
+        self.reward_fn = reward_fn
+        self.reward_fn_simple = reward_fn_simple
+        self.hybrid_start_epoch = hybrid_start_epoch
+        self.alpha = alpha
+        self.beta = beta
+        self.rollout_every = max(1, rollout_every)
+        self.rollout_max_length = rollout_max_length
+        self.reward_scorer = RewardScorer(reward_fn, workers=reward_workers, cache_size=reward_cache_size)
+        self._last_reward = None
+        self._hybrid_steps = 0
+
+    def _rollout_rewards(self, model, inputs, outputs):
+        """Greedy rollout from the CE pass's encoder output, decoded and scored against the labels."""
+        start = time.perf_counter()
+        encoder_outputs = BaseModelOutput(last_hidden_state=outputs.encoder_last_hidden_state.detach())
+        generated_tokens = model.generate(
+            encoder_outputs=encoder_outputs,
+            attention_mask=inputs["attention_mask"],
+            max_length=self.rollout_max_length,
+            decoder_start_token_id=model.config.decoder_start_token_id,
+            pad_token_id=self.tokenizer.pad_token_id
+        )
+        preds = self.tokenizer.batch_decode(generated_tokens, skip_special_tokens=True)
+        # -100 (ignored positions) is not a token id
+        labels = inputs["labels"].masked_fill(inputs["labels"] == -100, self.tokenizer.pad_token_id)
+        golds = self.tokenizer.batch_decode(labels, skip_special_tokens=True)
+        rollout_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rewards = self.reward_scorer.score(preds, golds)
+        reward_s = time.perf_counter() - start
+        return (sum(rewards) / len(rewards) if rewards else 0.0), rollout_s, reward_s
+
+    def compute_loss(self, model, inputs, return_outputs=False, num_items_in_batch=None):
+        """Computes hybrid loss: CE + reward-based loss.
+        Uses CE loss before hybrid_start_epoch, then combines CE and reward losses.
+        Logs CE loss, reward score, hybrid loss and the time spent in each part at each step.
+        """
+        step_start = time.perf_counter()
+        outputs = model(**inputs)
+        ce_loss = outputs.loss
+
+        epoch = self.state.epoch or 0
+        if epoch < self.hybrid_start_epoch:
+            return (ce_loss, outputs) if return_outputs else ce_loss
+        # .item() waits for the forward pass, so ce_ms is its real cost on GPU too
+        ce_value = ce_loss.item()
+        ce_s = time.perf_counter() - step_start
+
+        step = self.state.global_step
+        # Counted per compute_loss call: with gradient accumulation global_step repeats
+        refreshed = self._last_reward is None or self._hybrid_steps % self.rollout_every == 0
+        self._hybrid_steps += 1
+        rollout_s = reward_s = 0.0
+        if refreshed:
+            self._last_reward, rollout_s, reward_s = self._rollout_rewards(model, inputs, outputs)
+        avg_reward = self._last_reward
+
+        reward_loss = 1.0 - avg_reward
+        hybrid_loss = self.alpha * ce_loss + self.beta * reward_loss
+        step_s = time.perf_counter() - step_start
+        print(f"[Hybrid] Step {step} | CE: {ce_value:.4f} | Reward: {avg_reward:.4f} | Hybrid: {hybrid_loss.item():.4f}"
+              f" | {step_s * 1000:.0f} ms (rollout {rollout_s * 1000:.0f}, reward {reward_s * 1000:.0f})")
+
+        self.log({
+            "ce_loss": ce_value,
+            "reward": avg_reward,
+            "hybrid_loss": hybrid_loss.item(),
+            "ce_ms": ce_s * 1000,
+            "rollout_ms": rollout_s * 1000,
+            "reward_ms": reward_s * 1000,
+            "step_ms": step_s * 1000,
+            "reward_cache_hit_rate": self.reward_scorer.stats()["hit_rate"],
+            "rollout_refreshed": int(refreshed),
+        })
+
+        return (hybrid_loss, outputs) if return_outputs else hybrid_loss
+
+    def train(self, *args, **kwargs):
+        """Trainer.train(), then report the reward memo and stop the scoring processes."""
+        try:
+            return super().train(*args, **kwargs)
+        finally:
+            print(f"[INFO] Reward scorer: {self.reward_scorer.stats()}")
+            self.reward_scorer.close()
+
+class LogLossToCSVCallback(TrainerCallback):
+    """
+    Logs CE loss, reward, hybrid loss and the per-step cost to a CSV file.
+
+    Creates the CSV file with headers on the first log, then appends one row per logging step
+    (Trainer's "loss") and one per hybrid step (HybridTrainer's "hybrid_loss").
+    """
+
+    COLUMNS = ["step", "ce_loss", "reward", "hybrid_loss", "ce_ms", "rollout_ms", "reward_ms", "step_ms",
+               "reward_cache_hit_rate", "rollout_refreshed"]
+
+    def __init__(self, log_path="loss_log.csv"):
+        """
+        Initializes the callback with the path to the CSV log file.
+
+        Args:
+            log_path (str): Path to the CSV file where logs will be written.
+        """
+        self.log_path = log_path
+        self.header_written = False
+
+    def on_log(self, args, state, control, logs=None, **kwargs):
+        """
+        Writes training step metrics (CE loss, reward, hybrid loss, step cost) to a CSV file.
+        Skips logs that are neither a training-loss nor a hybrid-step entry (e.g. evaluation).
+        """
+        if not logs or ("loss" not in logs and "hybrid_loss" not in logs):
+            return
+
+        if not self.header_written:
+            with open(self.log_path, "w", newline="") as f:
+                csv.writer(f).writerow(self.COLUMNS)
+            self.header_written = True
+
+        row = {"step": state.global_step, "ce_loss": logs.get("ce_loss", logs.get("loss"))}
+        with open(self.log_path, "a", newline="") as f:
+            csv.writer(f).writerow([row.get(col, logs.get(col)) for col in self.COLUMNS])
@@ -0,0 +1,357 @@
+"""
+Module: inference_engine.py
+
+Purpose:
+    Batched ViT5 Text-to-SQL inference. `inference_sql_from_question` in the Gradio notebook runs
+    `model.generate` on one question at a time; under concurrent load most of each forward pass
+    is wasted. Here concurrent requests are grouped by a dynamic micro-batcher, padded to the
+    longest input of the batch and generated together.
+
+Key Components:
+    - MicroBatcher(process_fn, max_batch_size, max_wait_ms): background thread that collects items
+      until the batch is full or the oldest item has waited `max_wait_ms`, calls `process_fn(items)`
+      once, and resolves each caller's Future. Reports queue-wait / batch-size / batch-latency metrics.
+    - Text2SQLModel(model_dir): tokenizer + T5 model; generate_batch(input_texts) -> raw SQL strings.
+      With `constrained=True`, decoding follows the SQL grammar of constrained_decoding.
+    - load_model(backend, model_dir): Text2SQLModel for "torch", onnx_backend.ONNXText2SQLModel
+      (exported / int8 graphs for CPU) for "onnx".
+    - InferenceEngine: normalize -> extract location -> model input -> micro-batched generate
+      -> smart_fix_sql -> fix_location_in_sql, with the batching knobs exposed.
+
+Note:
+    `max_batch_size` and `max_wait_ms` trade latency for throughput: a single request waits at most
+    `max_wait_ms` for company; `max_wait_ms=0` only batches requests that are already queued.
+
+Usage:
+    from realestate_text_to_sql_modules.inference_engine import InferenceEngine
+
+    engine = InferenceEngine(model_dir="model/Final_model", max_batch_size=16, max_wait_ms=10)
+    engine = InferenceEngine(backend="onnx", model_dir="model/Final_model_onnx_int8")
+    sql = engine.infer("Nhà dưới 3 tỷ ở Gò Vấp")
+    futures = [engine.submit(q) for q in questions]     # from any number of threads
+    print(engine.stats())                               # queue_wait_ms_p50 / p95, mean_batch_size, ...
+    engine.close()
+"""
+
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Callable, Dict, List, Sequence
+
+import numpy as np
+
+from realestate_text_to_sql_modules.question_processing import (
+    FULL_SCHEMA,
+    LocationMatcher,
+    extract_relevant_columns_from_question,
+    fix_location_in_sql,
+    generate_input_text,
+    load_locations,
+    normalize_question,
+    smart_fix_sql,
+)
+
+MODEL_DIR = "model/Final_model"
+LOCATIONS_PATH = "data/processing/locations_flat.json"
+MAX_BATCH_SIZE = 8
+MAX_WAIT_MS = 10.0
+MAX_LENGTH = 64
+
+_STOP = object()
+
+def percentile_ms(values: Sequence[float], q: float) -> float:
+    """q-th percentile of durations in seconds, in milliseconds (0.0 when empty)."""
+    return float(np.percentile(values, q) * 1000) if len(values) else 0.0
+
+class MicroBatcher:
+    """
+    Group items submitted from many threads into batches for one `process_fn` call.
+
+    Args:
+        process_fn (Callable[[List], List]): Processes a batch, returns one result per item in order.
+        max_batch_size (int): Upper bound on the batch size.
+        max_wait_ms (float): How long the oldest queued item may wait for the batch to fill up.
+        metrics_window (int): Number of recent items / batches kept for the percentile metrics.
+    """
+
+    def __init__(self, process_fn: Callable[[List], List], max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, metrics_window: int = 10_000):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.process_fn = process_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self._queue: "queue.Queue" = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+
+        self._queue_wait = deque(maxlen=metrics_window)
+        self._batch_latency = deque(maxlen=metrics_window)
+        self._batch_sizes = deque(maxlen=metrics_window)
+        self._num_items = 0
+        self._num_batches = 0
+        self._num_errors = 0
+
+        self._thread = threading.Thread(target=self._run, name="MicroBatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, item) -> Future:
+        """Queue one item; the returned Future resolves to its result (or raises its batch's error)."""
+        if self._closed:
+            raise RuntimeError("MicroBatcher is closed")
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def __call__(self, item, timeout: float = None):
+        return self.submit(item).result(timeout)
+
+    def _collect(self):
+        """Block for the first item, then gather more until the batch is full or its deadline passes."""
+        first = self._queue.get()
+        if first is _STOP:
+            return None, True
+        batch = [first]
+        # The wait budget starts when the oldest item was submitted, not when the worker got free
+        deadline = first[2] + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                entry = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if batch:
+                self._process(batch)
+        # Anything that slipped in after close() will never be processed
+        while True:
+            try:
+                entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is not _STOP:
+                entry[1].set_exception(RuntimeError("MicroBatcher is closed"))
+
+    def _process(self, batch):
+        start = time.perf_counter()
+        # Callers may have cancelled while waiting
+        batch = [entry for entry in batch if entry[1].set_running_or_notify_cancel()]
+        if not batch:
+            return
+        items = [entry[0] for entry in batch]
+        try:
+            results = self.process_fn(items)
+            if len(results) != len(items):
+                raise ValueError(f"process_fn returned {len(results)} results for {len(items)} items")
+        except Exception as e:
+            for _, future, _ in batch:
+                future.set_exception(e)
+            error = True
+        else:
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            error = False
+        end = time.perf_counter()
+
+        with self._lock:
+            self._queue_wait.extend(start - submitted for _, _, submitted in batch)
+            self._batch_latency.append(end - start)
+            self._batch_sizes.append(len(batch))
+            self._num_items += len(batch)
+            self._num_batches += 1
+            self._num_errors += error
+
+    def stats(self) -> Dict[str, float]:
+        """Throughput counters and latency percentiles over the last `metrics_window` items / batches."""
+        with self._lock:
+            queue_wait = list(self._queue_wait)
+            batch_latency = list(self._batch_latency)
+            batch_sizes = list(self._batch_sizes)
+            num_items, num_batches, num_errors = self._num_items, self._num_batches, self._num_errors
+        return {
+            "items": num_items,
+            "batches": num_batches,
+            "failed_batches": num_errors,
+            "queued": self._queue.qsize(),
+            "mean_batch_size": float(np.mean(batch_sizes)) if batch_sizes else 0.0,
+            "batch_size_histogram": dict(sorted(Counter(batch_sizes).items())),
+            "queue_wait_ms_p50": percentile_ms(queue_wait, 50),
+            "queue_wait_ms_p95": percentile_ms(queue_wait, 95),
+            "batch_ms_p50": percentile_ms(batch_latency, 50),
+            "batch_ms_p95": percentile_ms(batch_latency, 95),
+        }
+
+    def close(self, timeout: float = None) -> None:
+        """Process everything already queued, then stop the worker thread."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class Text2SQLModel:
+    """
+    ViT5 tokenizer + model with batched greedy generation.
+
+    torch / transformers are imported here so the rest of the module works without them.
+    With `constrained`, only tokens that keep the output inside the SQL grammar are allowed; greedy
+    decoding then uses constrained_generate (forced spans in one decoder call), beam search uses
+    generate() with the same constraint. `decode_stats` accumulates its counters.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR, device: str = None, max_length: int = MAX_LENGTH, num_beams: int = 1,
+                 constrained: bool = False):
+        import torch
+        from transformers import T5ForConditionalGeneration, T5Tokenizer
+
+        self.torch = torch
+        self.device = torch.device(device or ("cuda" if torch.cuda.is_available() else "cpu"))
+        self.tokenizer = T5Tokenizer.from_pretrained(model_dir)
+        # safetensors weights are memory-mapped instead of unpickled (see warm_start.ensure_safetensors)
+        has_safetensors = os.path.exists(os.path.join(model_dir, "model.safetensors"))
+        self.model = T5ForConditionalGeneration.from_pretrained(model_dir, use_safetensors=has_safetensors or None)
+        self.model.eval().to(self.device)
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.constraint = None
+        self.decode_stats = Counter()
+        if constrained:
+            from realestate_text_to_sql_modules.constrained_decoding import GrammarConstraint
+            self.constraint = GrammarConstraint(self.tokenizer)
+
+    def generate_batch(self, input_texts: List[str]) -> List[str]:
+        """Tokenize with padding to the longest input of the batch and decode all outputs."""
+        if self.constraint is not None and self.num_beams == 1:
+            from realestate_text_to_sql_modules.constrained_decoding import constrained_generate
+            sqls, stats = constrained_generate(self.model, self.tokenizer, input_texts, self.constraint,
+                                               max_length=self.max_length, device=self.device)
+            self.decode_stats.update(stats)
+            return sqls
+        inputs = self.tokenizer(list(input_texts), return_tensors="pt", padding="longest", truncation=True).to(self.device)
+        with self.torch.inference_mode():
+            outputs = self.model.generate(
+                inputs.input_ids,
+                attention_mask=inputs.attention_mask,
+                max_length=self.max_length,
+                num_beams=self.num_beams,
+                decoder_start_token_id=self.model.config.decoder_start_token_id,
+                pad_token_id=self.tokenizer.pad_token_id,
+                prefix_allowed_tokens_fn=self.constraint.prefix_allowed_tokens_fn if self.constraint else None
+            )
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+def load_model(backend: str = "torch", model_dir: str = MODEL_DIR, device: str = None, max_length: int = MAX_LENGTH,
+               constrained: bool = False):
+    """Model with generate_batch() for the given backend ("torch" or "onnx")."""
+    if backend == "torch":
+        return Text2SQLModel(model_dir, device=device, max_length=max_length, constrained=constrained)
+    if backend == "onnx":
+        from realestate_text_to_sql_modules.onnx_backend import ONNXText2SQLModel
+        return ONNXText2SQLModel(model_dir, max_length=max_length, constrained=constrained)
+    raise ValueError(f"Unknown backend: {backend!r} (expected 'torch' or 'onnx')")
+
+class InferenceEngine:
+    """
+    Question -> SQL with micro-batched generation.
+
+    Pre-processing runs on the caller's thread; only the model call is batched.
+
+    Args:
+        model: Object with `generate_batch(input_texts) -> List[str]`; loaded from `model_dir`
+            with load_model(backend) when omitted.
+        backend (str): "torch" (checkpoint directory) or "onnx" (onnx_backend export directory).
+        constrained (bool): Grammar-constrained decoding (see constrained_decoding).
+        locations (list, optional): Flattened locations; loaded from `locations_path` when omitted.
+        location_matcher (LocationMatcher, optional): Prebuilt matcher for `locations` (e.g. from the
+            warm_start cache); built here when omitted.
+        max_batch_size (int), max_wait_ms (float): Micro-batching knobs (see MicroBatcher).
+    """
+
+    def __init__(self, model=None, model_dir: str = MODEL_DIR, locations: list = None, locations_path: str = LOCATIONS_PATH,
+                 schema: list = FULL_SCHEMA, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS,
+                 device: str = None, max_length: int = MAX_LENGTH, backend: str = "torch", constrained: bool = False,
+                 location_matcher: LocationMatcher = None):
+        self.model = model if model is not None else load_model(backend, model_dir, device=device, max_length=max_length,
+                                                                constrained=constrained)
+        self.locations = locations if locations is not None else load_locations(locations_path)
+        self.location_matcher = location_matcher if location_matcher is not None else LocationMatcher(self.locations)
+        self.schema = schema
+        self.batcher = MicroBatcher(self.model.generate_batch, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+    def prepare(self, raw_question: str) -> dict:
+        """Steps before the model: normalized question, matched location and model input text."""
+        question = normalize_question(raw_question)
+        matched_location = self.location_matcher.match(question)
+        relevant_cols = extract_relevant_columns_from_question(question, self.schema)
+        return {
+            "question": question,
+            "location": matched_location,
+            "input_text": generate_input_text(question, relevant_cols),
+        }
+
+    @staticmethod
+    def finalize(raw_sql: str, prepared: dict, detailed: bool = False):
+        """
+        Steps after the model: heuristic SQL fixes and location re-insertion.
+
+        With `detailed`, returns {"raw_sql", "fixed_sql", "sql"} instead of the final SQL only.
+        """
+        fixed_sql = smart_fix_sql(raw_sql, prepared["question"])
+        sql = fix_location_in_sql(fixed_sql, prepared["location"])
+        if detailed:
+            return {"raw_sql": raw_sql, "fixed_sql": fixed_sql, "sql": sql}
+        return sql
+
+    def submit(self, raw_question: str) -> Future:
+        """Queue a question; the Future resolves to the final SQL."""
+        return self.submit_prepared(self.prepare(raw_question))
+
+    def submit_prepared(self, prepared: dict, detailed: bool = False) -> Future:
+        """Same as submit() for the output of prepare(), e.g. when a cache already needed it."""
+        result = Future()
+        result.set_running_or_notify_cancel()
+
+        def done(model_future: Future):
+            try:
+                result.set_result(self.finalize(model_future.result(), prepared, detailed))
+            except Exception as e:
+                result.set_exception(e)
+
+        self.batcher.submit(prepared["input_text"]).add_done_callback(done)
+        return result
+
+    def infer(self, raw_question: str, timeout: float = None) -> str:
+        return self.submit(raw_question).result(timeout)
+
+    def infer_many(self, raw_questions: List[str], timeout: float = None) -> List[str]:
+        """Submit all questions at once so they share batches, and return the SQL in order."""
+        futures = [self.submit(q) for q in raw_questions]
+        return [f.result(timeout) for f in futures]
+
+    def stats(self) -> Dict[str, float]:
+        return self.batcher.stats()
+
+    def close(self) -> None:
+        self.batcher.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
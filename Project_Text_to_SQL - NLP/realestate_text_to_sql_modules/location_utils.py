@@ -1,31 +1,109 @@
 import pandas as pd
+import numpy as np
 import random
-from typing import Tuple, List
+import weakref
+from typing import Dict, Tuple, List
 
-def generate_location_phrase(df: pd.DataFrame) -> Tuple[str, List[str], List[str], List[str]]:
+# (mẫu câu, các cột điều kiện) theo thứ tự từ chi tiết đến tổng quát
+LOCATION_TEMPLATES = [
+    ("phường {ward}, quận {district}, {city}", ['ward', 'district', 'city']),
+    ("phường {ward}, quận {district}", ['ward', 'district']),
+    ("quận {district}, {city}", ['district', 'city']),
+    ("quận {district}", ['district']),
+    ("{city}", ['city']),
+]
+
+# Các mức địa điểm được thống kê sẵn: đúng các bộ cột mà LOCATION_TEMPLATES sinh ra
+LOCATION_LEVELS = [tuple(cols) for _, cols in LOCATION_TEMPLATES]
+
+STAT_COLUMNS = ['price', 'area']
+QUANTILES = {'q25': 0.25, 'q50': 0.5, 'q75': 0.75}
+
+class LocationTable:
+    """
+    Bảng thống kê dựng sẵn theo địa điểm, để lấy mẫu địa điểm và tra cứu các căn tại đó trong O(1).
+
+    - triples: mảng (city, district, ward) của các dòng không thiếu địa điểm (thứ tự gốc)
+    - stats[(cols, vals)]: với mỗi mức trong LOCATION_LEVELS, ví dụ (('ward', 'district'), ('Phường 5', 'Gò Vấp')):
+        {'count': số căn, 'rows': vị trí dòng trong df,
+         'price': {'min', 'max', 'q25', 'q50', 'q75'}, 'area': {...}}
+      Thống kê giá / diện tích chỉ tính trên giá trị dương, bằng None nếu không có giá trị nào.
+    """
+    # id(df) -> (weakref tới df, bảng)
+    _cache: Dict[int, tuple] = {}
+
+    def __init__(self, df: pd.DataFrame):
+        self.triples = df[['city', 'district', 'ward']].dropna().values
+        self.levels = set(LOCATION_LEVELS)
+        self.stats: Dict[Tuple[Tuple[str, ...], Tuple[str, ...]], dict] = {}
+
+        stat_values = {c: df[c].to_numpy(dtype=float) for c in STAT_COLUMNS if c in df.columns}
+        for cols in LOCATION_LEVELS:
+            for key, rows in df.groupby(list(cols), sort=False).indices.items():
+                vals = key if isinstance(key, tuple) else (key,)
+                entry = {'count': len(rows), 'rows': rows}
+                for col, values in stat_values.items():
+                    v = values[rows]
+                    v = v[v > 0]
+                    if len(v) == 0:
+                        entry[col] = None
+                    else:
+                        entry[col] = {'min': float(v.min()), 'max': float(v.max())}
+                        entry[col].update({name: float(q) for name, q in zip(QUANTILES, np.quantile(v, list(QUANTILES.values())))})
+                self.stats[(cols, tuple(vals))] = entry
+
+    @classmethod
+    def for_dataframe(cls, df: pd.DataFrame) -> "LocationTable":
+        """Trả về bảng đã dựng cho DataFrame này, dựng ở lần gọi đầu tiên."""
+        entry = cls._cache.get(id(df))
+        if entry is not None and entry[0]() is df:
+            return entry[1]
+        table = cls(df)
+        cls._cache = {k: v for k, v in cls._cache.items() if v[0]() is not None}
+        cls._cache[id(df)] = (weakref.ref(df), table)
+        return table
+
+    def lookup(self, cols: List[str], vals: List[str]) -> dict:
+        """Thống kê của địa điểm (cols, vals); None nếu không có căn nào."""
+        return self.stats.get((tuple(cols), tuple(vals)))
+
+    def rows(self, cols: List[str], vals: List[str]) -> np.ndarray:
+        """Vị trí các dòng tại địa điểm (cols, vals)."""
+        entry = self.lookup(cols, vals)
+        return entry['rows'] if entry is not None else np.array([], dtype=np.intp)
+
+    def sample_triple(self) -> Tuple[str, str, str]:
+        """Rút một (city, district, ward) giống hệt `df[['city', 'district', 'ward']].dropna().sample(1)`."""
+        pos = np.random.choice(len(self.triples), size=1, replace=False)[0]
+        city, district, ward = self.triples[pos]
+        return city, district, ward
+
+def build_location_phrase(city: str, district: str, ward: str, template_index: int) -> Tuple[str, List[str], List[str], List[str]]:
+    """
+    Dựng cụm địa điểm và điều kiện SQL từ một bộ (city, district, ward) và chỉ số mẫu câu trong LOCATION_TEMPLATES.
+    """
+    template, cond_cols = LOCATION_TEMPLATES[template_index]
+    values = {'city': city, 'district': district, 'ward': ward}
+    location_natural = template.format(**values)
+    cond_vals = [values[c] for c in cond_cols]
+    cond_ops = ['='] * len(cond_cols)
+    return location_natural, list(cond_cols), cond_vals, cond_ops
+
+def generate_location_phrase(df: pd.DataFrame, table: LocationTable = None) -> Tuple[str, List[str], List[str], List[str]]:
     """
     Sinh cụm địa điểm ngôn ngữ tự nhiên và điều kiện SQL tương ứng.
 
+    Địa điểm được rút từ LocationTable dựng sẵn (mặc định lấy theo df), không quét lại cả DataFrame.
+
     Trả về:
     - location_natural: ví dụ "phường 5, quận Gò Vấp"
     - cond_cols: ['ward', 'district', 'city']
     - cond_vals: ['5', 'Gò Vấp', 'Hồ Chí Minh']
     - cond_ops: ['=', '=', '=']
     """
-    row = df[['city', 'district', 'ward']].dropna().sample(1).iloc[0]
-    city, district, ward = row['city'], row['district'], row['ward']
-
-    templates = [
-        ("phường {ward}, quận {district}, {city}", ['ward', 'district', 'city'], [ward, district, city]),
-        ("phường {ward}, quận {district}", ['ward', 'district'], [ward, district]),
-        ("quận {district}, {city}", ['district', 'city'], [district, city]),
-        ("quận {district}", ['district'], [district]),
-        ("{city}", ['city'], [city]),
-    ]
-
-    template, cond_cols, cond_vals = random.choice(templates)
-    location_natural = template.format(ward=ward, district=district, city=city)
-
-    cond_ops = ['='] * len(cond_cols)
+    if table is None:
+        table = LocationTable.for_dataframe(df)
+    city, district, ward = table.sample_triple()
 
-    return location_natural, cond_cols, cond_vals, cond_ops
\ No newline at end of file
+    template_index = random.randrange(len(LOCATION_TEMPLATES))
+    return build_location_phrase(city, district, ward, template_index)
@@ -6,9 +6,15 @@ Purpose:
     This module supports diverse question types (e.g., range, comparison, count, location-based) and returns clean training triples for Text-to-SQL models.
 
 Key Function:
-    - NaturalQueryGenerator.generate_query(df, question_type=None):
+    - NaturalQueryGenerator.generate_query(df, question_type=None, index=None):
         Returns a tuple (question: str, sql: str, extras: dict) where `extras` includes:
         - Schema: string schema with column names and types (e.g., "price[float], area[float], ...")
+        Value pools come from a ColumnValueIndex built once per DataFrame (see column_value_index.py).
+        With constrained=True, thresholds are picked from the rows that match the chosen location /
+        column (e.g. the price distribution of a ward), so the SQL is non-empty by construction.
+    - NaturalQueryGenerator.generate_batch(df, n, question_type_weights=None, seed=None):
+        Same triples for n samples at once; every random draw for the batch is made up front with
+        a NumPy Generator, then questions and SQL are rendered in a single loop.
 
 Supported Question Types:
     - specific_query
@@ -32,8 +38,10 @@ Note:
     Output is standardized to a 3-column format for training: Question | Schema | SQL
 """
 
+import math
 import random
-from typing import List, Tuple
+from typing import Dict, List, Tuple
+import numpy as np
 import pandas as pd
 
 from realestate_text_to_sql_modules.utils import (
@@ -57,7 +65,8 @@ from realestate_text_to_sql_modules.templates import (
     TEMPLATES_LOCATION_PRICE_AREA
 )
 from realestate_text_to_sql_modules.constants import COLUMN_TRANSLATIONS, COMPARISON_TERMS, SCHEMA_DEFINITION
-from realestate_text_to_sql_modules.schema_generator import SchemaGenerator
+from realestate_text_to_sql_modules.column_value_index import ColumnValueIndex, sample_one, RANGE_COLUMNS
+from realestate_text_to_sql_modules.location_utils import build_location_phrase, LOCATION_TEMPLATES
 
 def generate_location_price_question(price_condition: str, location_natural: str, value: float) -> str:
     """Sinh câu hỏi về vị trí và giá bất động sản"""
@@ -99,13 +108,13 @@ def cleanup_question(text: str) -> str:
     text = text.replace("  ", " ")
     return text.strip()
 
-def generate_comparison_question(translated_col: str, comparison_term: str, value_str: str, unit: str) -> str:
+def generate_comparison_question(translated_col: str, comparison_term: str, value_str: str, unit: str, choose=random.choice) -> str:
     if translated_col == "giá":
-        template = random.choice(TEMPLATES_PRICE_COMPARISON)
+        template = choose(TEMPLATES_PRICE_COMPARISON)
     elif comparison_term in ["bằng", "đúng", "khoảng", "tầm"]:
-        template = random.choice(TEMPLATES_COMPARISON_EQUAL)
+        template = choose(TEMPLATES_COMPARISON_EQUAL)
     else:
-        template = random.choice(TEMPLATES_COMPARISON_OP)
+        template = choose(TEMPLATES_COMPARISON_OP)
 
     question = template.format(
         col_name=translated_col,
@@ -129,19 +138,19 @@ def generate_comparison_question(translated_col: str, comparison_term: str, valu
 
 
 
-def generate_range_question(translated_col: str, value1: str, value2: str, unit: str) -> str:
-    return random.choice(TEMPLATES_RANGE).format(
+def generate_range_question(translated_col: str, value1: str, value2: str, unit: str, choose=random.choice) -> str:
+    return choose(TEMPLATES_RANGE).format(
         col_name=translated_col,
         value1=value1,
         value2=value2,
         unit=unit
     )
 
-def generate_specific_question(translated_cols: List[str]) -> str:
+def generate_specific_question(translated_cols: List[str], choose=random.choice) -> str:
     col_display = ", ".join(translated_cols)
-    return random.choice(TEMPLATES_SPECIFIC).format(column_list=col_display)
+    return choose(TEMPLATES_SPECIFIC).format(column_list=col_display)
 
-def generate_count_question(col: str, value: float, unit: str, op: str = "=") -> str:
+def generate_count_question(col: str, value: float, unit: str, op: str = "=", choose=random.choice) -> str:
     translated_col = COLUMN_TRANSLATIONS.get(col, col).replace("số ", "")
     if col == "price":
         value_str = format_price_for_display(value)
@@ -170,16 +179,16 @@ def generate_count_question(col: str, value: float, unit: str, op: str = "=") ->
         f"Tôi muốn biết có nhiều căn {condition} không?",
         f"Bạn thống kê giúp mình số căn {condition} nha!"
     ]
-    return random.choice(options)
+    return choose(options)
 
 
-def generate_like_question(kw: str) -> str:
-    return random.choice(TEMPLATES_LIKE).format(kw=kw)
+def generate_like_question(kw: str, choose=random.choice) -> str:
+    return choose(TEMPLATES_LIKE).format(kw=kw)
 
-def generate_extreme_question(col: str, mode: str = "max") -> str:
+def generate_extreme_question(col: str, mode: str = "max", choose=random.choice) -> str:
     translated_col = COLUMN_TRANSLATIONS.get(col, col)
     templates = TEMPLATES_EXTREME_MAX if mode == "max" else TEMPLATES_EXTREME_MIN
-    return random.choice(templates).format(col_name=translated_col)
+    return choose(templates).format(col_name=translated_col)
 
 def get_unit_for_column(col: str) -> str:
     if col == "price":
@@ -215,12 +224,12 @@ def extract_relevant_columns(question: str) -> List[str]:
         relevant = ["price", "area", "bedrooms", "floors", "bathrooms"]
     return relevant
 
-def get_natural_comparison_phrase(col_type: str, comparison: str) -> str:
+def get_natural_comparison_phrase(col_type: str, comparison: str, choose=random.choice) -> str:
     terms = COMPARISON_TERMS.get(col_type, {})
     options = terms.get(comparison, [comparison])
-    return random.choice(options)
+    return choose(options)
 
-def generate_or_question(col1: str, val1: float, unit1: str, col2: str, val2: float, unit2: str, op: str) -> str:
+def generate_or_question(col1: str, val1: float, unit1: str, col2: str, val2: float, unit2: str, op: str, choose=random.choice) -> str:
     translated_col1 = COLUMN_TRANSLATIONS.get(col1, col1)
     translated_col2 = COLUMN_TRANSLATIONS.get(col2, col2)
 
@@ -257,7 +266,7 @@ def generate_or_question(col1: str, val1: float, unit1: str, col2: str, val2: fl
     unit1_disp = "" if col1 == "price" else f" {unit1}" if unit1 else ""
     unit2_disp = "" if col2 == "price" else f" {unit2}" if unit2 else ""
 
-    return random.choice(TEMPLATES_OR).format(
+    return choose(TEMPLATES_OR).format(
         col1=translated_col1, phrase1=phrase1, unit1=unit1_disp,
         col2=translated_col2, phrase2=phrase2, unit2=unit2_disp
     )
@@ -276,6 +285,66 @@ def fix_col_for_text_column(col: str, value, op: str):
         return str(value), '='
     return value, op
 
+# ======== Sinh có ràng buộc (constrained=True) ========
+
+def bounds_around(value: float, step: float) -> Tuple[float, float]:
+    """Hai mốc là bội số của step kẹp chặt value: low < value < high"""
+    low = math.floor(value / step) * step
+    if low >= value:
+        low -= step
+    high = math.ceil(value / step) * step
+    if high <= value:
+        high += step
+    if step < 1:
+        return round(low, 1), round(high, 1)
+    return int(low), int(high)
+
+def feasible_comparison_ops(index: ColumnValueIndex, col: str, value) -> List[str]:
+    """
+    Các toán tử mà điều kiện `col op value` (value đã làm tròn như generate_natural_condition)
+    vẫn khớp ít nhất một dòng trong dữ liệu.
+    """
+    if col in ['house_direction', 'legal_status', 'furniture_state']:
+        return ['=']
+    if col == 'price':
+        value_sql = reverse_price_string_to_number(format_price_for_display(value))
+    elif col in ['bedrooms', 'bathrooms', 'floors']:
+        value_sql = int(value)
+    else:
+        value_sql = float(format_number(value).replace(",", "."))
+
+    values = index.sorted_values[col]
+    ops = []
+    if values[-1] > value_sql:
+        ops.append('>')
+    if values[0] < value_sql:
+        ops.append('<')
+    pos = np.searchsorted(values, value_sql)
+    if pos < len(values) and values[pos] == value_sql:
+        ops.append('=')
+    return ops or ['=']
+
+def constrained_price_condition(prices: np.ndarray, op_price: str) -> Tuple[str, str]:
+    """
+    Sinh điều kiện giá (câu tự nhiên, SQL) khớp ít nhất một giá trong `prices`.
+    Ngưỡng là bội số 100 triệu nên hiển thị "x,y tỷ" đúng bằng giá trị trong SQL.
+    """
+    if op_price == '=':
+        exact = prices[prices % 100_000_000 == 0]
+        if len(exact) == 0:
+            op_price = random.choice(['<', 'BETWEEN'])
+        else:
+            value = int(sample_one(exact))
+            natural_cond = f"giá {get_natural_comparison_phrase('price', '=')} {format_price_for_display(float(value))}"
+            return natural_cond, f"price = {value}"
+
+    low, high = bounds_around(sample_one(prices), 100_000_000)
+    if op_price == 'BETWEEN':
+        natural_cond = f"giá từ {format_price_for_display(float(low))} đến {format_price_for_display(float(high))}"
+        return natural_cond, f"price >= {low} AND price <= {high}"
+    natural_cond = f"giá {get_natural_comparison_phrase('price', op_price)} {format_price_for_display(float(high))}"
+    return natural_cond, f"price {op_price} {high}"
+
 class NaturalQueryGenerator:
     @staticmethod
     def generate_price_range_around(value: float) -> Tuple[float, float]:
@@ -289,7 +358,23 @@ class NaturalQueryGenerator:
         return value - delta, value + delta
 
     @staticmethod
-    def generate_natural_condition(col: str, value: float, comparison: str) -> Tuple[str, str, str, List[str], List[str], List[float], str]:
+    def constrained_threshold(value: float, step: float, allow_equal: bool = True) -> Tuple[float, str]:
+        """
+        Chọn ngẫu nhiên toán tử và ngưỡng (bội số của step) sao cho `value op ngưỡng` đúng.
+        Trả về (ngưỡng, toán tử).
+        """
+        value = float(value)
+        low, high = bounds_around(value, step)
+        ops = ['<'] + (['>'] if low > 0 else []) + (['='] if allow_equal else [])
+        op = random.choice(ops)
+        if op == '<':
+            return float(high), op
+        if op == '>':
+            return float(low), op
+        return value, op
+
+    @staticmethod
+    def generate_natural_condition(col: str, value: float, comparison: str, choose=random.choice) -> Tuple[str, str, str, List[str], List[str], List[float], str]:
         translated_col = COLUMN_TRANSLATIONS.get(col, col)
 
         # --- Đặc biệt cho các cột dạng text ---
@@ -346,12 +431,12 @@ class NaturalQueryGenerator:
             val1_sql = float(val1)
             val2_sql = float(val2)
 
-            natural = generate_range_question(translated_col, val1_str, val2_str, unit)
+            natural = generate_range_question(translated_col, val1_str, val2_str, unit, choose)
             return natural.strip(), f"{col} >= {format_sql_value(val1_sql)} AND {col} <= {format_sql_value(val2_sql)}", translated_col, [col, col], [">=", "<="], [val1_sql, val2_sql], col
 
         # Nếu là các dạng so sánh còn lại
-        comparison_term = get_natural_comparison_phrase(term_type, comparison)
-        natural = generate_comparison_question(translated_col, comparison_term, value_str, unit)
+        comparison_term = get_natural_comparison_phrase(term_type, comparison, choose)
+        natural = generate_comparison_question(translated_col, comparison_term, value_str, unit, choose)
 
         return natural.strip(), f"{col} {comparison} {format_sql_value(value_sql)}", translated_col, [col], [comparison], [value_sql], col
 
@@ -363,41 +448,27 @@ class NaturalQueryGenerator:
         return natural.strip(), f"{col} {comparison} {format_sql_value(value_sql)}", translated_col, [col], [comparison], [value_sql], col
     
     @staticmethod
-    def generate_query(df: pd.DataFrame, question_type: str = None) -> Tuple[str, str, dict]:
+    def generate_query(df: pd.DataFrame, question_type: str = None, index: ColumnValueIndex = None,
+                       constrained: bool = False) -> Tuple[str, str, dict]:
         if not question_type:
             question_type = SQLTypeManager.sample_question_type()
+        if index is None:
+            index = ColumnValueIndex.for_dataframe(df)
 
         def build_output(question: str, query: str) -> Tuple[str, str, dict]:
-            used_cols = [c for c in df.columns if c in query]
-            schema_str = ", ".join(SchemaGenerator.generate_schema(df, relevant_columns=used_cols))
+            used_cols = [c for c in index.columns if c in query]
+            schema_str = ", ".join(index.generate_schema(used_cols))
             return question, query, {"Schema": schema_str}
 
-        all_possible_cols = [
-            'price', 'area', 'frontage', 'access_road',
-            'floors', 'bedrooms', 'bathrooms',
-            'house_direction', 'legal_status', 'furniture_state'
-        ]
-
-        col = random.choice([
-            c for c in all_possible_cols
-            if c in df.columns and df[c].dropna().shape[0] >= 10
-        ])
-
-        valid_values = df[col][df[col].notna()]
-        valid_values = valid_values[valid_values.apply(lambda v: is_value_type_valid(col, v))]
-
-        # Bỏ giá trị 'Unk' nếu cột dạng text
-        if col in ['house_direction', 'legal_status', 'furniture_state']:
-            valid_values = valid_values[~valid_values.astype(str).str.lower().isin(['unk', 'unknown'])]
-
-        if col not in ['house_direction', 'legal_status', 'furniture_state']:
-            valid_values = valid_values[valid_values > 0]
-        if valid_values.empty:
-            raise ValueError(f"Không có giá trị hợp lệ cho cột {col}")
-        value = random.choice(valid_values.values)
+        # Giá trị hợp lệ (đã lọc NaN, 'Unk', <= 0) được tính sẵn trong index
+        col = random.choice(index.candidate_columns)
+        value = index.draw(col)
         if col in ['floors', 'bedrooms', 'bathrooms']:
             value = int(value)
-        op = random.choice(['>', '<', '='])
+        if constrained:
+            op = random.choice(feasible_comparison_ops(index, col, value))
+        else:
+            op = random.choice(['>', '<', '='])
         unit = get_unit_for_column(col)
 
         if question_type == 'specific_query':
@@ -409,12 +480,18 @@ class NaturalQueryGenerator:
 
         if question_type == 'location_price_query':
             from realestate_text_to_sql_modules.location_utils import generate_location_phrase
-            location_natural, loc_cols, loc_vals, loc_ops = generate_location_phrase(df)
+            location_natural, loc_cols, loc_vals, loc_ops = generate_location_phrase(df, table=index.locations)
 
             op_price = random.choice(['<', '=', 'BETWEEN'])
 
-            if op_price == 'BETWEEN':
-                valid_prices = df['price'][df['price'] > 0].dropna().sort_values().values
+            if constrained:
+                # Ngưỡng giá lấy từ các căn thực sự có ở địa điểm đã chọn
+                prices = index.positive_values_at('price', index.rows_matching(loc_cols, loc_vals))
+                if len(prices) == 0:
+                    raise ValueError(f"Không có giá hợp lệ tại {location_natural}")
+                natural_cond, sql_cond = constrained_price_condition(prices, op_price)
+            elif op_price == 'BETWEEN':
+                valid_prices = index.sorted_positive_prices
                 if len(valid_prices) < 2:
                     return None
                 idx = random.randint(0, len(valid_prices) - 2)
@@ -428,7 +505,7 @@ class NaturalQueryGenerator:
                 natural_cond = f"giá từ {price_display_1} đến {price_display_2}"
                 sql_cond = f"price >= {low} AND price <= {high}"
             else:
-                value = df['price'][df['price'] > 0].dropna().sample(1).values[0]
+                value = sample_one(index.positive_values['price'])
                 price_display = format_price_for_display(value)
                 price_value = reverse_price_string_to_number(price_display)
                 natural_cond = f"giá {get_natural_comparison_phrase('price', op_price)} {price_display}"
@@ -440,11 +517,18 @@ class NaturalQueryGenerator:
             question = sanitize_question(question)
             query = f"SELECT * FROM price_house WHERE {sql_cond} AND {location_sql}"
             used_cols = ["price"] + loc_cols
-            schema_str = ", ".join(SchemaGenerator.generate_schema(df, relevant_columns=used_cols))
+            schema_str = ", ".join(index.generate_schema(used_cols))
             return question, query, {"Schema": schema_str}
 
+        if question_type == 'range_query' and constrained:
+            low, high = bounds_around(sample_one(index.positive_values['price']), 100_000_000)
+            question = f"Tìm nhà có giá từ {format_price_for_display(float(low))} đến {format_price_for_display(float(high))}?"
+            question = sanitize_question(question)
+            sql = f"SELECT * FROM price_house WHERE price >= {low} AND price <= {high}"
+            return build_output(question, sql)
+
         if question_type == 'range_query':
-            valid_prices = df['price'][df['price'] > 0].dropna().sort_values().values
+            valid_prices = index.sorted_positive_prices
             if len(valid_prices) < 2:
                 return None
             idx = random.randint(0, len(valid_prices) - 2)
@@ -471,41 +555,84 @@ class NaturalQueryGenerator:
             return build_output(question, f"SELECT COUNT(*) FROM price_house WHERE {sql_cond}")
         
         if question_type == 'like_query':
-            city_value = df['city'].dropna().sample(1).values[0]
+            city_value = index.sample_city()
             keyword = city_value[:3]
             question = generate_like_question(keyword)
             return build_output(question, f"SELECT * FROM price_house WHERE city LIKE '%{keyword}%'")
 
         if question_type == 'or_query':
-            col1, col2 = random.sample(['price', 'area', 'frontage', 'access_road', 'floors', 'bedrooms', 'bathrooms'], 2)
-            valid1 = df[col1][df[col1].notna()]
-            valid2 = df[col2][df[col2].notna()]
-            val1 = int(valid1.sample(1).values[0]) if col1 in ['floors', 'bedrooms', 'bathrooms'] else round(valid1.sample(1).values[0], 1)
-            val2 = int(valid2[valid2 > val1].sample(1).values[0]) if col2 in ['floors', 'bedrooms', 'bathrooms'] else round(valid2[valid2 > val1].sample(1).values[0], 1)
-            op = random.choice(["=", ">", "<"])
+            or_cols = ['price', 'area', 'frontage', 'access_road', 'floors', 'bedrooms', 'bathrooms']
+            if constrained:
+                or_cols = [c for c in or_cols if len(index.notna_values.get(c, [])) > 0]
+            col1, col2 = random.sample(or_cols, 2)
+            valid1 = index.notna_values[col1]
+            valid2 = index.notna_values[col2]
+            if constrained:
+                # Giữ lại các val1 mà col2 còn giá trị lớn hơn (kể cả sau khi làm tròn)
+                valid1 = valid1[valid1 < valid2.max() - 0.1]
+                if len(valid1) == 0:
+                    raise ValueError(f"Không có cặp giá trị hợp lệ cho {col1} / {col2}")
+            val1 = int(sample_one(valid1)) if col1 in ['floors', 'bedrooms', 'bathrooms'] else round(sample_one(valid1), 1)
+            val2 = int(sample_one(valid2[valid2 > val1])) if col2 in ['floors', 'bedrooms', 'bathrooms'] else round(sample_one(valid2[valid2 > val1]), 1)
+            if constrained:
+                # OR: chỉ cần một trong hai vế khớp ít nhất một dòng
+                feasible = set(feasible_comparison_ops(index, col1, val1)) | set(feasible_comparison_ops(index, col2, val2))
+                op = random.choice([o for o in ["=", ">", "<"] if o in feasible])
+            else:
+                op = random.choice(["=", ">", "<"])
             conds_sql = f"{col1} {op} {format_sql_value(val1)} OR {col2} {op} {format_sql_value(val2)}"
             question = generate_or_question(col1, val1, get_unit_for_column(col1), col2, val2, get_unit_for_column(col2), op)
             return build_output(question, f"SELECT * FROM price_house WHERE {conds_sql}")
 
+        # Cột dùng cho ORDER BY; chế độ ràng buộc chỉ giữ các cột có trong dữ liệu
+        order_cols = ['price', 'area', 'frontage', 'access_road']
+        if constrained:
+            order_cols = [c for c in order_cols if c in index.columns]
+
         if question_type == 'extreme_max':
-            col = random.choice(['price', 'area', 'frontage', 'access_road'])
+            col = random.choice(order_cols)
             question = generate_extreme_question(col, mode="max")
             return build_output(question, f"SELECT * FROM price_house ORDER BY {col} DESC LIMIT 1")
 
         if question_type == 'extreme_min':
-            col = random.choice(['price', 'area', 'frontage', 'access_road'])
+            col = random.choice(order_cols)
             question = generate_extreme_question(col, mode="min")
             return build_output(question, f"SELECT * FROM price_house ORDER BY {col} ASC LIMIT 1")
 
         if question_type == 'top_k_query':
-            col = random.choice(['price', 'area', 'frontage', 'access_road'])
+            col = random.choice(order_cols)
             k = random.choice([3, 5, 10])
             question = generate_top_k_question(COLUMN_TRANSLATIONS.get(col, col), k)
             return build_output(question, f"SELECT * FROM price_house ORDER BY {col} DESC LIMIT {k}")
 
+        if question_type == 'between_location_query' and constrained:
+            from realestate_text_to_sql_modules.location_utils import generate_location_phrase
+            location_natural, location_cols, location_vals, location_ops = generate_location_phrase(df, table=index.locations)
+            rows = index.rows_matching(location_cols, location_vals)
+            values_by_col = {
+                c: index.positive_values_at(c, rows)
+                for c in ['price', 'area', 'frontage', 'access_road'] if c in index.row_values
+            }
+            cols_with_values = [c for c, v in values_by_col.items() if len(v) > 0]
+            if not cols_with_values:
+                raise ValueError(f"Không có giá trị hợp lệ tại {location_natural}")
+            col = random.choice(cols_with_values)
+            val1, val2 = bounds_around(sample_one(values_by_col[col]), 100_000_000 if col == 'price' else 0.1)
+            question = generate_between_location_question(
+                COLUMN_TRANSLATIONS.get(col, col),
+                format_number(val1), format_number(val2),
+                get_unit_for_column(col), location_natural
+            )
+            question = cleanup_question(question)
+            location_sql = " AND ".join(
+                f"{c} {o} '{v}'" for c, o, v in zip(location_cols, location_ops, location_vals)
+            )
+            query = f"SELECT * FROM price_house WHERE {col} >= {format_sql_value(val1)} AND {col} <= {format_sql_value(val2)} AND {location_sql}"
+            return build_output(question, query)
+
         if question_type == 'between_location_query':
             col = random.choice(['price', 'area', 'frontage', 'access_road'])
-            valid = df[col][df[col].notna()].dropna().sort_values().values
+            valid = index.sorted_values[col]
             if len(valid) < 2:
                 return None
             idx = random.randint(0, len(valid) - 2)
@@ -516,7 +643,7 @@ class NaturalQueryGenerator:
                 val2 = val1 + (100_000_000 if col == 'price' else 1)
             unit = get_unit_for_column(col)
             from realestate_text_to_sql_modules.location_utils import generate_location_phrase
-            location_natural, location_cols, location_vals, location_ops = generate_location_phrase(df)
+            location_natural, location_cols, location_vals, location_ops = generate_location_phrase(df, table=index.locations)
             question = generate_between_location_question(
                 COLUMN_TRANSLATIONS.get(col, col),
                 format_number(val1), format_number(val2),
@@ -531,17 +658,30 @@ class NaturalQueryGenerator:
 
         if question_type == 'location_price_area_query':
             from realestate_text_to_sql_modules.location_utils import generate_location_phrase
-            location_natural, location_cols, location_vals, location_ops = generate_location_phrase(df)
+            location_natural, location_cols, location_vals, location_ops = generate_location_phrase(df, table=index.locations)
             location_sql = " AND ".join(
                 f"{col} {op} '{val}'" for col, op, val in zip(location_cols, location_ops, location_vals)
             )
-            price_val = df['price'][df['price'] > 0].dropna().sample(1).values[0]
-            price_op = random.choice(['<', '>', '='])
+            if constrained:
+                # Chọn một căn ở địa điểm này rồi đặt ngưỡng giá / diện tích để căn đó thoả điều kiện
+                rows = index.rows_matching(location_cols, location_vals)
+                row_prices = index.row_values['price'][rows].astype(float)
+                row_areas = index.row_values['area'][rows].astype(float)
+                rows = rows[(row_prices > 0) & (row_areas > 0)]
+                if len(rows) == 0:
+                    raise ValueError(f"Không có căn hợp lệ tại {location_natural}")
+                row = sample_one(rows)
+                price_val, price_op = NaturalQueryGenerator.constrained_threshold(index.row_values['price'][row], 100_000_000, allow_equal=True)
+                area_val, area_op = NaturalQueryGenerator.constrained_threshold(index.row_values['area'][row], 1, allow_equal=float(index.row_values['area'][row]).is_integer())
+            else:
+                price_val = sample_one(index.positive_values['price'])
+                price_op = random.choice(['<', '>', '='])
             price_phrase = random.choice(COMPARISON_TERMS['price'][price_op])
             price_text = f"{price_phrase} {format_price_for_display(price_val)}"
             price_sql = f"price {price_op} {int(price_val)}"
-            area_val = df['area'][df['area'] > 0].dropna().sample(1).values[0]
-            area_op = random.choice(['<', '>', '='])
+            if not constrained:
+                area_val = sample_one(index.positive_values['area'])
+                area_op = random.choice(['<', '>', '='])
             area_phrase = random.choice(COMPARISON_TERMS['quantity'][area_op])
             area_text = f"{area_phrase} {format_number(area_val)}m2"
             area_sql = f"area {area_op} {int(area_val)}"
@@ -554,7 +694,7 @@ class NaturalQueryGenerator:
             question = sanitize_question(question)
             sql = f"SELECT * FROM price_house WHERE {price_sql} AND {area_sql} AND {location_sql}"
             used_cols = ["price", "area"] + location_cols
-            schema_str = ", ".join(SchemaGenerator.generate_schema(df, relevant_columns=used_cols))
+            schema_str = ", ".join(index.generate_schema(used_cols))
             return question, sql, {"Schema": schema_str}
 
         # fallback xử lý riêng cho hướng nhà, pháp lý, nội thất
@@ -562,18 +702,70 @@ class NaturalQueryGenerator:
         natural_cond, sql_cond, *_ = NaturalQueryGenerator.generate_natural_condition(col, value_fixed, op_fixed)
         return build_output(natural_cond, f"SELECT * FROM price_house WHERE {sql_cond}")
 
-def generate_top_k_question(translated_col: str, k: int = 5) -> str:
+    @staticmethod
+    def generate_batch(df: pd.DataFrame, n: int, question_type_weights: Dict[str, float] = None,
+                       seed: int = None, index: ColumnValueIndex = None) -> List[Tuple[str, str, dict]]:
+        """
+        Sinh n mẫu cùng lúc bằng numpy Generator.
+
+        Loại câu hỏi, cột, toán tử, giá trị và mẫu câu của cả lô được rút một lần dưới dạng mảng;
+        sau đó câu hỏi và SQL chỉ còn được ghép chuỗi trong một vòng lặp.
+
+        Args:
+            df (pd.DataFrame): DataFrame đã làm sạch.
+            n (int): Số mẫu cần sinh.
+            question_type_weights (dict, optional): {question_type: trọng số}. Mặc định dùng tỉ lệ của SQLTypeManager.
+            seed (int, optional): Seed cho numpy Generator, cùng seed cho cùng kết quả.
+            index (ColumnValueIndex, optional): Index dựng sẵn cho df.
+
+        Returns:
+            List[Tuple[str, str, dict]]: Các bộ (question, sql, extras) theo thứ tự rút loại câu hỏi.
+            Mẫu không dựng được (ví dụ thiếu cột trong df) bị bỏ qua, nên có thể ít hơn n.
+        """
+        if index is None:
+            index = ColumnValueIndex.for_dataframe(df)
+        if question_type_weights is None:
+            question_type_weights = {q: rule['ratio'] for q, rule in SQLTypeManager.SQL_TYPE_RULES.items()}
+
+        rng = np.random.default_rng(seed)
+        question_types = list(question_type_weights)
+        weights = np.array([question_type_weights[q] for q in question_types], dtype=float)
+        type_ids = rng.choice(len(question_types), size=n, p=weights / weights.sum())
+        # Các lựa chọn mẫu câu / cụm từ của từng mẫu
+        choice_draws = rng.random((n, _CHOICES_PER_SAMPLE))
+
+        results = [None] * n
+        skipped = 0
+        for type_id, question_type in enumerate(question_types):
+            positions = np.flatnonzero(type_ids == type_id)
+            if len(positions) == 0:
+                continue
+            draw, render = _BATCH_SAMPLERS.get(question_type, _CONDITION_SAMPLER)
+            for pos, args in zip(positions.tolist(), draw(question_type, rng, index, len(positions))):
+                if args is None:
+                    skipped += 1
+                    continue
+                try:
+                    results[pos] = render(question_type, index, _PreDrawnChoice(choice_draws[pos]), *args)
+                except Exception:
+                    skipped += 1
+
+        if skipped:
+            print(f"[SKIP] generate_batch: bỏ qua {skipped}/{n} mẫu không dựng được")
+        return [r for r in results if r is not None]
+
+def generate_top_k_question(translated_col: str, k: int = 5, choose=random.choice) -> str:
     from realestate_text_to_sql_modules.templates import TEMPLATES_TOP_K
-    return random.choice(TEMPLATES_TOP_K).format(k=k, col_name=translated_col)
+    return choose(TEMPLATES_TOP_K).format(k=k, col_name=translated_col)
 
-def generate_between_location_question(translated_col: str, value1: str, value2: str, unit: str, location: str) -> str:
+def generate_between_location_question(translated_col: str, value1: str, value2: str, unit: str, location: str, choose=random.choice) -> str:
     from realestate_text_to_sql_modules.templates import TEMPLATES_RANGE_LOCATION
 
     if translated_col == 'giá':
         value1 = format_price_for_display(float(value1.replace(",", ".")))
         value2 = format_price_for_display(float(value2.replace(",", ".")))
 
-    return random.choice(TEMPLATES_RANGE_LOCATION).format(
+    return choose(TEMPLATES_RANGE_LOCATION).format(
         col_name=translated_col,
         value1=value1,
         value2=value2,
@@ -582,3 +774,278 @@ def generate_between_location_question(translated_col: str, value1: str, value2:
     )
 
 
+# ======== Sinh theo lô (generate_batch) ========
+# Mỗi loại câu hỏi có một hàm _draw_* rút ngẫu nhiên cho cả lô bằng numpy (trả về tham số của từng mẫu,
+# None nếu không dựng được) và một hàm _render_* ghép câu hỏi + SQL cho một mẫu.
+
+_CHOICES_PER_SAMPLE = 8
+_INT_COLUMNS = ['floors', 'bedrooms', 'bathrooms']
+_OR_COLUMNS = ['price', 'area', 'frontage', 'access_road', 'floors', 'bedrooms', 'bathrooms']
+_COMPARISON_OPS = np.array(['>', '<', '='])
+
+class _PreDrawnChoice:
+    """Thay cho random.choice: chọn phần tử theo các số ngẫu nhiên trong [0, 1) đã rút sẵn cho một mẫu."""
+
+    def __init__(self, draws: np.ndarray):
+        self.draws = draws
+        self.k = 0
+
+    def __call__(self, seq):
+        u = self.draws[self.k % len(self.draws)]
+        self.k += 1
+        return seq[int(u * len(seq))]
+
+def _schema_extras(index: ColumnValueIndex, query: str, used_cols: List[str] = None) -> dict:
+    if used_cols is None:
+        used_cols = [c for c in index.columns if c in query]
+    return {"Schema": ", ".join(index.generate_schema(used_cols))}
+
+def _location_sql(cols: List[str], ops: List[str], vals: List[str]) -> str:
+    return " AND ".join(f"{c} {o} '{v}'" for c, o, v in zip(cols, ops, vals))
+
+def _draw_locations(rng, index: ColumnValueIndex, m: int) -> list:
+    rows = index.locations.triples[rng.integers(len(index.locations.triples), size=m)]
+    template_ids = rng.integers(len(LOCATION_TEMPLATES), size=m)
+    return [build_location_phrase(city, district, ward, t) for (city, district, ward), t in zip(rows, template_ids.tolist())]
+
+def _draw_price_ranges(rng, index: ColumnValueIndex, m: int):
+    """Khoảng giá [low, high] từ hai giá liền kề trong danh sách giá đã sắp xếp (làm tròn 100 triệu)."""
+    prices = index.sorted_positive_prices
+    idx = rng.integers(len(prices) - 1, size=m)
+    low = (np.round(prices[idx] / 100_000_000) * 100_000_000).astype(np.int64)
+    high = (np.round(prices[idx + 1] / 100_000_000) * 100_000_000).astype(np.int64)
+    high = np.where(low >= high, low + 100_000_000, high)
+    return low.tolist(), high.tolist()
+
+def _range_columns(index: ColumnValueIndex) -> List[str]:
+    return [c for c in RANGE_COLUMNS if c in index.columns]
+
+# --- comparison_query, count_query và nhánh mặc định ---
+
+def _draw_condition_query(question_type, rng, index, m):
+    if not index.candidate_columns:
+        return [None] * m
+    cols = np.asarray(index.candidate_columns)[rng.integers(len(index.candidate_columns), size=m)]
+    ops = _COMPARISON_OPS[rng.integers(3, size=m)]
+    values = [None] * m
+    for col in np.unique(cols):
+        positions = np.flatnonzero(cols == col)
+        col = str(col)
+        if col in index.value_codes:
+            pool = index.value_codes[col]
+            drawn = index.vocabularies[col][pool[rng.integers(len(pool), size=len(positions))]] if len(pool) else []
+        else:
+            pool = index.valid_values[col]
+            drawn = pool[rng.integers(len(pool), size=len(positions))] if len(pool) else []
+        for pos, value in zip(positions, drawn):
+            values[pos] = value
+    return [None if v is None else (str(c), str(o), v) for c, o, v in zip(cols, ops, values)]
+
+def _render_condition_query(question_type, index, choose, col, op, value):
+    if col in _INT_COLUMNS:
+        value = int(value)
+    value_fixed, op_fixed = fix_col_for_text_column(col, value, op)
+    natural_cond, sql_cond, *_ = NaturalQueryGenerator.generate_natural_condition(col, value_fixed, op_fixed, choose)
+    if question_type == 'count_query':
+        question = generate_count_question(col=col, value=value_fixed, unit=get_unit_for_column(col), op=op_fixed, choose=choose)
+        query = f"SELECT COUNT(*) FROM price_house WHERE {sql_cond}"
+    else:
+        question = natural_cond
+        query = f"SELECT * FROM price_house WHERE {sql_cond}"
+    return question, query, _schema_extras(index, query)
+
+# --- specific_query ---
+
+def _draw_specific_query(question_type, rng, index, m):
+    return [()] * m
+
+def _render_specific_query(question_type, index, choose):
+    cols_specific = ['price', 'district', 'area']
+    translated_cols = [COLUMN_TRANSLATIONS[c] for c in cols_specific]
+    query = f"SELECT {', '.join(cols_specific)} FROM price_house"
+    return generate_specific_question(translated_cols, choose), query, _schema_extras(index, query)
+
+# --- range_query ---
+
+def _draw_range_query(question_type, rng, index, m):
+    if len(index.sorted_positive_prices) < 2:
+        return [None] * m
+    return list(zip(*_draw_price_ranges(rng, index, m)))
+
+def _render_range_query(question_type, index, choose, low, high):
+    question = sanitize_question(f"Tìm nhà có giá từ {format_price_for_display(low)} đến {format_price_for_display(high)}?")
+    query = f"SELECT * FROM price_house WHERE price >= {low} AND price <= {high}"
+    return question, query, _schema_extras(index, query)
+
+# --- location_price_query ---
+
+def _draw_location_price_query(question_type, rng, index, m):
+    prices = index.positive_values.get('price', np.array([]))
+    if index.locations is None or len(index.locations.triples) == 0 or len(index.sorted_positive_prices) < 2:
+        return [None] * m
+    locations = _draw_locations(rng, index, m)
+    op_prices = np.array(['<', '=', 'BETWEEN'])[rng.integers(3, size=m)].tolist()
+    low, high = _draw_price_ranges(rng, index, m)
+    point_prices = prices[rng.integers(len(prices), size=m)]
+    return list(zip(locations, op_prices, low, high, point_prices))
+
+def _render_location_price_query(question_type, index, choose, location, op_price, low, high, value):
+    location_natural, loc_cols, loc_vals, loc_ops = location
+    if op_price == 'BETWEEN':
+        natural_cond = f"giá từ {format_price_for_display(low)} đến {format_price_for_display(high)}"
+        sql_cond = f"price >= {low} AND price <= {high}"
+    else:
+        price_display = format_price_for_display(value)
+        price_value = reverse_price_string_to_number(price_display)
+        natural_cond = f"giá {get_natural_comparison_phrase('price', op_price, choose)} {price_display}"
+        sql_cond = f"price {op_price} {format_sql_value(price_value)}"
+    question = sanitize_question(f"Có nhà nào ở {location_natural} có {natural_cond} không?")
+    query = f"SELECT * FROM price_house WHERE {sql_cond} AND {_location_sql(loc_cols, loc_ops, loc_vals)}"
+    return question, query, _schema_extras(index, query, ["price"] + loc_cols)
+
+# --- like_query ---
+
+def _draw_like_query(question_type, rng, index, m):
+    if len(index.city_codes) == 0:
+        return [None] * m
+    cities = index.city_vocabulary[index.city_codes[rng.integers(len(index.city_codes), size=m)]]
+    return [(city,) for city in cities]
+
+def _render_like_query(question_type, index, choose, city):
+    keyword = city[:3]
+    query = f"SELECT * FROM price_house WHERE city LIKE '%{keyword}%'"
+    return generate_like_question(keyword, choose), query, _schema_extras(index, query)
+
+# --- or_query ---
+
+def _draw_or_query(question_type, rng, index, m):
+    or_cols = [c for c in _OR_COLUMNS if len(index.notna_values.get(c, [])) > 0]
+    if len(or_cols) < 2:
+        return [None] * m
+    # Hai cột khác nhau cho mỗi mẫu
+    pairs = np.argsort(rng.random((m, len(or_cols))), axis=1)[:, :2]
+    ops = _COMPARISON_OPS[rng.integers(3, size=m)].tolist()
+    u1, u2 = rng.random(m), rng.random(m)
+
+    drawn = []
+    for (i1, i2), op, a, b in zip(pairs, ops, u1, u2):
+        col1, col2 = or_cols[i1], or_cols[i2]
+        pool1 = index.notna_values[col1]
+        raw1 = pool1[int(a * len(pool1))]
+        val1 = int(raw1) if col1 in _INT_COLUMNS else round(raw1, 1)
+        # val2 rút đều trong các giá trị của col2 lớn hơn val1
+        sorted2 = index.sorted_values[col2]
+        start = int(np.searchsorted(sorted2, val1, side='right'))
+        if start >= len(sorted2):
+            drawn.append(None)
+            continue
+        raw2 = sorted2[start + int(b * (len(sorted2) - start))]
+        val2 = int(raw2) if col2 in _INT_COLUMNS else round(raw2, 1)
+        drawn.append((col1, val1, col2, val2, op))
+    return drawn
+
+def _render_or_query(question_type, index, choose, col1, val1, col2, val2, op):
+    conds_sql = f"{col1} {op} {format_sql_value(val1)} OR {col2} {op} {format_sql_value(val2)}"
+    question = generate_or_question(col1, val1, get_unit_for_column(col1), col2, val2, get_unit_for_column(col2), op, choose)
+    query = f"SELECT * FROM price_house WHERE {conds_sql}"
+    return question, query, _schema_extras(index, query)
+
+# --- extreme_max, extreme_min, top_k_query ---
+
+def _draw_order_query(question_type, rng, index, m):
+    cols = _range_columns(index)
+    if not cols:
+        return [None] * m
+    chosen = np.asarray(cols)[rng.integers(len(cols), size=m)].tolist()
+    ks = np.array([3, 5, 10])[rng.integers(3, size=m)].tolist()
+    return list(zip(chosen, ks))
+
+def _render_order_query(question_type, index, choose, col, k):
+    if question_type == 'top_k_query':
+        question = generate_top_k_question(COLUMN_TRANSLATIONS.get(col, col), k, choose)
+        query = f"SELECT * FROM price_house ORDER BY {col} DESC LIMIT {k}"
+    elif question_type == 'extreme_min':
+        question = generate_extreme_question(col, mode="min", choose=choose)
+        query = f"SELECT * FROM price_house ORDER BY {col} ASC LIMIT 1"
+    else:
+        question = generate_extreme_question(col, mode="max", choose=choose)
+        query = f"SELECT * FROM price_house ORDER BY {col} DESC LIMIT 1"
+    return question, query, _schema_extras(index, query)
+
+# --- between_location_query ---
+
+def _draw_between_location_query(question_type, rng, index, m):
+    cols = [c for c in _range_columns(index) if len(index.sorted_values.get(c, [])) >= 2]
+    if not cols or index.locations is None or len(index.locations.triples) == 0:
+        return [None] * m
+    chosen = np.asarray(cols)[rng.integers(len(cols), size=m)].tolist()
+    positions = rng.random(m)
+    locations = _draw_locations(rng, index, m)
+
+    drawn = []
+    for col, p, location in zip(chosen, positions, locations):
+        valid = index.sorted_values[col]
+        idx = int(p * (len(valid) - 1))
+        drawn.append((col, valid[idx], valid[idx + 1], location))
+    return drawn
+
+def _render_between_location_query(question_type, index, choose, col, val1_raw, val2_raw, location):
+    location_natural, location_cols, location_vals, location_ops = location
+    val1 = round(val1_raw / 100_000_000) * 100_000_000 if col == 'price' else round(val1_raw, 1)
+    val2 = round(val2_raw / 100_000_000) * 100_000_000 if col == 'price' else round(val2_raw, 1)
+    if val1 >= val2:
+        val2 = val1 + (100_000_000 if col == 'price' else 1)
+    question = generate_between_location_question(
+        COLUMN_TRANSLATIONS.get(col, col),
+        format_number(val1), format_number(val2),
+        get_unit_for_column(col), location_natural, choose
+    )
+    question = cleanup_question(question)
+    query = (f"SELECT * FROM price_house WHERE {col} >= {format_sql_value(val1)} AND {col} <= {format_sql_value(val2)} "
+             f"AND {_location_sql(location_cols, location_ops, location_vals)}")
+    return question, query, _schema_extras(index, query)
+
+# --- location_price_area_query ---
+
+def _draw_location_price_area_query(question_type, rng, index, m):
+    prices = index.positive_values.get('price', np.array([]))
+    areas = index.positive_values.get('area', np.array([]))
+    if index.locations is None or len(index.locations.triples) == 0 or len(prices) == 0 or len(areas) == 0:
+        return [None] * m
+    locations = _draw_locations(rng, index, m)
+    price_vals = prices[rng.integers(len(prices), size=m)]
+    area_vals = areas[rng.integers(len(areas), size=m)]
+    price_ops = _COMPARISON_OPS[rng.integers(3, size=m)].tolist()
+    area_ops = _COMPARISON_OPS[rng.integers(3, size=m)].tolist()
+    return list(zip(locations, price_vals, price_ops, area_vals, area_ops))
+
+def _render_location_price_area_query(question_type, index, choose, location, price_val, price_op, area_val, area_op):
+    location_natural, location_cols, location_vals, location_ops = location
+    price_text = f"{choose(COMPARISON_TERMS['price'][price_op])} {format_price_for_display(price_val)}"
+    area_text = f"{choose(COMPARISON_TERMS['quantity'][area_op])} {format_number(area_val)}m2"
+    question = choose(TEMPLATES_LOCATION_PRICE_AREA).format(
+        location=location_natural,
+        price_condition=price_text,
+        area_condition=area_text
+    )
+    question = sanitize_question(question)
+    query = (f"SELECT * FROM price_house WHERE price {price_op} {int(price_val)} AND area {area_op} {int(area_val)} "
+             f"AND {_location_sql(location_cols, location_ops, location_vals)}")
+    return question, query, _schema_extras(index, query, ["price", "area"] + location_cols)
+
+_CONDITION_SAMPLER = (_draw_condition_query, _render_condition_query)
+_ORDER_SAMPLER = (_draw_order_query, _render_order_query)
+_BATCH_SAMPLERS = {
+    'specific_query': (_draw_specific_query, _render_specific_query),
+    'location_price_query': (_draw_location_price_query, _render_location_price_query),
+    'range_query': (_draw_range_query, _render_range_query),
+    'comparison_query': _CONDITION_SAMPLER,
+    'count_query': _CONDITION_SAMPLER,
+    'like_query': (_draw_like_query, _render_like_query),
+    'or_query': (_draw_or_query, _render_or_query),
+    'extreme_max': _ORDER_SAMPLER,
+    'extreme_min': _ORDER_SAMPLER,
+    'top_k_query': _ORDER_SAMPLER,
+    'between_location_query': (_draw_between_location_query, _render_between_location_query),
+    'location_price_area_query': (_draw_location_price_area_query, _render_location_price_area_query),
+}
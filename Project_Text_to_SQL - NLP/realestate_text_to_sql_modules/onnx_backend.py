@@ -0,0 +1,176 @@
+"""
+Module: onnx_backend.py
+
+Purpose:
+    CPU serving path for the ViT5 checkpoint (`model/Final_model`): export to ONNX encoder /
+    decoder graphs with past key values, optional dynamic int8 quantization, a generate_batch()
+    backend that InferenceEngine accepts in place of the PyTorch Text2SQLModel, and a parity check
+    that measures how much exact-match accuracy the exported model gives up for its speed.
+
+Key Components:
+    - export_onnx(model_dir, onnx_dir): optimum export with `use_cache=True` (encoder, decoder and
+      decoder-with-past graphs) plus tokenizer / config files.
+    - quantize_onnx(onnx_dir, quantized_dir): onnxruntime `quantize_dynamic` (int8 weights) on
+      every graph of an export; the other files are copied as they are.
+    - ONNXText2SQLModel(onnx_dir): ORTModelForSeq2SeqLM on CPUExecutionProvider, same
+      generate_batch(input_texts) as inference_engine.Text2SQLModel.
+    - parity_check(reference, candidate, records): both models on the same test inputs; agreement
+      rate, exact match against the gold SQL for each, and per-question latency.
+
+Note:
+    optimum / onnxruntime are imported inside the functions, so importing this module (and the
+    rest of the package) does not require them. Exact match compares dedup.normalize_sql() forms,
+    i.e. ignoring case outside string literals, whitespace and a trailing ".0".
+
+Usage:
+    from realestate_text_to_sql_modules.onnx_backend import export_onnx, quantize_onnx, ONNXText2SQLModel
+    from realestate_text_to_sql_modules.inference_engine import InferenceEngine
+
+    export_onnx("model/Final_model", "model/Final_model_onnx")
+    quantize_onnx("model/Final_model_onnx", "model/Final_model_onnx_int8")
+    engine = InferenceEngine(model=ONNXText2SQLModel("model/Final_model_onnx_int8"))
+"""
+
+import os
+import shutil
+import time
+from typing import Dict, List
+
+from realestate_text_to_sql_modules.dedup import normalize_sql
+from realestate_text_to_sql_modules.inference_engine import MAX_LENGTH, MODEL_DIR
+
+ONNX_DIR = "model/Final_model_onnx"
+QUANTIZED_DIR = "model/Final_model_onnx_int8"
+PARITY_BATCH_SIZE = 16
+
+def export_onnx(model_dir: str = MODEL_DIR, onnx_dir: str = ONNX_DIR) -> str:
+    """
+    Export a T5 checkpoint to ONNX with a KV cache and save the tokenizer next to the graphs.
+
+    Returns:
+        str: `onnx_dir`.
+    """
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM
+    from transformers import T5Tokenizer
+
+    model = ORTModelForSeq2SeqLM.from_pretrained(model_dir, export=True, use_cache=True)
+    model.save_pretrained(onnx_dir)
+    T5Tokenizer.from_pretrained(model_dir).save_pretrained(onnx_dir)
+    print(f"[INFO] Exported {model_dir} -> {onnx_dir}: {sorted(f for f in os.listdir(onnx_dir) if f.endswith('.onnx'))}")
+    return onnx_dir
+
+def quantize_onnx(onnx_dir: str = ONNX_DIR, quantized_dir: str = QUANTIZED_DIR, per_channel: bool = False) -> str:
+    """
+    Dynamic int8 quantization of every `.onnx` graph in `onnx_dir` (weights int8, activations
+    quantized at run time), written under the same file names in `quantized_dir`.
+
+    Returns:
+        str: `quantized_dir`.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(quantized_dir, exist_ok=True)
+    for name in sorted(os.listdir(onnx_dir)):
+        src = os.path.join(onnx_dir, name)
+        dst = os.path.join(quantized_dir, name)
+        if name.endswith(".onnx"):
+            quantize_dynamic(src, dst, weight_type=QuantType.QInt8, per_channel=per_channel)
+            print(f"[INFO] Quantized {name}: {os.path.getsize(src) / 2**20:.0f} MB -> {os.path.getsize(dst) / 2**20:.0f} MB")
+        elif os.path.isfile(src) and not name.endswith(".onnx_data"):
+            shutil.copy2(src, dst)
+    return quantized_dir
+
+class ONNXText2SQLModel:
+    """
+    ONNX Runtime counterpart of inference_engine.Text2SQLModel (same generate_batch()).
+
+    Args:
+        onnx_dir (str): Output of export_onnx() or quantize_onnx().
+        max_length (int), num_beams (int): Generation settings, as in Text2SQLModel.
+        num_threads (int, optional): Intra-op threads of each ONNX Runtime session.
+        constrained (bool): Restrict generation to the SQL grammar (constrained_decoding) through
+            generate()'s prefix_allowed_tokens_fn.
+    """
+
+    def __init__(self, onnx_dir: str = ONNX_DIR, max_length: int = MAX_LENGTH, num_beams: int = 1, num_threads: int = None,
+                 constrained: bool = False):
+        import onnxruntime
+        from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        from transformers import T5Tokenizer
+
+        session_options = onnxruntime.SessionOptions()
+        if num_threads:
+            session_options.intra_op_num_threads = num_threads
+        self.tokenizer = T5Tokenizer.from_pretrained(onnx_dir)
+        self.model = ORTModelForSeq2SeqLM.from_pretrained(
+            onnx_dir, use_cache=True, provider="CPUExecutionProvider", session_options=session_options
+        )
+        self.max_length = max_length
+        self.num_beams = num_beams
+        self.constraint = None
+        if constrained:
+            from realestate_text_to_sql_modules.constrained_decoding import GrammarConstraint
+            self.constraint = GrammarConstraint(self.tokenizer)
+
+    def generate_batch(self, input_texts: List[str]) -> List[str]:
+        inputs = self.tokenizer(list(input_texts), return_tensors="pt", padding="longest", truncation=True)
+        outputs = self.model.generate(
+            inputs.input_ids,
+            attention_mask=inputs.attention_mask,
+            max_length=self.max_length,
+            num_beams=self.num_beams,
+            decoder_start_token_id=self.model.config.decoder_start_token_id,
+            pad_token_id=self.tokenizer.pad_token_id,
+            prefix_allowed_tokens_fn=self.constraint.prefix_allowed_tokens_fn if self.constraint else None
+        )
+        return self.tokenizer.batch_decode(outputs, skip_special_tokens=True)
+
+def model_input(record: dict) -> str:
+    """Model input for a test record, built as in the notebooks' test-set evaluation."""
+    return f"Câu hỏi: {record['Question'].lower().strip()} | Schema: {record['Schema']}"
+
+def _generate_timed(model, input_texts: List[str], batch_size: int):
+    outputs = []
+    start = time.perf_counter()
+    for i in range(0, len(input_texts), batch_size):
+        outputs.extend(model.generate_batch(input_texts[i:i + batch_size]))
+    return outputs, time.perf_counter() - start
+
+def parity_check(reference, candidate, records: List[dict], batch_size: int = PARITY_BATCH_SIZE) -> Dict:
+    """
+    Compare a candidate backend (e.g. quantized ONNX) with the reference (PyTorch) on test records.
+
+    Args:
+        reference, candidate: Objects with generate_batch(input_texts).
+        records (list): Test records with Question / Schema / SQL.
+        batch_size (int): Inputs per generate_batch() call.
+
+    Returns:
+        dict: agreement (candidate SQL == reference SQL), exact match of each against the gold SQL,
+            the exact match lost, per-question latency of each, speedup and a few disagreements.
+    """
+    input_texts = [model_input(r) for r in records]
+    gold = [normalize_sql(r["SQL"]) for r in records]
+    ref_sql, ref_time = _generate_timed(reference, input_texts, batch_size)
+    cand_sql, cand_time = _generate_timed(candidate, input_texts, batch_size)
+
+    n = len(records)
+    ref_norm = [normalize_sql(s) for s in ref_sql]
+    cand_norm = [normalize_sql(s) for s in cand_sql]
+    ref_em = sum(p == g for p, g in zip(ref_norm, gold)) / n if n else 0.0
+    cand_em = sum(p == g for p, g in zip(cand_norm, gold)) / n if n else 0.0
+    disagreements = [
+        {"question": r["Question"], "reference": a, "candidate": b, "gold": r["SQL"]}
+        for r, a, b, an, bn in zip(records, ref_sql, cand_sql, ref_norm, cand_norm) if an != bn
+    ]
+    return {
+        "samples": n,
+        "agreement": 1 - len(disagreements) / n if n else 0.0,
+        "exact_match_reference": ref_em,
+        "exact_match_candidate": cand_em,
+        "exact_match_lost": ref_em - cand_em,
+        "reference_ms_per_question": ref_time / n * 1000 if n else 0.0,
+        "candidate_ms_per_question": cand_time / n * 1000 if n else 0.0,
+        "speedup": ref_time / cand_time if cand_time else 0.0,
+        "disagreements": disagreements[:10],
+    }
@@ -0,0 +1,313 @@
+"""
+Module: question_processing.py
+
+Purpose:
+    Question pre-processing and SQL post-processing used at inference time, moved out of
+    `notebooks/run_gradio.ipynb` so the demo, the batched inference engine and scripts share one copy.
+
+Key Components:
+    - parse_schema / FULL_SCHEMA: the demo's schema string as (column, dtype) pairs.
+    - extract_relevant_columns_from_question, generate_input_text: build the model input.
+    - normalize_question: lower-case, strip and map Ho Chi Minh City aliases (HCM_ALIAS_RE).
+    - load_locations / flatten_locations / extract_location_from_question_v2: match a city /
+      district / ward mentioned in the question.
+    - LocationMatcher: trie over all location names, built once per locations list and used by
+      extract_location_from_question_v2 (one pass over the question instead of one regex per row).
+    - smart_fix_sql, fix_location_in_sql: heuristic repairs of the generated SQL. smart_fix_sql
+      uses precompiled patterns and finds the question's trigger words with one regex
+      (SQL_FIX_KEYWORDS -> SQL_FIX_RULES).
+
+Usage:
+    from realestate_text_to_sql_modules.question_processing import (
+        normalize_question, load_locations, extract_location_from_question_v2,
+        extract_relevant_columns_from_question, generate_input_text, FULL_SCHEMA
+    )
+
+    question = normalize_question("Nhà dưới 3 tỷ ở Gò Vấp, TP HCM")
+    location = extract_location_from_question_v2(question, load_locations("data/processing/locations_flat.json"))
+    input_text = generate_input_text(question, extract_relevant_columns_from_question(question, FULL_SCHEMA))
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+import pandas as pd
+from unidecode import unidecode
+
+SCHEMA = "address[str], area[float], frontage[float], access_road[float], house_direction[str], balcony_direction[str], \
+          floors[int], bedrooms[int], bathrooms[int], legal_status[str], furniture_state[str], price[float], city[str], district[str], \
+          ward[str], cluster_label[str]"
+
+SCHEMA_KEYWORDS = {
+    'address': ['địa chỉ'], 'area': ['diện tích', 'm2', 'mét vuông'],
+    'price': ['giá', 'tỷ', 'triệu', 'bao nhiêu tiền'],
+    'frontage': ['mặt tiền'], 'access_road': ['đường vào', 'đường', 'hẻm'],
+    'house_direction': ['hướng nhà'], 'balcony_direction': ['hướng ban công'],
+    'floors': ['tầng', 'lầu'], 'bedrooms': ['phòng ngủ'], 'bathrooms': ['phòng tắm', 'wc'],
+    'legal_status': ['pháp lý', 'sổ hồng', 'sổ đỏ'], 'furniture_state': ['nội thất'],
+    'city': ['thành phố'], 'district': ['quận', 'huyện'], 'ward': ['phường', 'xã'],
+    'cluster_label': ['phân khúc']
+}
+
+# Biến thể của thành phố Hồ Chí Minh
+HCM_ALIASES = [
+    "thành phố hồ chí minh", "tp hồ chí minh", "tp. hồ chí minh", "tphcm",
+    "tp hcm", "tp.hcm", "hcm", "hcm city",
+    "sài gòn", "tp sg", "thành phố sg", "sg", "saigon"
+]
+
+def parse_schema(schema: str = SCHEMA) -> List[Tuple[str, str]]:
+    """"col[dtype], ..." -> [(col, dtype), ...]"""
+    full_schema = [tuple(col.strip().split("[")) for col in schema.split(",")]
+    return [(col, dtype.strip("]")) for col, dtype in full_schema]
+
+FULL_SCHEMA = parse_schema(SCHEMA)
+
+def extract_relevant_columns_from_question(question: str, schema: list) -> list:
+    question = question.lower()
+    relevant = []
+    for col, dtype in schema:
+        if col in SCHEMA_KEYWORDS:
+            for kw in SCHEMA_KEYWORDS[col]:
+                if kw in question:
+                    relevant.append((col, dtype))
+                    break
+    if 'giá' in question and ('price', 'float') not in relevant:
+        relevant.append(('price', 'float'))
+    return relevant
+
+def generate_input_text(question: str, schema_columns: list) -> str:
+    schema_str = ", ".join([f"{col}[{dtype}]" for col, dtype in schema_columns])
+    return f"Câu hỏi: {question} | Schema: {schema_str}"
+
+# Mọi alias trong một regex, theo đúng thứ tự của HCM_ALIASES: ở cùng một vị trí, alias đứng
+# trước trong danh sách được ưu tiên như khi replace lần lượt từng alias
+HCM_ALIAS_RE = re.compile("|".join(re.escape(alias) for alias in HCM_ALIASES))
+
+def normalize_question(text: str) -> str:
+    """
+    Normalize a natural language question:
+    - Convert to lowercase and strip whitespace
+    - Convert expressions like "2.5 tỷ", "3 triệu" to numeric VND values
+    - Normalize city name variants (e.g., SG, HCM → hồ chí minh) in one regex pass
+
+    Note:
+        Same result as replacing each alias in turn, except when a replacement itself forms a new
+        alias with its neighbours (e.g. "tp. tp hồ chí minh"), which one pass leaves as is.
+    """
+    try:
+        text = text.lower().strip()
+        return HCM_ALIAS_RE.sub("hồ chí minh", text)
+    except Exception as e:
+        print(f"Error in normalize_question: {e}")
+        return text
+
+def flatten_locations(nested: Dict[str, Dict[str, List[str]]]) -> List[Dict[str, str]]:
+    """Flatten: từ {city: {district: [ward, ...]}} → list of dict"""
+    flat = []
+    for city, districts in nested.items():
+        for district, wards in districts.items():
+            for ward in wards:
+                flat.append({
+                    "city": city,
+                    "district": district,
+                    "ward": ward
+                })
+    return flat
+
+def load_locations(filepath: str):
+    try:
+        df = pd.read_csv(filepath) if filepath.endswith(".csv") else pd.read_json(filepath)
+        return df[['city', 'district', 'ward']].dropna().drop_duplicates().to_dict(orient="records")
+    except Exception as e:
+        print(f"Error loading locations: {e}")
+        return []
+
+def _is_word_char(ch: str) -> bool:
+    # Same characters as `\w` in the legacy `re.search(rf'\b{name}\b', ...)` patterns
+    return ch.isalnum() or ch == '_'
+
+class LocationMatcher:
+    """
+    Prebuilt matcher for city / district / ward names, same results as the per-location regex scan.
+
+    All unidecoded, lower-cased names go into one character trie. A question is scanned once: from
+    every word-boundary position the trie is walked as far as the text allows, and a name counts
+    as found when it also ends on a word boundary (what `\bname\b` requires). The precedence of
+    the original three passes is precomputed per name:
+        1. ward + its district both mentioned: first such row in list order,
+        2. otherwise a district: last row in list order with a mentioned district,
+        3. otherwise a city: last row in list order with a mentioned city.
+
+    Args:
+        locations (list): [{'city', 'district', 'ward'}, ...] as returned by load_locations().
+    """
+
+    _END = ''
+
+    def __init__(self, locations: list):
+        self.locations = locations
+        self.trie: dict = {}
+        self.ward_rows: Dict[str, List[Tuple[int, str]]] = {}
+        self.district_last: Dict[str, int] = {}
+        self.city_last: Dict[str, int] = {}
+        for i, loc in enumerate(locations):
+            ward = unidecode(loc['ward'].lower())
+            district = unidecode(loc['district'].lower())
+            city = unidecode(loc['city'].lower())
+            self.ward_rows.setdefault(ward, []).append((i, district))
+            self.district_last[district] = i
+            self.city_last[city] = i
+            for name in (ward, district, city):
+                self._insert(name)
+
+    def _insert(self, name: str) -> None:
+        node = self.trie
+        for ch in name:
+            node = node.setdefault(ch, {})
+        node[self._END] = name
+
+    def find_names(self, text: str) -> set:
+        """Every name that occurs in `text` (already unidecoded and lower-cased) between word boundaries."""
+        is_word = [_is_word_char(ch) for ch in text] + [False]
+        found = set()
+        prev = False
+        for start in range(len(text) + 1):
+            if is_word[start] != prev:
+                node = self.trie
+                pos = start
+                while node is not None:
+                    name = node.get(self._END)
+                    if name is not None and is_word[pos] != is_word[pos - 1 if pos else len(text)]:
+                        found.add(name)
+                    if pos == len(text):
+                        break
+                    node = node.get(text[pos])
+                    pos += 1
+            prev = is_word[start]
+        return found
+
+    def match(self, question: str) -> dict:
+        """Matched {'city', 'district', 'ward'} for a question, None where nothing matched."""
+        found = self.find_names(unidecode(question.lower()))
+
+        best = None
+        for name in found:
+            for i, district in self.ward_rows.get(name, ()):
+                if district in found:
+                    if best is None or i < best:
+                        best = i
+                    break
+        if best is not None:
+            loc = self.locations[best]
+            return {'city': loc['city'], 'district': loc['district'], 'ward': loc['ward']}
+
+        matched = {'city': None, 'district': None, 'ward': None}
+        rows = [self.district_last[name] for name in found if name in self.district_last]
+        if rows:
+            loc = self.locations[max(rows)]
+            matched['district'] = loc['district']
+            matched['city'] = loc['city']
+            return matched
+
+        rows = [self.city_last[name] for name in found if name in self.city_last]
+        if rows:
+            matched['city'] = self.locations[max(rows)]['city']
+        return matched
+
+_MATCHERS: Dict[int, Tuple[list, int, LocationMatcher]] = {}
+
+def get_location_matcher(locations: list) -> LocationMatcher:
+    """
+    LocationMatcher for this list, built on first use. Keyed by the list object; a list changed
+    in place (same length) needs a new LocationMatcher(locations) instead.
+    """
+    entry = _MATCHERS.get(id(locations))
+    if entry is not None and entry[0] is locations and entry[1] == len(locations):
+        return entry[2]
+    matcher = LocationMatcher(locations)
+    _MATCHERS[id(locations)] = (locations, len(locations), matcher)
+    return matcher
+
+def extract_location_from_question_v2(question: str, locations: list) -> dict:
+    try:
+        return get_location_matcher(locations).match(question)
+    except Exception as e:
+        print(f"[extract_location_from_question_v2] Error: {e}")
+        return {'city': None, 'district': None, 'ward': None}
+
+# smart_fix_sql: patterns compiled once, keywords of the question found by one regex
+MISSING_AND_RE = re.compile(r"(\d[\)']?)\s+([a-zA-Z_]+\s*[=><])")
+REPEATED_WORD_RE = re.compile(r"\b(\w+)\b(?:\s+\1\b)+")
+PRICE_RANGE_RE = re.compile(r"price\s*>=\s*(\d+\.?\d*)\s*AND\s*price\s*<=\s*(\d+\.?\d*)")
+SQL_FIX_KEYWORDS = {
+    'từ': 'range_from', 'đến': 'range_to',
+    'dưới': 'less', 'ít hơn': 'less', 'rẻ hơn': 'less', 'thấp hơn': 'less',
+    'trên': 'more', 'nhiều hơn': 'more', 'cao hơn': 'more', 'đắt hơn': 'more',
+}
+SQL_FIX_KEYWORD_RE = re.compile("|".join(re.escape(k) for k in SQL_FIX_KEYWORDS))
+# Nhóm từ khóa -> (pattern, replacement), áp dụng theo thứ tự này
+SQL_FIX_RULES = {
+    'less': (re.compile(r"(price|quantity)\s*>=\s*(\d+)"), r"\1 < \2"),
+    'more': (re.compile(r"(price|quantity)\s*<=\s*(\d+)"), r"\1 > \2"),
+}
+
+def question_keywords(question: str) -> set:
+    """Keyword groups of SQL_FIX_KEYWORDS present in the question ('less', 'more', ...)."""
+    return {SQL_FIX_KEYWORDS[k] for k in SQL_FIX_KEYWORD_RE.findall(question)}
+
+def smart_fix_sql(sql: str, question: str = "") -> str:
+    """
+    Apply heuristic fixes to SQL:
+    - Fix missing ANDs
+    - Collapse repeated words
+    - Convert BETWEEN if "từ ... đến" is detected
+    - Fix wrong comparison operators for phrases like 'dưới', 'cao hơn', etc.
+    """
+    try:
+        sql = MISSING_AND_RE.sub(r"\1 AND \2", sql)
+        sql = REPEATED_WORD_RE.sub(r"\1", sql)
+        groups = question_keywords(question)
+        if 'range_from' in groups and 'range_to' in groups:
+            m = PRICE_RANGE_RE.search(sql)
+            if m:
+                x, y = m.groups()
+                sql = PRICE_RANGE_RE.sub(f"price BETWEEN {x} AND {y}", sql)
+        for group, (pattern, replacement) in SQL_FIX_RULES.items():
+            if group in groups:
+                sql = pattern.sub(replacement, sql)
+        return sql
+    except Exception as e:
+        print(f"Error in smart_fix_sql: {e}")
+        return sql
+
+def fix_location_in_sql(sql: str, matched_location: dict) -> str:
+    try:
+        sql = re.sub(r"(AND\s+)?(city|district|ward)\s*=\s*'[^']*'", "", sql, flags=re.IGNORECASE)
+        sql = re.sub(r"\s+WHERE\s+AND", " WHERE ", sql, flags=re.IGNORECASE)
+        sql = re.sub(r"\s+AND\s+AND", " AND ", sql)
+
+        conditions = []
+        if matched_location.get('ward'):
+            conditions.append(f"ward = '{matched_location['ward']}'")
+        if matched_location.get('district'):
+            conditions.append(f"district = '{matched_location['district']}'")
+        if matched_location.get('city'):
+            conditions.append(f"city = '{matched_location['city']}'")
+
+        if not conditions:
+            return sql.strip()
+
+        # Tìm vị trí để chèn WHERE trước ORDER BY / GROUP BY / LIMIT
+        split_pattern = r"\b(order by|group by|limit|having)\b"
+        parts = re.split(split_pattern, sql, flags=re.IGNORECASE)
+
+        if "where" in sql.lower():
+            parts[0] += " AND " + " AND ".join(conditions)
+        else:
+            parts[0] += " WHERE " + " AND ".join(conditions)
+
+        return " ".join(parts).strip()
+    except Exception as e:
+        print(f"[fix_location_in_sql] Error: {e}")
+        return sql
@@ -5,12 +5,14 @@ from typing import List, Dict
 from realestate_text_to_sql_modules.schema_generator import SchemaGenerator
 from realestate_text_to_sql_modules.sql_type_manager import SQLTypeManager
 from realestate_text_to_sql_modules.natural_query_generator import NaturalQueryGenerator
+from realestate_text_to_sql_modules.column_value_index import ColumnValueIndex
 
 class RealEstateTextToSQL:
     def __init__(self, df: pd.DataFrame):
         """Khởi tạo class RealEstateTextToSQL với DataFrame đầu vào."""
         self.df = df
         self.full_schema = SchemaGenerator.generate_schema(df)
+        self.index = ColumnValueIndex.for_dataframe(df)
         self.generator = NaturalQueryGenerator()
 
     def generate_samples(self, n: int) -> pd.DataFrame:
@@ -30,7 +32,7 @@ class RealEstateTextToSQL:
             question_type = SQLTypeManager.sample_question_type()
 
             try:
-                question, query, extras = NaturalQueryGenerator.generate_query(self.df, question_type)
+                question, query, extras = NaturalQueryGenerator.generate_query(self.df, question_type, index=self.index)
                 samples.append({
                     "Question": question,
                     "Schema": ", ".join(self.full_schema),
@@ -0,0 +1,227 @@
+"""
+Module: result_cache.py
+
+Purpose:
+    Two-level cache in front of the ViT5 model for repeated traffic ("nhà dưới 3 tỷ ở gò vấp" in
+    many spellings), so a repeated question skips generation, SQL fixing and, when the database
+    did not change, query execution.
+
+Key Components:
+    - LRUCache(maxsize, ttl): thread-safe LRU with optional time-to-live and hit / miss /
+      eviction / expiry counters.
+    - question_cache_key(question, location): normalized question unidecoded with its location
+      mentions masked (numbers and operators kept), plus the canonical (city, district, ward).
+    - CachedText2SQL(engine, db_path):
+        + level 1: question key -> final SQL
+        + level 2: final SQL -> result DataFrame, dropped as soon as the SQLite file's
+          mtime / size change
+      sql(question), query(question) and stats() with the counters of both levels.
+      With `slot_templates` (a slot_cache.SlotTemplateCache), a level-1 miss first tries a SQL
+      skeleton learned from a question that differs only in its numbers / place names.
+
+Usage:
+    from realestate_text_to_sql_modules.inference_engine import InferenceEngine
+    from realestate_text_to_sql_modules.result_cache import CachedText2SQL
+
+    service = CachedText2SQL(InferenceEngine(), db_path="data/processing/SQLite_real_estate.db")
+    df = service.query("Nhà dưới 3 tỷ ở Gò Vấp")
+    print(service.stats())
+"""
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+from unidecode import unidecode
+
+from realestate_text_to_sql_modules.sql_utils import DEFAULT_DB_PATH, run_query
+
+SQL_CACHE_SIZE = 10_000
+SQL_CACHE_TTL = 24 * 3600  # seconds; bounds how long answers from an older model version survive
+RESULT_CACHE_SIZE = 1_000
+RESULT_CACHE_TTL = 600
+LOC_RUN_RE = re.compile(r"<loc>(?:[\s,.;-]+<loc>)+")
+
+_MISSING = object()
+
+class LRUCache:
+    """
+    Least-recently-used cache with an optional time-to-live.
+
+    Args:
+        maxsize (int): Maximum number of entries; the least recently used one is evicted first.
+        ttl (float, optional): Seconds after insertion before an entry expires (None: never).
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, Tuple[float, object]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default=None):
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+                del self._data[key]
+                self.expirations += 1
+                entry = _MISSING
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+def question_cache_key(question: str, location: dict) -> Tuple[str, Tuple]:
+    """
+    Cache key for a question already passed through normalize_question.
+
+    The text is unidecoded and lower-cased (the form LocationMatcher matches on), every mention of
+    the matched city / district / ward becomes one "<loc>" token (as in slot_cache.mask_question)
+    and spaces and a trailing "?" are folded; the canonical (city, district, ward) names are the
+    second half of the key. Numbers and comparison operators stay as written: they change the SQL.
+
+    >>> loc = {'city': 'Hồ Chí Minh', 'district': 'Gò Vấp', 'ward': None}
+    >>> keys = {question_cache_key(q, loc) for q in ["nhà dưới 3 tỷ ở gò vấp", "nhà dưới 3 tỷ ở go vap",
+    ...                                              "nha duoi 3 ty o go vap", "nhà dưới 3 tỷ ở gò vấp, hồ chí minh"]}
+    >>> keys
+    {('nha duoi 3 ty o <loc>', ('Hồ Chí Minh', 'Gò Vấp', None))}
+    >>> question_cache_key("nhà dưới 5 tỷ ở gò vấp", loc) in keys
+    False
+    >>> question_cache_key("nhà giá > 3 tỷ ở gò vấp", loc) == question_cache_key("nhà giá < 3 tỷ ở gò vấp", loc)
+    False
+    >>> question_cache_key("nhà giá >= 3 tỷ", {})[0] == question_cache_key("nhà giá <= 3 tỷ", {})[0]
+    False
+    >>> question_cache_key("Nhà  ở Gò Vấp ?", loc)[0]
+    'nha o <loc>'
+    """
+    text = unidecode(question.lower())
+    names = {unidecode(v.lower()) for v in location.values() if v}
+    for name in sorted(names, key=len, reverse=True):
+        text = re.sub(rf"\b{re.escape(name)}\b", "<loc>", text)
+    # "gò vấp, hồ chí minh" -> một token duy nhất
+    text = LOC_RUN_RE.sub("<loc>", text)
+    text = " ".join(text.split()).rstrip(" ?")
+    return text, (location.get('city'), location.get('district'), location.get('ward'))
+
+class CachedText2SQL:
+    """
+    Question -> SQL -> result DataFrame with a cache at each step.
+
+    Args:
+        engine: InferenceEngine (anything with prepare() and submit_prepared()).
+        db_path (str): SQLite database the SQL runs on; its mtime / size invalidate level 2.
+        sql_cache_size, sql_cache_ttl: Level 1 (question -> SQL) limits.
+        result_cache_size, result_cache_ttl: Level 2 (SQL -> DataFrame) limits.
+        max_rows (int): Row limit passed to run_query().
+        slot_templates (SlotTemplateCache, optional): Value-slot skeletons tried between level 1
+            and the model.
+    """
+
+    def __init__(self, engine, db_path: str = DEFAULT_DB_PATH,
+                 sql_cache_size: int = SQL_CACHE_SIZE, sql_cache_ttl: Optional[float] = SQL_CACHE_TTL,
+                 result_cache_size: int = RESULT_CACHE_SIZE, result_cache_ttl: Optional[float] = RESULT_CACHE_TTL,
+                 max_rows: int = 200, slot_templates=None):
+        self.engine = engine
+        self.slot_templates = slot_templates
+        self.db_path = db_path
+        self.max_rows = max_rows
+        self.sql_cache = LRUCache(sql_cache_size, sql_cache_ttl)
+        self.result_cache = LRUCache(result_cache_size, result_cache_ttl)
+        self._db_signature = self._current_db_signature()
+        self._db_lock = threading.Lock()
+        self.db_invalidations = 0
+
+    def _current_db_signature(self) -> Tuple[int, int]:
+        try:
+            st = os.stat(self.db_path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return 0, 0
+
+    def _check_db(self) -> None:
+        """Drop every cached result if the database file was rewritten since they were computed."""
+        signature = self._current_db_signature()
+        if signature != self._db_signature:
+            with self._db_lock:
+                if signature != self._db_signature:
+                    self.result_cache.clear()
+                    self._db_signature = signature
+                    self.db_invalidations += 1
+
+    def sql(self, raw_question: str, timeout: float = None) -> str:
+        """Final SQL for a question, generated only on a level-1 (and slot-template) miss."""
+        prepared = self.engine.prepare(raw_question)
+        key = question_cache_key(prepared["question"], prepared["location"])
+        sql = self.sql_cache.get(key)
+        if sql is not None:
+            return sql
+        if self.slot_templates is None:
+            sql = self.engine.submit_prepared(prepared).result(timeout)
+        else:
+            sql = self.slot_templates.lookup(prepared["question"], prepared["location"])
+            if sql is None:
+                result = self.engine.submit_prepared(prepared, detailed=True).result(timeout)
+                self.slot_templates.learn(prepared["question"], prepared["location"], result["fixed_sql"])
+                sql = result["sql"]
+        self.sql_cache.put(key, sql)
+        return sql
+
+    def run(self, sql: str) -> pd.DataFrame:
+        """Result frame for a SQL string, executed only on a level-2 miss (errors are not cached)."""
+        self._check_db()
+        df = self.result_cache.get(sql)
+        if df is None:
+            df = run_query(sql, self.db_path, max_rows=self.max_rows)
+            if list(df.columns) != ["Lỗi"]:
+                self.result_cache.put(sql, df)
+        # Callers (e.g. Gradio) get their own copy of the cached frame
+        return df.copy()
+
+    def query(self, raw_question: str, timeout: float = None) -> pd.DataFrame:
+        return self.run(self.sql(raw_question, timeout))
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        result_stats = self.result_cache.stats()
+        result_stats["db_invalidations"] = self.db_invalidations
+        stats = {"sql": self.sql_cache.stats(), "result": result_stats}
+        if self.slot_templates is not None:
+            stats["slot_templates"] = self.slot_templates.stats()
+        return stats
@@ -0,0 +1,431 @@
+"""
+Module: rewards.py
+
+Purpose:
+    SQL rewards of the phase-2 hybrid (CE + reward) training, moved out of
+    `notebooks/Phase_2_CE+RL_final_model.ipynb`, and a batch scorer that keeps their cost off the
+    training step: rewards are memoized per (pred, gold) across steps and epochs, and the misses
+    of a batch are scored on a process pool.
+
+Key Components:
+    - extract_conditions(sql): (field, operator, value) tuples of the WHERE clause, with
+      precompiled patterns.
+    - reward_fn_v3(pred_sql, gold_sql): logic-aware reward in [0, 1] (fields 0.4, operators 0.2,
+      values 0.2, fuzzy similarity 0.2, -0.15 per missing field), same scores as the notebook.
+    - reward_fn_simple(pred, gold): SequenceMatcher ratio.
+    - RewardScorer(reward_fn, workers, cache_size): score(preds, golds) -> rewards, with an LRU memo
+      (result_cache.LRUCache), de-duplication inside the batch and a ProcessPoolExecutor for the
+      misses when the batch is large enough to pay for the round trip. A reward that raises
+      scores 0.0, as the trainer's try / except did.
+    - result_fingerprint(conn_pool, sql): (row count, hash) of what a query returns; `SELECT *`
+      and `SELECT COUNT(*)` queries are fingerprinted by their set of table rowids
+      (`SELECT rowid FROM ...`), others by the sorted result rows.
+    - GoldFingerprintStore(db_path, store_path): gold fingerprints of a dataset computed once and
+      kept on disk (JSON), keyed by the normalized gold SQL; rebuilt when the dataset, the
+      database file or FINGERPRINT_VERSION changes.
+    - ExecutionReward(gold_store): reward_fn(pred, gold) that runs the prediction on a pooled
+      read-only connection with a time budget and compares fingerprints: 1.0 when the result
+      matches the gold one, 0.0 when the prediction fails or times out, otherwise
+      `fallback_weight * fallback(pred, gold)` (reward_fn_v3 by default). Prediction fingerprints
+      are memoized too.
+
+Usage:
+    from realestate_text_to_sql_modules.rewards import RewardScorer, reward_fn_v3
+
+    scorer = RewardScorer(reward_fn_v3, workers=4)
+    rewards = scorer.score(preds, golds)
+    print(scorer.stats())      # hits / misses / hit_rate / scored / score_ms
+    scorer.close()
+
+    store = GoldFingerprintStore.for_dataset("data/processing/phase2/train_text2sql.json",
+                                             db_path="data/processing/SQLite_real_estate.db")
+    scorer = RewardScorer(ExecutionReward(store), workers=4)
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from difflib import SequenceMatcher
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from realestate_text_to_sql_modules.dedup import normalize_sql
+from realestate_text_to_sql_modules.result_cache import LRUCache
+from realestate_text_to_sql_modules.sql_utils import DEFAULT_DB_PATH, POOL_TIMEOUT, ConnectionPool, QueryTimeout
+
+REWARD_CACHE_SIZE = 200_000
+FINGERPRINT_VERSION = 2
+EXECUTION_TIMEOUT = 1.0   # seconds per predicted query
+FINGERPRINT_CACHE_SIZE = 200_000
+# Misses per batch below which scoring stays in-process (pickling to the pool costs more)
+MIN_PARALLEL_MISSES = 32
+
+WHERE_RE = re.compile(r"where\s+(.*)")
+CONDITION_SPLIT_RE = re.compile(r'\s+and\s+|\s+or\s+')
+CONDITION_RE = re.compile(r"(\w+)\s*(=|>=|<=|<|>|like|between)\s*(.+)")
+
+def extract_conditions(sql: str) -> list:
+    """
+    Extracts (field, operator, value) tuples from the WHERE clause of SQL.
+    """
+    sql = sql.lower()
+    conditions = []
+    where_match = WHERE_RE.search(sql)
+    if where_match:
+        for cond in CONDITION_SPLIT_RE.split(where_match.group(1)):
+            match = CONDITION_RE.match(cond.strip())
+            if match:
+                field, op, val = match.groups()
+                val = val.strip().strip("'").strip('"')
+                conditions.append((field.strip(), op.strip(), val))
+    return conditions
+
+def reward_fn_v3(pred_sql: str, gold_sql: str) -> float:
+    """
+    Computes a logic-aware reward score between predicted and gold SQL queries.
+
+    This version penalizes:
+    - wrong field (no match in any condition)
+    - wrong operator
+    - wrong value (based on fuzzy match)
+    - adds fuzzy string similarity for overall structure
+
+    Args:
+        pred_sql (str): Predicted SQL string
+        gold_sql (str): Ground truth SQL string
+
+    Returns:
+        float: Reward in [0.0, 1.0]
+    """
+    pred = pred_sql.strip().lower()
+    gold = gold_sql.strip().lower()
+
+    if pred == gold:
+        return 1.0
+
+    # Fuzzy string similarity
+    fuzzy = SequenceMatcher(None, pred, gold).ratio()
+
+    # Parse WHERE clause
+    pred_conds = extract_conditions(pred)
+    gold_conds = extract_conditions(gold)
+
+    if not gold_conds:
+        return fuzzy  # fallback if no WHERE clause
+
+    matched_fields = 0
+    matched_ops = 0
+    matched_vals = 0
+    total = len(gold_conds)
+    unmatched_fields = 0
+
+    for gold_field, gold_op, gold_val in gold_conds:
+        matched = False
+        for pred_field, pred_op, pred_val in pred_conds:
+            if gold_field == pred_field:
+                matched_fields += 1
+                if gold_op == pred_op:
+                    matched_ops += 1
+                if gold_val == pred_val or SequenceMatcher(None, pred_val, gold_val).ratio() > 0.9:
+                    matched_vals += 1
+                matched = True
+                break
+        if not matched:
+            unmatched_fields += 1
+
+    # Scores
+    field_score = matched_fields / total
+    op_score = matched_ops / total
+    val_score = matched_vals / total
+    field_miss_penalty = 0.15 * unmatched_fields  # strong penalty for missing fields
+
+    reward = (
+        0.4 * field_score +
+        0.2 * op_score +
+        0.2 * val_score +
+        0.2 * fuzzy -
+        field_miss_penalty
+    )
+    return round(max(0.0, min(reward, 1.0)), 4)
+
+def reward_fn_simple(pred: str, gold: str) -> float:
+    """Returns a fuzzy string similarity score between prediction and gold SQL."""
+    return SequenceMatcher(None, pred.strip().lower(), gold.strip().lower()).ratio()
+
+def _score_pairs(reward_fn: Callable[[str, str], float], pairs: Sequence[tuple]) -> List[float]:
+    """Rewards of (pred, gold) pairs; a pair whose reward raises scores 0.0."""
+    rewards = []
+    for pred, gold in pairs:
+        try:
+            rewards.append(float(reward_fn(pred, gold)))
+        except Exception as e:
+            print(f"[Reward Error] {e}")
+            rewards.append(0.0)
+    return rewards
+
+# reward_fn of a RewardScorer pool worker, sent once when the worker starts so its own caches
+# (e.g. ExecutionReward's prediction fingerprints) live across batches
+_worker_reward_fn = None
+
+def _init_worker(reward_fn: Callable[[str, str], float]) -> None:
+    global _worker_reward_fn
+    _worker_reward_fn = reward_fn
+
+def _score_pairs_in_worker(pairs: Sequence[tuple]) -> List[float]:
+    return _score_pairs(_worker_reward_fn, pairs)
+
+class RewardScorer:
+    """
+    Memoized, optionally parallel batch scoring with a (pred, gold) reward function.
+
+    Args:
+        reward_fn (callable): reward_fn(pred, gold) -> float; must be picklable (a module-level
+            function) when `workers` > 1.
+        workers (int): Processes for scoring the misses of a batch; 0 or 1 scores in-process.
+        cache_size (int): Memoized (pred, gold) pairs kept (least recently used evicted first).
+        min_parallel (int): Smallest number of misses sent to the pool.
+    """
+
+    def __init__(self, reward_fn: Callable[[str, str], float] = reward_fn_v3, workers: int = 0,
+                 cache_size: int = REWARD_CACHE_SIZE, min_parallel: int = MIN_PARALLEL_MISSES):
+        self.reward_fn = reward_fn
+        self.workers = workers
+        self.min_parallel = min_parallel
+        self.cache = LRUCache(cache_size)
+        self._pool = None
+        self.scored = 0
+        self.score_seconds = 0.0
+
+    def _pool_executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.reward_fn,))
+        return self._pool
+
+    def score(self, preds: Sequence[str], golds: Sequence[str]) -> List[float]:
+        """Reward of each (pred, gold) pair, in order."""
+        start = time.perf_counter()
+        pairs = list(zip(preds, golds))
+        rewards: Dict[tuple, float] = {}
+        misses = []
+        for pair in dict.fromkeys(pairs):
+            reward = self.cache.get(pair)
+            if reward is None:
+                misses.append(pair)
+            else:
+                rewards[pair] = reward
+
+        if misses:
+            if self.workers > 1 and len(misses) >= self.min_parallel:
+                chunk = -(-len(misses) // self.workers)
+                chunks = [misses[i:i + chunk] for i in range(0, len(misses), chunk)]
+                scored = [r for part in self._pool_executor().map(_score_pairs_in_worker, chunks) for r in part]
+            else:
+                scored = _score_pairs(self.reward_fn, misses)
+            for pair, reward in zip(misses, scored):
+                rewards[pair] = reward
+                self.cache.put(pair, reward)
+            self.scored += len(misses)
+
+        self.score_seconds += time.perf_counter() - start
+        return [rewards[pair] for pair in pairs]
+
+    def stats(self) -> Dict[str, float]:
+        cache_stats = self.cache.stats()
+        return {
+            "hits": cache_stats["hits"],
+            "misses": cache_stats["misses"],
+            "hit_rate": cache_stats["hit_rate"],
+            "cached": cache_stats["size"],
+            "scored": self.scored,
+            "score_ms": self.score_seconds * 1000,
+        }
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+# SELECT * / SELECT COUNT(*) FROM ...: fingerprinted by the set of matched rowids
+ROWID_SELECT_RE = re.compile(r"^\s*select\s+(\*|count\s*\(\s*\*\s*\))\s+from\b", re.IGNORECASE)
+
+def result_fingerprint(pool: ConnectionPool, sql: str, timeout: Optional[float] = POOL_TIMEOUT) -> Tuple[int, str]:
+    """
+    (row count, hash) of the result of `sql`, independent of row order.
+
+    `SELECT * FROM ...` and `SELECT COUNT(*) FROM ...` run as `SELECT rowid FROM ...` (same rows,
+    one integer per row) and are hashed on the set of matched rowids, so two COUNT(*) queries only
+    agree when they count the same rows, not merely the same number of rows; the two forms hash
+    differently. Any other query (column lists, aggregates, ...) is hashed on its sorted result rows.
+
+    Raises:
+        QueryTimeout / sqlite3.Error: The query failed or ran past its budget.
+    """
+    match = ROWID_SELECT_RE.match(sql)
+    if match:
+        prefix = "rowid:" if match.group(1) == "*" else "count-rowid:"
+        try:
+            _, rows = pool.fetch_page(ROWID_SELECT_RE.sub("SELECT rowid FROM", sql, count=1), page_size=None, timeout=timeout)
+            ids = sorted(row[0] for row in rows)
+            return len(ids), prefix + hashlib.sha1(",".join(map(str, ids)).encode("utf-8")).hexdigest()
+        except QueryTimeout:
+            raise
+        except sqlite3.Error:
+            pass  # e.g. a join, where rowid is ambiguous: hash the rows instead
+    _, rows = pool.fetch_page(sql, page_size=None, timeout=timeout)
+    lines = sorted(repr(row) for row in rows)
+    return len(lines), "rows:" + hashlib.sha1("\n".join(lines).encode("utf-8")).hexdigest()
+
+def _db_signature(db_path: str) -> List[int]:
+    st = os.stat(db_path)
+    return [st.st_mtime_ns, st.st_size]
+
+class GoldFingerprintStore:
+    """
+    Result fingerprints of gold SQL, computed once per dataset and database and stored on disk.
+
+    Args:
+        db_path (str): SQLite database the queries run on.
+        store_path (str): JSON file of the store.
+        timeout (float, optional): Time budget per gold query while building.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, store_path: str = None, timeout: Optional[float] = None):
+        self.db_path = db_path
+        self.store_path = store_path
+        self.timeout = timeout
+        self.fingerprints: Dict[str, Optional[Tuple[int, str]]] = {}
+
+    @staticmethod
+    def key(sql: str) -> str:
+        return normalize_sql(sql)
+
+    @classmethod
+    def for_dataset(cls, dataset_path: str, db_path: str = DEFAULT_DB_PATH, store_path: str = None,
+                    rebuild: bool = False) -> "GoldFingerprintStore":
+        """
+        Store for the "SQL" field of a Text-to-SQL JSON split, read from `store_path` (default:
+        `<dataset>.fingerprints.json`) when it was built from the same dataset and database file.
+        """
+        store_path = store_path or os.path.splitext(dataset_path)[0] + ".fingerprints.json"
+        store = cls(db_path, store_path)
+        with open(dataset_path, "rb") as f:
+            dataset_hash = hashlib.sha1(f.read()).hexdigest()
+        meta = {"version": FINGERPRINT_VERSION, "dataset_sha1": dataset_hash, "db_signature": _db_signature(db_path)}
+
+        if not rebuild and os.path.exists(store_path):
+            with open(store_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            if all(saved.get(k) == v for k, v in meta.items()):
+                store.fingerprints = {k: tuple(v) if v else None for k, v in saved["fingerprints"].items()}
+                return store
+            print(f"[INFO] Gold fingerprints in {store_path} are stale, rebuilding")
+
+        with open(dataset_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+        start = time.perf_counter()
+        store.build(r["SQL"] for r in records)
+        failed = sum(fp is None for fp in store.fingerprints.values())
+        print(f"[INFO] {len(store.fingerprints)} gold fingerprints in {time.perf_counter() - start:.1f}s"
+              f"{f' ({failed} gold queries failed)' if failed else ''} -> {store_path}")
+        store.save(meta)
+        return store
+
+    def build(self, gold_sqls) -> None:
+        """Fingerprint every distinct gold query (None for one that fails)."""
+        pool = ConnectionPool(self.db_path, size=1, timeout=self.timeout, immutable=True)
+        try:
+            for sql in gold_sqls:
+                key = self.key(sql)
+                if key not in self.fingerprints:
+                    try:
+                        self.fingerprints[key] = result_fingerprint(pool, sql)
+                    except (QueryTimeout, sqlite3.Error):
+                        self.fingerprints[key] = None
+        finally:
+            pool.close()
+
+    def save(self, meta: dict) -> None:
+        tmp_path = f"{self.store_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({**meta, "fingerprints": self.fingerprints}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.store_path)
+
+    def get(self, sql: str, default=None):
+        return self.fingerprints.get(self.key(sql), default)
+
+class ExecutionReward:
+    """
+    reward_fn(pred, gold) comparing what the predicted and gold SQL return on the database.
+
+    Gold fingerprints come from a GoldFingerprintStore; a gold query missing from it (e.g. decoded
+    labels that differ from the dataset text) is run once and kept in memory. Each distinct
+    prediction runs once, on a pooled read-only connection with a `timeout` budget.
+
+    Args:
+        gold_store (GoldFingerprintStore): Precomputed gold fingerprints (its db_path is used).
+        fallback (callable, optional): String reward for predictions that run but return other rows.
+        fallback_weight (float): Scale of the fallback reward, so it stays below an execution match.
+        timeout (float): Seconds before a predicted query is interrupted.
+        cache_size (int): Memoized prediction fingerprints.
+
+    Note:
+        Picklable for RewardScorer(workers > 1): the pool and the prediction cache are rebuilt in
+        each worker process.
+    """
+
+    def __init__(self, gold_store: GoldFingerprintStore, fallback: Callable[[str, str], float] = reward_fn_v3,
+                 fallback_weight: float = 0.5, timeout: float = EXECUTION_TIMEOUT, cache_size: int = FINGERPRINT_CACHE_SIZE):
+        self.gold_store = gold_store
+        self.fallback = fallback
+        self.fallback_weight = fallback_weight
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self._init_runtime()
+
+    def _init_runtime(self) -> None:
+        self.pool = ConnectionPool(self.gold_store.db_path, size=1, timeout=self.timeout, immutable=True)
+        self.pred_cache = LRUCache(self.cache_size)
+        self.gold_misses = 0
+        self.executed = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ("pool", "pred_cache"):
+            state.pop(name)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_runtime()
+
+    def fingerprint(self, sql: str) -> Optional[Tuple[int, str]]:
+        """Memoized fingerprint of a query; None when it fails or times out."""
+        key = GoldFingerprintStore.key(sql)
+        fp = self.pred_cache.get(key, default=False)
+        if fp is False:
+            self.executed += 1
+            try:
+                fp = result_fingerprint(self.pool, sql)
+            except (QueryTimeout, sqlite3.Error):
+                fp = None
+            self.pred_cache.put(key, fp)
+        return fp
+
+    def __call__(self, pred_sql: str, gold_sql: str) -> float:
+        gold_fp = self.gold_store.get(gold_sql, default=False)
+        if gold_fp is False:
+            self.gold_misses += 1
+            gold_fp = self.fingerprint(gold_sql)
+        pred_fp = self.fingerprint(pred_sql)
+        if pred_fp is None:
+            return 0.0
+        if gold_fp is not None and pred_fp == gold_fp:
+            return 1.0
+        return self.fallback_weight * self.fallback(pred_sql, gold_sql) if self.fallback else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {"executed": self.executed, "gold_misses": self.gold_misses, **self.pred_cache.stats()}
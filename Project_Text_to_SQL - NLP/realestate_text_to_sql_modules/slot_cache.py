@@ -0,0 +1,164 @@
+"""
+Module: slot_cache.py
+
+Purpose:
+    Reuse generated SQL across questions that differ only in a price, an area, a count or a place
+    name. The question is masked into slots ("nha duoi <price> o quan <loc>"), the model's SQL for
+    the first question of that shape is stored as a skeleton with numbered value slots, and later
+    questions with the same masked text get their SQL by filling their own values back in,
+    without running the seq2seq decoder.
+
+Key Components:
+    - mask_question(question, location): masked text + the slot values found in it (left to right).
+      Location names come from the location matched by LocationMatcher;
+      numbers are typed by their unit: <price> (tỷ / triệu, converted to VND), <area> (m2),
+      <num> (anything else).
+    - extract_skeleton(sql, slots): replace each slot's SQL literal by a placeholder, or None when
+      that is ambiguous (a slot value missing from the SQL, or written more than once). Other
+      numbers (e.g. `LIMIT 1` for "cao nhất") stay constant.
+    - SlotTemplateCache: lookup() / learn() on top of an LRUCache keyed by the masked text.
+
+Note:
+    Skeletons are learned from the SQL after smart_fix_sql and before fix_location_in_sql, which
+    rebuilds the location conditions from each question's own matched location on a hit. A
+    skeleton is only stored after checking that filling it with the original question's values
+    gives back that SQL exactly, so a hit returns what the normal path would have returned for
+    the same model output.
+
+Usage:
+    from realestate_text_to_sql_modules.slot_cache import SlotTemplateCache
+
+    slots = SlotTemplateCache()
+    sql = slots.lookup(question, location)          # None on a miss
+    if sql is None:
+        fixed_sql = smart_fix_sql(generate(question), question)
+        slots.learn(question, location, fixed_sql)
+        sql = fix_location_in_sql(fixed_sql, location)
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from unidecode import unidecode
+
+from realestate_text_to_sql_modules.question_processing import fix_location_in_sql
+from realestate_text_to_sql_modules.result_cache import LRUCache
+
+SLOT_CACHE_SIZE = 10_000
+
+# Units as they look after unidecode(): tỷ -> ty, triệu -> trieu, mét vuông -> met vuong, m² -> m2
+PRICE_UNITS = {'ty': 1_000_000_000, 'trieu': 1_000_000}
+AREA_UNITS = {'m2', 'met vuong'}
+SLOT_PATTERN = re.compile(r"(?<![\w.,])(\d+(?:[.,]\d+)?)(?:\s*(ty|trieu|m2|met vuong)\b)?")
+SQL_NUMBER = re.compile(r"(?<![\w.])\d+(?:\.\d+)?(?![\w.])")
+SQL_STRING = re.compile(r"'(?:[^']|'')*'")
+PLACEHOLDER = "<S{}>"
+
+def slot_literal(kind: str, value: float) -> str:
+    """How a slot value is written in the SQL: prices as integer VND, other numbers without a trailing .0."""
+    if kind == 'price':
+        return str(int(round(value)))
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+def mask_question(question: str, location: dict) -> Tuple[str, List[Tuple[str, float]]]:
+    """
+    Mask the matched location names and the numbers of a normalized question.
+
+    Example:
+        "nhà dưới 2,5 tỷ ở gò vấp", {'district': 'Gò Vấp', ...}
+        -> ("nha duoi <price> o <loc>", [('price', 2500000000.0)])
+    """
+    text = unidecode(question.lower())
+    names = {unidecode(v.lower()) for v in location.values() if v}
+    for name in sorted(names, key=len, reverse=True):
+        text = re.sub(rf"\b{re.escape(name)}\b", "<loc>", text)
+
+    slots = []
+
+    def replace(m):
+        value = float(m.group(1).replace(',', '.'))
+        unit = m.group(2)
+        if unit in PRICE_UNITS:
+            slots.append(('price', value * PRICE_UNITS[unit]))
+            return "<price>"
+        if unit in AREA_UNITS:
+            slots.append(('area', value))
+            return "<area>"
+        slots.append(('num', value))
+        return "<num>"
+
+    text = SLOT_PATTERN.sub(replace, text)
+    return " ".join(text.split()), slots
+
+def extract_skeleton(sql: str, slots: List[Tuple[str, float]]) -> Optional[str]:
+    """
+    Turn `sql` into a skeleton with one placeholder per slot, or None if that is ambiguous.
+
+    Every slot's literal must appear exactly once among the numbers outside string constants;
+    the remaining numbers are kept as they are.
+    """
+    literals = [slot_literal(kind, value) for kind, value in slots]
+    if len(set(literals)) != len(literals):
+        return None
+    # Blank out string constants so numbers inside names ('Phường 5') are ignored
+    scan = SQL_STRING.sub(lambda m: " " * len(m.group()), sql)
+    position = {lit: i for i, lit in enumerate(literals)}
+    found = {}
+    for m in SQL_NUMBER.finditer(scan):
+        i = position.get(m.group())
+        if i is not None:
+            if i in found:
+                return None
+            found[i] = m
+    if len(found) != len(literals):
+        return None
+    skeleton = sql
+    for i, m in sorted(found.items(), key=lambda item: item[1].start(), reverse=True):
+        skeleton = skeleton[:m.start()] + PLACEHOLDER.format(i) + skeleton[m.end():]
+    return skeleton
+
+def fill_skeleton(skeleton: str, slots: List[Tuple[str, float]]) -> str:
+    for i, (kind, value) in enumerate(slots):
+        skeleton = skeleton.replace(PLACEHOLDER.format(i), slot_literal(kind, value))
+    return skeleton
+
+class SlotTemplateCache:
+    """
+    Masked question -> SQL skeleton, filled back in with each question's own values.
+
+    Args:
+        maxsize (int): Maximum number of skeletons kept (LRU).
+        ttl (float, optional): Seconds before a skeleton expires.
+    """
+
+    def __init__(self, maxsize: int = SLOT_CACHE_SIZE, ttl: Optional[float] = None):
+        self.cache = LRUCache(maxsize, ttl)
+        self.learned = 0
+        self.unsafe = 0
+
+    def lookup(self, question: str, location: dict) -> Optional[str]:
+        """Final SQL for a normalized question from a cached skeleton, or None on a miss."""
+        masked, slots = mask_question(question, location)
+        skeleton = self.cache.get(masked)
+        if skeleton is None:
+            return None
+        return fix_location_in_sql(fill_skeleton(skeleton, slots), location)
+
+    def learn(self, question: str, location: dict, fixed_sql: str) -> bool:
+        """
+        Store the skeleton of the SQL generated for this question (after smart_fix_sql, before
+        fix_location_in_sql). Returns False when it cannot be safely turned into a skeleton.
+        """
+        masked, slots = mask_question(question, location)
+        skeleton = extract_skeleton(fixed_sql, slots)
+        if skeleton is None or fill_skeleton(skeleton, slots) != fixed_sql:
+            self.unsafe += 1
+            return False
+        self.cache.put(masked, skeleton)
+        self.learned += 1
+        return True
+
+    def stats(self) -> Dict[str, float]:
+        stats = self.cache.stats()
+        stats.update({"learned": self.learned, "unsafe": self.unsafe})
+        return stats
@@ -1,20 +1,340 @@
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
-def is_valid_sql(query: str, db_path: str = "data/processing/SQLite_real_estate.db") -> bool:
+import pandas as pd
+
+DEFAULT_DB_PATH = "data/processing/SQLite_real_estate.db"
+
+def connect_readonly(db_path: str, immutable: bool = False, cached_statements: int = 128) -> sqlite3.Connection:
+    """
+    Open a read-only connection to the given SQLite database.
+
+    Args:
+        db_path (str): Path to the SQLite database.
+        immutable (bool): Also pass `immutable=1`, which skips file locking and change detection.
+            Only safe while nothing rewrites the database file.
+        cached_statements (int): Size of sqlite3's prepared-statement cache for this connection.
+
+    Returns:
+        sqlite3.Connection: Connection opened with `mode=ro`, so workers can share the file safely.
+    """
+    uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+    if immutable:
+        uri += "&immutable=1"
+    return sqlite3.connect(uri, uri=True, cached_statements=cached_statements, check_same_thread=False)
+
+class SQLValidator:
+    """
+    Check whether generated SQL queries return rows, reusing connections across calls.
+
+    Each thread gets one read-only, immutable connection with a prepared-statement cache.
+    Non-emptiness is answered by stepping the cursor once (`fetchone`), which stops SQLite
+    after the first row instead of materializing the whole result.
+
+    Usage:
+        validator = SQLValidator("data/processing/SQLite_real_estate.db")
+        validator.is_valid("SELECT * FROM price_house WHERE price < 3000000000")
+        validator.validate_many(queries)
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, cached_statements: int = 256):
+        self.db_path = db_path
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = connect_readonly(self.db_path, immutable=True, cached_statements=self.cached_statements)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def is_valid(self, query: str) -> bool:
+        """
+        Return True if the query executes successfully and returns at least one row.
+        """
+        try:
+            return self._connection().execute(query).fetchone() is not None
+        except Exception:
+            return False
+
+    def validate_many(self, queries: Iterable[str]) -> List[bool]:
+        """
+        Validate a batch of queries on this thread's connection.
+
+        Identical queries inside the batch are only executed once.
+
+        Returns:
+            List[bool]: One flag per input query, in the same order.
+        """
+        results: Dict[str, bool] = {}
+        flags = []
+        for query in queries:
+            if query not in results:
+                results[query] = self.is_valid(query)
+            flags.append(results[query])
+        return flags
+
+    def close(self) -> None:
+        """Close every connection opened by this validator."""
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+# One shared validator per database path, used by is_valid_sql(), with the file signature it was opened on
+_validators: Dict[str, Tuple[Tuple[int, int], SQLValidator]] = {}
+_validators_lock = threading.Lock()
+
+def _file_signature(db_path: str) -> Tuple[int, int]:
+    try:
+        st = os.stat(db_path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return 0, 0
+
+def get_validator(db_path: str = DEFAULT_DB_PATH) -> SQLValidator:
+    """
+    Return the process-wide SQLValidator for `db_path`, creating it on first use.
+
+    Its connections are `immutable=1`, so when the file's mtime / size change (e.g. export_sqlite
+    rebuilt the database in this process) they are closed and a new validator is opened.
+    """
+    key = str(Path(db_path).resolve())
+    signature = _file_signature(db_path)
+    with _validators_lock:
+        cached = _validators.get(key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+        validator = SQLValidator(db_path)
+        _validators[key] = (signature, validator)
+        return validator
+
+def is_valid_sql(query: str, db_path: str = DEFAULT_DB_PATH, conn: sqlite3.Connection = None) -> bool:
     """
     Check if a SQL query can be executed and returns non-empty results on the given database.
 
     Args:
         query (str): The SQL query to check.
         db_path (str): Path to the SQLite database.
+        conn (sqlite3.Connection, optional): Existing connection to reuse instead of the shared validator.
 
     Returns:
         bool: True if the query executes successfully and returns rows; False otherwise.
     """
+    if conn is None:
+        return get_validator(db_path).is_valid(query)
     try:
-        conn = sqlite3.connect(db_path)
-        rows = conn.execute(query).fetchall()
-        conn.close()
-        return len(rows) > 0
+        return conn.execute(query).fetchone() is not None
     except Exception:
         return False
+
+QUERY_TIMEOUT = 5.0
+PAGE_SIZE = 200
+# SQLite VM instructions between two time-budget checks
+PROGRESS_STEPS = 1000
+# Default `timeout` of ConnectionPool.fetch_page / iter_pages: use the pool's budget (None = no budget)
+POOL_TIMEOUT = object()
+# Quoted strings / identifiers (kept) or comments (dropped)
+SQL_COMMENT_RE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|--[^\n]*|/\*.*?(?:\*/|$)""", re.DOTALL)
+
+class QueryTimeout(Exception):
+    """Raised when a query runs past its time budget and is interrupted."""
+
+def strip_sql_comments(sql: str) -> str:
+    """Remove `-- ...` and `/* ... */` comments outside quoted strings / identifiers."""
+    return SQL_COMMENT_RE.sub(lambda m: m.group(1) or " ", sql)
+
+def paginate_sql(sql: str) -> str:
+    """
+    Wrap a SELECT so SQLite stops after one page: `SELECT * FROM (<sql>) LIMIT ? OFFSET ?`.
+
+    The inner query keeps its own ORDER BY / LIMIT; the outer LIMIT / OFFSET only cuts the page.
+    Comments and the trailing ";" are removed first (a trailing `--` comment would swallow the ")").
+    """
+    return f"SELECT * FROM ({strip_sql_comments(sql).strip().rstrip(';').strip()}) LIMIT ? OFFSET ?"
+
+class ConnectionPool:
+    """
+    Fixed-size pool of read-only SQLite connections with a per-query time budget.
+
+    Connections are opened on first use (up to `size`) and reused afterwards; a caller that finds
+    none free waits for one to be released. While a query runs, a progress handler checks every
+    `PROGRESS_STEPS` VM instructions whether its deadline has passed and interrupts it if so, so
+    a runaway query (e.g. an unfiltered cross join) cannot hold a connection forever.
+
+    Usage:
+        pool = ConnectionPool("data/processing/SQLite_real_estate.db", size=4)
+        columns, rows = pool.fetch_page("SELECT * FROM price_house", page=0, page_size=200)
+        for columns, rows in pool.iter_pages("SELECT * FROM price_house", page_size=500):
+            ...
+        pool.close()
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, size: int = 4, timeout: float = QUERY_TIMEOUT,
+                 immutable: bool = False, cached_statements: int = 128):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.immutable = immutable
+        self.cached_statements = cached_statements
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._opened = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _take(self) -> sqlite3.Connection:
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return connect_readonly(self.db_path, immutable=self.immutable,
+                                            cached_statements=self.cached_statements)
+                except Exception:
+                    self._opened -= 1
+                    raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """Borrow a connection for the duration of the `with` block."""
+        conn = self._take()
+        try:
+            yield conn
+        finally:
+            conn.set_progress_handler(None, 0)
+            if self._closed:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+    @staticmethod
+    def _set_budget(conn: sqlite3.Connection, timeout: Optional[float]) -> None:
+        """(Re)start the time budget of the statement running on `conn`."""
+        if timeout is None:
+            conn.set_progress_handler(None, 0)
+            return
+        deadline = time.monotonic() + timeout
+        conn.set_progress_handler(lambda: time.monotonic() > deadline, PROGRESS_STEPS)
+
+    def _timed(self, step, timeout: Optional[float]):
+        try:
+            return step()
+        except sqlite3.OperationalError as e:
+            if str(e) == "interrupted":
+                raise QueryTimeout(f"Query exceeded its {timeout:g}s time budget") from e
+            raise
+
+    def fetch_page(self, sql: str, page: int = 0, page_size: Optional[int] = PAGE_SIZE,
+                   timeout: Optional[float] = POOL_TIMEOUT) -> Tuple[List[str], List[tuple]]:
+        """
+        Execute one page of a query with LIMIT / OFFSET pushed into the SQL.
+
+        Args:
+            sql (str): SELECT statement.
+            page (int): Zero-based page number.
+            page_size (int, optional): Rows per page; None reads the whole result.
+            timeout (float, optional): Seconds before the query is interrupted; None: no budget.
+                Default: the pool's `timeout` (a pool created with `timeout=None` has no budget).
+
+        Returns:
+            (columns, rows) of the page.
+
+        Raises:
+            QueryTimeout: The query ran past its budget.
+            sqlite3.Error: Any other SQLite error.
+        """
+        timeout = self.timeout if timeout is POOL_TIMEOUT else timeout
+        with self.connection() as conn:
+            self._set_budget(conn, timeout)
+            if page_size is None:
+                cursor = self._timed(lambda: conn.execute(sql), timeout)
+            else:
+                cursor = self._timed(lambda: conn.execute(paginate_sql(sql), (page_size, page * page_size)), timeout)
+            rows = self._timed(cursor.fetchall, timeout)
+            return [desc[0] for desc in cursor.description], rows
+
+    def iter_pages(self, sql: str, page_size: int = PAGE_SIZE,
+                   timeout: Optional[float] = POOL_TIMEOUT) -> Iterator[Tuple[List[str], List[tuple]]]:
+        """
+        Yield (columns, rows) pages of at most `page_size` rows from a single execution.
+
+        The statement is stepped with fetchmany() as pages are consumed, so only the pages that are
+        read are computed. The connection stays borrowed until the iterator is exhausted or closed,
+        and the time budget restarts for each page.
+        """
+        timeout = self.timeout if timeout is POOL_TIMEOUT else timeout
+        with self.connection() as conn:
+            self._set_budget(conn, timeout)
+            cursor = self._timed(lambda: conn.execute(sql), timeout)
+            columns = [desc[0] for desc in cursor.description]
+            while True:
+                self._set_budget(conn, timeout)
+                rows = self._timed(lambda: cursor.fetchmany(page_size), timeout)
+                if not rows:
+                    break
+                yield columns, rows
+                if len(rows) < page_size:
+                    break
+            cursor.close()
+
+    def close(self) -> None:
+        """Close the idle connections; borrowed ones are closed as they come back."""
+        with self._lock:
+            self._closed = True
+            while True:
+                try:
+                    self._idle.get_nowait().close()
+                except queue.Empty:
+                    break
+                self._opened -= 1
+
+# One shared pool per database path, used by run_query()
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def get_pool(db_path: str = DEFAULT_DB_PATH) -> ConnectionPool:
+    """Return the process-wide ConnectionPool for `db_path`, creating it on first use."""
+    key = str(Path(db_path).resolve())
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(db_path)
+        return _pools[key]
+
+def run_query(sql: str, db_path: str = DEFAULT_DB_PATH, max_rows: Optional[int] = 200, page: int = 0,
+              timeout: Optional[float] = QUERY_TIMEOUT, pool: ConnectionPool = None) -> pd.DataFrame:
+    """
+    Execute a query on a pooled read-only connection and return one page of rows as a DataFrame.
+
+    LIMIT `max_rows` OFFSET `page * max_rows` is pushed into the SQL, so SQLite stops after the page
+    instead of producing the whole result; the query is interrupted after `timeout` seconds
+    (None: no budget).
+
+    On error (including a timeout), returns a one-cell frame with the message (column "Lỗi"),
+    as the Gradio demo displays it.
+    """
+    pool = pool if pool is not None else get_pool(db_path)
+    try:
+        cols, rows = pool.fetch_page(sql, page=page, page_size=max_rows, timeout=timeout)
+        return pd.DataFrame(rows, columns=cols)
+    except Exception as e:
+        print(f"Error running SQL query: {e}")
+        return pd.DataFrame(columns=["Lỗi"], data=[[str(e)]])
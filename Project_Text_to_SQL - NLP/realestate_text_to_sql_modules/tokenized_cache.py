@@ -0,0 +1,153 @@
+"""
+Module: tokenized_cache.py
+
+Purpose:
+    Persistent tokenization stage for training and evaluation. The phase notebooks run
+    `train_dataset.map(tokenize_fn, batched=True, load_from_cache_file=False)`, so every run
+    re-tokenizes the whole train / val JSON with the slow T5Tokenizer. Here a split is tokenized
+    once into Arrow shards (datasets' save_to_disk) under a directory named by a hash of everything
+    that determines the token ids; later runs memory-map those shards (load_from_disk, no copy
+    into RAM) and only re-tokenize when one of the inputs changes.
+
+Key Components:
+    - tokenizer_fingerprint(tokenizer): hash of the tokenizer's vocab / normalization pipeline and
+      special tokens.
+    - tokenization_key(dataset_path, tokenizer, ...): hash of (dataset file content, tokenizer
+      fingerprint, INPUT_TEMPLATE, max input / target length, padded, TOKENIZED_CACHE_VERSION).
+    - load_tokenized(dataset_path, tokenizer, ...): the memory-mapped tokenized split from
+      `<cache_dir>/<split>-<key>/`, built and renamed into place atomically when missing.
+
+Note:
+    Bump TOKENIZED_CACHE_VERSION whenever training_data.make_tokenize_fn changes the columns or
+    ids it produces, so old shards are not reused. Stale entries are never read (their key no
+    longer matches) but stay on disk until removed.
+
+Usage:
+    from realestate_text_to_sql_modules.tokenized_cache import load_tokenized
+
+    tokenized_train, from_cache = load_tokenized("data/processing/phase2/train_text2sql.json", tokenizer)
+    tokenized_val, _ = load_tokenized("data/processing/phase2/val_text2sql.json", tokenizer)
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from typing import Tuple
+
+from realestate_text_to_sql_modules.training_data import (
+    INPUT_TEMPLATE,
+    MAX_INPUT_LENGTH,
+    MAX_TARGET_LENGTH,
+    to_seq2seq_examples,
+    tokenize_dataset,
+)
+
+TOKENIZED_CACHE_VERSION = 1
+TOKENIZED_CACHE_DIR = "data/tokenized"
+MANIFEST_FILE = "tokenization.json"
+MAX_SHARD_SIZE = "200MB"
+
+def _file_sha1(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """
+    Hash of what decides the token ids: the serialized tokenizers pipeline (normalizer,
+    pre-tokenizer, vocab) when there is one, else the vocab files (spiece.model), else the vocab.
+    """
+    h = hashlib.sha1(type(tokenizer).__name__.encode("utf-8"))
+    backend = getattr(tokenizer, "backend_tokenizer", None)
+    if backend is not None:
+        pipeline = json.loads(backend.to_str())
+        # truncation / padding are set on the backend by the last tokenizer() call, not part of the vocab
+        pipeline.pop("truncation", None)
+        pipeline.pop("padding", None)
+        h.update(json.dumps(pipeline, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    else:
+        vocab_files = [getattr(tokenizer, "vocab_file", None)]
+        vocab_files += [os.path.join(tokenizer.name_or_path, name) for name in tokenizer.vocab_files_names.values()]
+        vocab_files = sorted({p for p in vocab_files if p and os.path.isfile(p)})
+        if vocab_files:
+            for path in vocab_files:
+                h.update(_file_sha1(path).encode("utf-8"))
+        else:
+            h.update(json.dumps(sorted(tokenizer.get_vocab().items()), ensure_ascii=False).encode("utf-8"))
+    h.update(json.dumps(tokenizer.all_special_tokens, ensure_ascii=False).encode("utf-8"))
+    return h.hexdigest()
+
+def tokenization_key(dataset_path: str, tokenizer, max_input_length: int = MAX_INPUT_LENGTH,
+                     max_target_length: int = MAX_TARGET_LENGTH, padded: bool = False) -> Tuple[str, dict]:
+    """
+    Cache key of a tokenized split.
+
+    Returns:
+        (key, manifest): the hex key and the inputs it was computed from (written next to the shards).
+    """
+    manifest = {
+        "version": TOKENIZED_CACHE_VERSION,
+        "dataset": os.path.abspath(dataset_path),
+        "dataset_sha1": _file_sha1(dataset_path),
+        "tokenizer": tokenizer.name_or_path,
+        "tokenizer_sha1": tokenizer_fingerprint(tokenizer),
+        "input_template": INPUT_TEMPLATE,
+        "max_input_length": max_input_length,
+        "max_target_length": max_target_length,
+        "padded": padded,
+    }
+    # Đường dẫn không thuộc khóa: cùng nội dung ở chỗ khác vẫn dùng lại được
+    hashed = {k: v for k, v in manifest.items() if k not in ("dataset", "tokenizer")}
+    key = hashlib.sha1(json.dumps(hashed, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+    return key, manifest
+
+def load_tokenized(dataset_path: str, tokenizer, cache_dir: str = TOKENIZED_CACHE_DIR,
+                   max_input_length: int = MAX_INPUT_LENGTH, max_target_length: int = MAX_TARGET_LENGTH,
+                   padded: bool = False, rebuild: bool = False):
+    """
+    Tokenized Text-to-SQL split (Question / Schema / SQL JSON), memory-mapped from the cache.
+
+    Args:
+        dataset_path (str): Text-to-SQL JSON split.
+        tokenizer (PreTrainedTokenizer): Tokenizer of the model to train / evaluate.
+        cache_dir (str): Root directory of the tokenized shards.
+        padded (bool): Notebook-style max_length padding instead of unpadded ids + "length"
+            (see training_data.make_tokenize_fn).
+        rebuild (bool): Re-tokenize even when a matching cache exists.
+
+    Returns:
+        (Dataset, from_cache): columns input_ids / attention_mask / labels / length.
+    """
+    from datasets import Dataset as HFDataset
+    from datasets import load_from_disk
+
+    key, manifest = tokenization_key(dataset_path, tokenizer, max_input_length, max_target_length, padded)
+    split = os.path.splitext(os.path.basename(dataset_path))[0]
+    parent = os.path.basename(os.path.dirname(os.path.abspath(dataset_path)))
+    path = os.path.join(cache_dir, f"{parent}_{split}-{key[:16]}")
+
+    if not rebuild and os.path.exists(os.path.join(path, MANIFEST_FILE)):
+        try:
+            return load_from_disk(path), True
+        except Exception as e:
+            print(f"[WARN] Could not read tokenized cache {path}: {e}")
+
+    with open(dataset_path, "r", encoding="utf-8") as f:
+        records = json.load(f)
+    dataset = HFDataset.from_list(to_seq2seq_examples(records))
+    tokenized = tokenize_dataset(dataset, tokenizer, padded=padded,
+                                 max_input_length=max_input_length, max_target_length=max_target_length)
+
+    # Ghi vào thư mục tạm rồi đổi tên: một lần chạy bị ngắt không để lại cache dở dang
+    tmp_path = f"{path}.tmp{os.getpid()}"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tokenized.save_to_disk(tmp_path, max_shard_size=MAX_SHARD_SIZE)
+    with open(os.path.join(tmp_path, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({**manifest, "key": key, "rows": len(tokenized)}, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    # Đọc lại từ đĩa để trả về bản memory-mapped giống như khi dùng cache
+    return load_from_disk(path), False
@@ -0,0 +1,175 @@
+"""
+Module: training_data.py
+
+Purpose:
+    Training data path for the ViT5 notebooks without fixed-length padding. The notebooks'
+    `tokenize_fn` pads every input to 512 tokens and every SQL target to 128, while inputs
+    (question + schema) are mostly under 100 tokens and targets under 64, so most encoder /
+    decoder work is spent on padding. Here token ids are stored unpadded with their length, batches
+    are drawn from a length-grouped sampler, and each batch is padded only to its own longest
+    example.
+
+Key Components:
+    - to_seq2seq_examples(records): {"input": "Câu hỏi: ... | Schema: ...", "output": SQL} as built in
+      the notebooks.
+    - make_tokenize_fn(tokenizer, padded=False): batched tokenize_fn for Dataset.map(); unpadded by
+      default, with a "length" column (input tokens) for the length-grouped sampler. `padded=True`
+      reproduces the notebooks' max_length padding (pad labels -> -100).
+    - tokenize_dataset(dataset, tokenizer, padded=False): Dataset.map() with the above.
+    - make_collator(tokenizer, model): DataCollatorForSeq2Seq padding inputs / labels (-100) to the
+      longest example of the batch.
+    - length_grouping_args(): TrainingArguments keywords selecting the length-grouped sampler on
+      the installed transformers version.
+    - length_grouped_batches(lengths, batch_size, seed): batches of indices in the order
+      transformers' LengthGroupedSampler (Trainer with length_grouping_args()) yields them.
+    - padding_waste(input_lengths, target_lengths, batches, ...): share of padded positions in the
+      encoder / decoder, for fixed-length or per-batch padding.
+
+Note:
+    With Trainer, pass the unpadded dataset, `make_collator(tokenizer, model)` and
+    `TrainingArguments(..., **length_grouping_args())` (`group_by_length` was replaced by
+    `train_sampling_strategy="group_by_length"` in transformers 5).
+
+Usage:
+    from realestate_text_to_sql_modules.training_data import (
+        length_grouping_args, make_collator, to_seq2seq_examples, tokenize_dataset,
+    )
+    from datasets import Dataset as HFDataset
+
+    train_dataset = HFDataset.from_list(to_seq2seq_examples(train_data))
+    tokenized_train = tokenize_dataset(train_dataset, tokenizer)
+    data_collator = make_collator(tokenizer, model)
+    training_args = Seq2SeqTrainingArguments(..., **length_grouping_args())
+"""
+
+from typing import Dict, List, Optional, Sequence
+
+MAX_INPUT_LENGTH = 512
+MAX_TARGET_LENGTH = 128
+LENGTH_COLUMN = "length"
+# Model input as built in the notebooks
+INPUT_TEMPLATE = "Câu hỏi: {question} | Schema: {schema}"
+# Pad batch tensors to a multiple of 8 (tensor-core friendly under fp16, harmless on CPU)
+PAD_TO_MULTIPLE_OF = 8
+
+def to_seq2seq_examples(records: List[dict]) -> List[Dict[str, str]]:
+    """Text-to-SQL records (Question / Schema / SQL) -> notebook-style input / output pairs."""
+    return [
+        {"input": INPUT_TEMPLATE.format(question=item['Question'], schema=item['Schema']), "output": item['SQL']}
+        for item in records
+    ]
+
+def make_tokenize_fn(tokenizer, max_input_length: int = MAX_INPUT_LENGTH, max_target_length: int = MAX_TARGET_LENGTH,
+                     padded: bool = False):
+    """
+    Batched tokenize function for Dataset.map(batched=True).
+
+    Args:
+        padded (bool): Pad to max_input_length / max_target_length as the notebooks do (padding
+            positions of the labels become -100). Default: no padding, truncation only.
+    """
+    padding = "max_length" if padded else False
+
+    def tokenize_fn(batch):
+        model_inputs = tokenizer(batch["input"], max_length=max_input_length, truncation=True, padding=padding)
+        targets = tokenizer(batch["output"], max_length=max_target_length, truncation=True, padding=padding)
+        if padded:
+            model_inputs["labels"] = [
+                [l if l != tokenizer.pad_token_id else -100 for l in ids] for ids in targets["input_ids"]
+            ]
+        else:
+            model_inputs["labels"] = targets["input_ids"]
+        model_inputs[LENGTH_COLUMN] = [sum(mask) for mask in model_inputs["attention_mask"]]
+        return model_inputs
+
+    return tokenize_fn
+
+def tokenize_dataset(dataset, tokenizer, padded: bool = False, **kwargs):
+    """Tokenized copy of an {"input", "output"} Dataset (the text columns are dropped)."""
+    return dataset.map(
+        make_tokenize_fn(tokenizer, padded=padded, **kwargs),
+        batched=True,
+        remove_columns=["input", "output"],
+        load_from_cache_file=False,
+    )
+
+def make_collator(tokenizer, model=None, pad_to_multiple_of: Optional[int] = PAD_TO_MULTIPLE_OF):
+    """
+    DataCollatorForSeq2Seq padding each batch to its longest example (labels with -100); with
+    `model`, decoder_input_ids are built from the labels as during training.
+    """
+    from transformers import DataCollatorForSeq2Seq
+
+    return DataCollatorForSeq2Seq(tokenizer, model=model, label_pad_token_id=-100, pad_to_multiple_of=pad_to_multiple_of)
+
+def length_grouping_args() -> Dict[str, object]:
+    """
+    TrainingArguments keywords that make Trainer draw batches with LengthGroupedSampler over the
+    "length" column: `train_sampling_strategy="group_by_length"` on transformers 5.x,
+    `group_by_length=True` on the 4.x releases that still have it.
+    """
+    import dataclasses
+    from transformers import TrainingArguments
+
+    fields = {f.name for f in dataclasses.fields(TrainingArguments)}
+    if "train_sampling_strategy" in fields:
+        return {"train_sampling_strategy": "group_by_length", "length_column_name": LENGTH_COLUMN}
+    return {"group_by_length": True, "length_column_name": LENGTH_COLUMN}
+
+def length_grouped_batches(lengths: Sequence[int], batch_size: int, seed: int = 42) -> List[List[int]]:
+    """
+    Batches of dataset indices as drawn by transformers' LengthGroupedSampler: random mega-batches
+    of 50 * batch_size, each sorted by length, cut into batches (longest batch first).
+    """
+    import torch
+    from transformers.trainer_pt_utils import LengthGroupedSampler
+
+    generator = torch.Generator()
+    generator.manual_seed(seed)
+    order = list(LengthGroupedSampler(batch_size, lengths=list(lengths), generator=generator))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+def random_batches(n: int, batch_size: int, seed: int = 42) -> List[List[int]]:
+    """Shuffled batches of indices (the default RandomSampler order)."""
+    import numpy as np
+
+    order = np.random.default_rng(seed).permutation(n).tolist()
+    return [order[i:i + batch_size] for i in range(0, n, batch_size)]
+
+def _padded_size(longest: int, multiple: Optional[int]) -> int:
+    if multiple:
+        return -(-longest // multiple) * multiple
+    return longest
+
+def padding_waste(input_lengths: Sequence[int], target_lengths: Sequence[int], batches: List[List[int]],
+                  pad_input_to: Optional[int] = None, pad_target_to: Optional[int] = None,
+                  pad_to_multiple_of: Optional[int] = None) -> Dict[str, float]:
+    """
+    Padding overhead of a batching scheme.
+
+    Args:
+        input_lengths, target_lengths: Unpadded token counts per example.
+        batches: Index batches (e.g. from length_grouped_batches / random_batches).
+        pad_input_to, pad_target_to: Fixed padded lengths (notebook: 512 / 128); None pads each batch
+            to its longest example (rounded up to `pad_to_multiple_of`).
+
+    Returns:
+        dict: real / padded token counts and waste ratio (padded positions / all positions) for
+            the encoder, the decoder and both.
+    """
+    real = {"encoder": 0, "decoder": 0}
+    total = {"encoder": 0, "decoder": 0}
+    for batch in batches:
+        for side, lengths, fixed in (("encoder", input_lengths, pad_input_to), ("decoder", target_lengths, pad_target_to)):
+            batch_lengths = [lengths[i] for i in batch]
+            width = fixed or _padded_size(max(batch_lengths), pad_to_multiple_of)
+            real[side] += sum(batch_lengths)
+            total[side] += width * len(batch)
+    report = {}
+    for side in ("encoder", "decoder"):
+        report[f"{side}_tokens"] = real[side]
+        report[f"{side}_positions"] = total[side]
+        report[f"{side}_waste"] = 1 - real[side] / total[side] if total[side] else 0.0
+    all_positions = total["encoder"] + total["decoder"]
+    report["waste"] = 1 - (real["encoder"] + real["decoder"]) / all_positions if all_positions else 0.0
+    return report
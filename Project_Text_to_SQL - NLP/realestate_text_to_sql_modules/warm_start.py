@@ -0,0 +1,185 @@
+"""
+Module: warm_start.py
+
+Purpose:
+    Fast, measured startup for the demo / HTTP service. On every launch the Gradio notebook
+    flattens `locations.json` and rewrites `locations_flat.json` / `locations_flat.csv`, re-parses
+    the schema string and loads the model weights; the first request then pays for lazy
+    initialization inside generate(). Here the derived artifacts are built once into a versioned
+    pickle, the weights are memory-mapped from safetensors, and one warm-up query runs before the
+    service reports itself ready.
+
+Key Components:
+    - build_artifacts(locations_path, schema): flattened locations (same rows and order as
+      load_locations on the flattened file), the prebuilt LocationMatcher and the parsed schema.
+    - load_artifacts(locations_path, schema, cache_path): the artifacts from `cache_path` when its
+      version and key (content hash of the locations file + the schema string) match, otherwise
+      built and written atomically.
+    - ensure_safetensors(model_dir): one-off conversion of a `pytorch_model.bin` checkpoint to
+      `model.safetensors`, which from_pretrained maps instead of unpickling.
+    - warm_start_engine(...): artifacts -> model -> InferenceEngine -> warm-up query, with the time
+      of each step and the time to first query (process start until the warm-up answer).
+
+Note:
+    Bump CACHE_VERSION whenever flatten_locations / load_locations / LocationMatcher / parse_schema
+    change what they produce, so stale caches are rebuilt instead of unpickled.
+
+Usage:
+    from realestate_text_to_sql_modules.warm_start import warm_start_engine
+
+    engine, timings = warm_start_engine(model_dir="model/Final_model", locations_path="data/processing/locations.json")
+    print(timings)      # {'artifacts_s', 'artifacts_cached', 'model_s', 'warmup_s', 'time_to_first_query_s'}
+"""
+
+import hashlib
+import json
+import os
+import pickle
+import time
+from typing import Dict, Tuple
+
+import pandas as pd
+
+from realestate_text_to_sql_modules.inference_engine import MAX_LENGTH, MODEL_DIR, InferenceEngine, load_model
+from realestate_text_to_sql_modules.question_processing import (
+    SCHEMA,
+    LocationMatcher,
+    flatten_locations,
+    load_locations,
+    parse_schema,
+)
+
+CACHE_VERSION = 1
+WARM_CACHE_PATH = "model/warm_start.pkl"
+NESTED_LOCATIONS_PATH = "data/processing/locations.json"
+WARMUP_QUESTION = "Nhà dưới 3 tỷ ở Gò Vấp, TP HCM"
+
+def _process_start_time() -> float:
+    """Wall-clock time the current process started (Linux /proc; falls back to now elsewhere)."""
+    try:
+        with open("/proc/self/stat", "r") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.time()
+
+def artifact_key(locations_path: str, schema: str = SCHEMA) -> str:
+    """Content hash of the locations file and the schema string."""
+    h = hashlib.sha1()
+    with open(locations_path, "rb") as f:
+        h.update(f.read())
+    h.update(schema.encode("utf-8"))
+    return h.hexdigest()
+
+def build_artifacts(locations_path: str = NESTED_LOCATIONS_PATH, schema: str = SCHEMA) -> Dict:
+    """
+    Derived inference artifacts from the raw sources.
+
+    Args:
+        locations_path (str): Nested {city: {district: [ward]}} JSON (as in the notebook), or an
+            already flattened JSON / CSV accepted by load_locations().
+        schema (str): Schema string in the "col[dtype], ..." form.
+
+    Returns:
+        dict: {"locations", "matcher", "schema"}.
+    """
+    nested = None
+    if locations_path.endswith(".json"):
+        with open(locations_path, "r", encoding="utf-8") as f:
+            nested = json.load(f)
+    if isinstance(nested, dict):
+        # Cùng các dòng / thứ tự như load_locations() trên file locations_flat.json mà notebook ghi ra
+        df = pd.DataFrame(flatten_locations(nested), columns=['city', 'district', 'ward'])
+        locations = df.dropna().drop_duplicates().to_dict(orient="records")
+    else:
+        locations = load_locations(locations_path)
+    return {
+        "locations": locations,
+        "matcher": LocationMatcher(locations),
+        "schema": parse_schema(schema),
+    }
+
+def load_artifacts(locations_path: str = NESTED_LOCATIONS_PATH, schema: str = SCHEMA,
+                   cache_path: str = WARM_CACHE_PATH, rebuild: bool = False) -> Tuple[Dict, bool]:
+    """
+    Artifacts from the versioned cache, rebuilding it when missing or stale.
+
+    Returns:
+        (artifacts, from_cache)
+    """
+    key = artifact_key(locations_path, schema)
+    if not rebuild and os.path.exists(cache_path):
+        try:
+            with open(cache_path, "rb") as f:
+                cached = pickle.load(f)
+            if cached.get("version") == CACHE_VERSION and cached.get("key") == key:
+                return cached["artifacts"], True
+            print(f"[INFO] Warm-start cache {cache_path} is stale, rebuilding")
+        except Exception as e:
+            print(f"[WARN] Could not read warm-start cache {cache_path}: {e}")
+
+    artifacts = build_artifacts(locations_path, schema)
+    os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+    tmp_path = f"{cache_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"version": CACHE_VERSION, "key": key, "artifacts": artifacts}, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return artifacts, False
+
+def ensure_safetensors(model_dir: str = MODEL_DIR) -> bool:
+    """
+    Re-save a `pytorch_model.bin` checkpoint as `model.safetensors` (once), so later loads map the
+    weights from disk instead of unpickling them.
+
+    Returns:
+        bool: True if the directory has safetensors weights afterwards.
+    """
+    if os.path.exists(os.path.join(model_dir, "model.safetensors")):
+        return True
+    if not os.path.exists(os.path.join(model_dir, "pytorch_model.bin")):
+        return False
+    from transformers import T5ForConditionalGeneration
+
+    T5ForConditionalGeneration.from_pretrained(model_dir).save_pretrained(model_dir, safe_serialization=True)
+    print(f"[INFO] Wrote {model_dir}/model.safetensors")
+    return True
+
+def warm_start_engine(model=None, model_dir: str = MODEL_DIR, backend: str = "torch", constrained: bool = False,
+                      locations_path: str = NESTED_LOCATIONS_PATH, schema: str = SCHEMA,
+                      cache_path: str = WARM_CACHE_PATH, warmup_question: str = WARMUP_QUESTION,
+                      device: str = None, max_length: int = MAX_LENGTH, **engine_kwargs) -> Tuple[InferenceEngine, Dict]:
+    """
+    Build a ready InferenceEngine: cached artifacts, model, one warm-up query.
+
+    Args:
+        model: Preloaded model with generate_batch(); loaded with load_model(backend) when omitted.
+        engine_kwargs: Passed to InferenceEngine (max_batch_size, max_wait_ms, ...).
+
+    Returns:
+        (engine, timings) with artifacts_s, artifacts_cached, model_s, warmup_s and
+        time_to_first_query_s (from process start until the warm-up query is answered).
+    """
+    timings = {}
+    start = time.perf_counter()
+    artifacts, timings["artifacts_cached"] = load_artifacts(locations_path, schema, cache_path)
+    timings["artifacts_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if model is None:
+        model = load_model(backend, model_dir, device=device, max_length=max_length, constrained=constrained)
+    timings["model_s"] = time.perf_counter() - start
+
+    engine = InferenceEngine(model=model, locations=artifacts["locations"], location_matcher=artifacts["matcher"],
+                             schema=artifacts["schema"], **engine_kwargs)
+    start = time.perf_counter()
+    sql = engine.infer(warmup_question)
+    timings["warmup_s"] = time.perf_counter() - start
+    timings["time_to_first_query_s"] = time.time() - _process_start_time()
+
+    print(f"[INFO] Ready: time to first query {timings['time_to_first_query_s']:.2f}s "
+          f"(artifacts {timings['artifacts_s'] * 1000:.1f} ms{' from cache' if timings['artifacts_cached'] else ', rebuilt'}, "
+          f"model {timings['model_s']:.2f}s, warm-up {timings['warmup_s'] * 1000:.0f} ms)")
+    print(f"       warm-up: {warmup_question!r} -> {sql}")
+    return engine, timings
@@ -8,80 +8,284 @@ Purpose:
 Steps:
     1. Clean the raw housing dataset and export:
         - Cleaned CSV file
-        - SQLite database file
+        - SQLite database file (typed, indexed)
+        - Parquet artifact
+       The step is keyed on a hash of the raw file and the cleaning rules (see
+       data_preprocessing.load_or_clean); when nothing changed, the existing artifacts are
+       reused and both cleaning and the database rebuild are skipped.
 
     2. Randomly sample rows from the cleaned data, and iteratively generate N valid question-SQL pairs.
+       The target is split into fixed-size shards, each with its own deterministic seed and
+       read-only SQLite handle. Shards can run on several processes (`--workers N`); results are
+       merged in shard order and de-duplicated, so the same seed gives the same dataset for any
+       number of workers.
+       Candidates are de-duplicated while merging: exact hash of the normalized SQL + question,
+       MinHash/LSH near-duplicate questions for the same SQL, and an optional cap on paraphrases per SQL.
+       With `--constrained`, thresholds are picked from the listings that match each query's
+       location/filter, so every query is non-empty by construction; the SQLite check then only
+       runs as an assertion when `--verify` is also given.
 
     3. Split the validated samples into train / validation / test sets.
        Save them as JSON files for training downstream models.
+       With `--stream`, samples are instead appended to `{train,val,test}_text2sql.jsonl` as soon as
+       they are accepted (split by a hash of the question, 85/10/5), fsynced periodically and
+       checkpointed after every shard; `--resume` continues an interrupted run from the checkpoint.
+
+Usage:
+    python run_pipeline.py --workers 4 --seed 42
+    python run_pipeline.py --constrained --verify
+    python run_pipeline.py --num-samples 100000 --workers 4 --stream --resume
 """
 
-import pandas as pd
+import argparse
 import json
 import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
 from sklearn.model_selection import train_test_split
-from realestate_text_to_sql_modules.data_preprocessing import clean_dataframe
+from realestate_text_to_sql_modules.data_preprocessing import load_or_clean
+from realestate_text_to_sql_modules.dataset_writer import StreamingDatasetWriter
+from realestate_text_to_sql_modules.dedup import Deduplicator
 from realestate_text_to_sql_modules.realestate_text_to_sql import RealEstateTextToSQL
-from realestate_text_to_sql_modules.sql_utils import is_valid_sql
+from realestate_text_to_sql_modules.sql_utils import SQLValidator
 
 # Configuration
 NUM_SAMPLES = 15
 RAW_PATH = "data/raw/vietnam_housing_dataset_cleaned.csv"
 DB_PATH = "data/processing/SQLite_real_estate.db"
+OUTPUT_DIR = "data/processing"
+CLEANED_CSV_PATH = "data/processing/df_cleaned.csv"
+CLEANED_PARQUET_PATH = "data/processing/df_cleaned.parquet"
+SEED = 42
+SHARD_SIZE = 500  # Fixed so that the shard layout never depends on --workers
+MAX_IDLE_ROUNDS = 10
+NEAR_DUP_THRESHOLD = 0.8  # Jaccard of question word bigrams, per SQL; 1.0 keeps only exact de-duplication
+MAX_PARAPHRASES = None    # Max questions per distinct SQL; None for no cap
+
+# Per-process state, filled by init_worker()
+_worker_pipeline = None
+_worker_validator = None
+
+def init_worker(df_cleaned: pd.DataFrame, db_path: str) -> None:
+    """Load the generator and a read-only SQL validator once per worker process."""
+    global _worker_pipeline, _worker_validator
+    _worker_pipeline = RealEstateTextToSQL(df_cleaned)
+    _worker_validator = SQLValidator(db_path)
+
+def shard_seed(seed: int, shard_id: int) -> int:
+    """Derive an independent, reproducible seed for one shard."""
+    return int(np.random.SeedSequence([seed, shard_id]).generate_state(1)[0])
+
+def generate_shard(shard_id: int, target: int, seed: int, constrained: bool = False, verify: bool = True):
+    """
+    Generate up to `target` valid samples for one shard.
+
+    In constrained mode the generator guarantees non-empty results, so SQLite is only queried
+    when `verify` is set, and an empty result is reported as a failed assertion.
+
+    Both `random` and NumPy's global RNG (used by pandas `.sample`) are re-seeded from
+    (seed, shard_id), so a shard always yields the same samples whichever process runs it.
+
+    Returns:
+        tuple: (shard_id, samples, attempts)
+    """
+    s = shard_seed(seed, shard_id)
+    random.seed(s)
+    np.random.seed(s)
+
+    df = _worker_pipeline.df
+    samples = []
+    attempt = 0
+    max_attempts = target * 10
+
+    while len(samples) < target and attempt < max_attempts:
+        attempt += 1
+        try:
+            question, query, extras = _worker_pipeline.generator.generate_query(df, index=_worker_pipeline.index, constrained=constrained)
+            print(f"[SHARD {shard_id}][TRY {attempt}] Question: {question}")
+            print(f"[SHARD {shard_id}][TRY {attempt}] SQL: {query}")
+            if not verify:
+                valid = True
+            else:
+                valid = _worker_validator.is_valid(query)
+                if constrained and not valid:
+                    print(f"[ASSERT] Constrained query returned no rows: {query}")
+            if valid:
+                samples.append({
+                    "Question": question,
+                    "SQL": query,
+                    **extras
+                })
+        except Exception as e:
+            print(f"[SKIP] Error at shard {shard_id}, attempt {attempt}: {e}")
+            continue
+
+    return shard_id, samples, attempt
+
+def generate_samples(df_cleaned: pd.DataFrame, num_samples: int, workers: int = 1, seed: int = SEED, db_path: str = DB_PATH,
+                     constrained: bool = False, verify: bool = True, writer: StreamingDatasetWriter = None,
+                     dedup: Deduplicator = None):
+    """
+    Generate `num_samples` unique validated samples using fixed-size, seeded shards.
+
+    Shards are scheduled in rounds; each round asks for just enough shards to cover the
+    remaining target, so the shard ids (and therefore the output) depend only on `seed`.
+    Every candidate goes through `dedup` (exact / near-duplicate / paraphrase cap) in shard order.
+
+    With a `writer`, samples are streamed to disk instead of being kept in memory and the
+    scheduling state is checkpointed after every merged shard. A writer opened with
+    `resume=True` continues from its checkpoint and produces the same files as an
+    uninterrupted run.
+
+    Returns:
+        tuple: (samples, total_attempts); samples is empty when streaming.
+    """
+    validated_samples = []
+    if dedup is None:
+        dedup = Deduplicator(threshold=NEAR_DUP_THRESHOLD, max_paraphrases=MAX_PARAPHRASES)
+    state = {
+        "seed": seed, "num_samples": num_samples, "constrained": constrained,
+        "accepted": 0, "attempts": 0, "next_shard": 0,
+        "pending": [], "target": 0, "round_added": 0, "idle_rounds": 0, "rejected": {},
+    }
+
+    if writer is not None and writer.state is not None:
+        saved = writer.state
+        for key in ("seed", "num_samples", "constrained"):
+            if saved[key] != state[key]:
+                raise ValueError(f"Checkpoint was written with {key}={saved[key]!r}, got {state[key]!r}")
+        state = dict(saved)
+        for _, sample in writer.records():
+            dedup.register(sample["Question"], sample["SQL"])
+        dedup.rejected.update(state["rejected"])
 
-# Step 1: Clean the raw CSV
-df_raw = pd.read_csv(RAW_PATH)
-df_cleaned = clean_dataframe(
-    df_raw,
-    save_path="data/processing/df_cleaned.csv",
-    sqlite_path=DB_PATH
-)
-print(f"Cleaned dataset has {len(df_cleaned)} rows")
-
-# Step 2: Iteratively generate valid samples
-pipeline = RealEstateTextToSQL(df_cleaned)
-validated_samples = []
-attempt = 0
-max_attempts = NUM_SAMPLES * 10
-
-while len(validated_samples) < NUM_SAMPLES and attempt < max_attempts:
-    attempt += 1
+    def accept(sample):
+        if writer is not None:
+            writer.write(sample)
+        else:
+            validated_samples.append(sample)
+        state["accepted"] += 1
+
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(df_cleaned, db_path))
+        map_fn = executor.map
+    else:
+        executor = None
+        init_worker(df_cleaned, db_path)
+        map_fn = map
+    run_shards = lambda ids, target: map_fn(
+        generate_shard, ids, [target] * len(ids), [seed] * len(ids), [constrained] * len(ids), [verify] * len(ids)
+    )
+
+    try:
+        while state["accepted"] < num_samples:
+            if not state["pending"]:
+                remaining = num_samples - state["accepted"]
+                num_shards = -(-remaining // SHARD_SIZE)
+                state["pending"] = list(range(state["next_shard"], state["next_shard"] + num_shards))
+                state["next_shard"] += num_shards
+                state["target"] = min(SHARD_SIZE, remaining)
+                state["round_added"] = 0
+
+            for shard_id, samples, attempts in run_shards(list(state["pending"]), state["target"]):
+                state["attempts"] += attempts
+                for sample in samples:
+                    if state["accepted"] >= num_samples or not dedup.add(sample["Question"], sample["SQL"]):
+                        continue
+                    accept(sample)
+                    state["round_added"] += 1
+                state["pending"].remove(shard_id)
+                state["rejected"] = dict(dedup.rejected)
+                if not state["pending"]:
+                    # A round of pure duplicates is normal near the end; only give up after several in a row
+                    state["idle_rounds"] = 0 if state["round_added"] else state["idle_rounds"] + 1
+                if writer is not None:
+                    writer.checkpoint(state)
+
+            if state["idle_rounds"] >= MAX_IDLE_ROUNDS:
+                print(f"[WARN] {MAX_IDLE_ROUNDS} rounds up to shard {state['next_shard'] - 1} produced no new samples, stopping early.")
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    for line in dedup.report():
+        print(line)
+    return validated_samples, state["attempts"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate Text-to-SQL training samples.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes for sample generation.")
+    parser.add_argument("--seed", type=int, default=SEED, help="Base seed; the same seed gives the same dataset for any worker count.")
+    parser.add_argument("--num-samples", type=int, default=NUM_SAMPLES, help="Number of valid samples to generate.")
+    parser.add_argument("--constrained", action="store_true", help="Pick thresholds from matching listings so queries are non-empty by construction.")
+    parser.add_argument("--verify", action="store_true", help="With --constrained, still execute each query on SQLite as an assertion.")
+    parser.add_argument("--stream", action="store_true", help="Append samples to {train,val,test}_text2sql.jsonl as they are accepted, split by question hash.")
+    parser.add_argument("--resume", action="store_true", help="With --stream, continue from the last checkpoint in the output folder.")
+    parser.add_argument("--near-dup-threshold", type=float, default=NEAR_DUP_THRESHOLD, help="Reject questions this similar to one already kept for the same SQL (1.0: exact only).")
+    parser.add_argument("--max-paraphrases", type=int, default=MAX_PARAPHRASES, help="Keep at most this many questions per distinct SQL.")
+    args = parser.parse_args()
+    if args.resume and not args.stream:
+        parser.error("--resume requires --stream (only streamed runs are checkpointed)")
+
+    # Step 1: Clean the raw CSV, unless the raw file and cleaning rules match the last run
+    df_cleaned = load_or_clean(
+        RAW_PATH,
+        save_path=CLEANED_CSV_PATH,
+        sqlite_path=DB_PATH,
+        parquet_path=CLEANED_PARQUET_PATH
+    )
+    print(f"Cleaned dataset has {len(df_cleaned)} rows")
+
+    # Step 2: Generate valid samples shard by shard
+    writer = StreamingDatasetWriter(OUTPUT_DIR, resume=args.resume) if args.stream else None
     try:
-        question, query, extras = pipeline.generator.generate_query(df_cleaned)
-        print(f"[TRY {attempt}] Question: {question}")
-        print(f"[TRY {attempt}] SQL: {query}")
-        if is_valid_sql(query, db_path=DB_PATH):
-            validated_samples.append({
-                "Question": question,
-                "SQL": query,
-                **extras
-            })
-    except Exception as e:
-        print(f"[SKIP] Error at attempt {attempt}: {e}")
-        continue
-
-print(f"Generated {len(validated_samples)} valid samples after {attempt} attempts")
-
-# Step 3: Split into train / val / test
-if len(validated_samples) == 0:
-    print("[ERROR] No valid samples were generated. Consider debugging generate_query() or relaxing conditions.")
-    exit(1)
-    
-train, temp = train_test_split(validated_samples, test_size=0.15, random_state=42)
-val, test = train_test_split(temp, test_size=1/3, random_state=42)
-
-print(f"Train set: {len(train)} samples")
-print(f"Validation set: {len(val)} samples")
-print(f"Test set: {len(test)} samples")
-
-# Save to files
-os.makedirs("data/processing", exist_ok=True)
-
-with open("data/processing/train_text2sql.json", "w", encoding="utf-8") as f:
-    json.dump(train, f, ensure_ascii=False, indent=2)
-with open("data/processing/val_text2sql.json", "w", encoding="utf-8") as f:
-    json.dump(val, f, ensure_ascii=False, indent=2)
-with open("data/processing/test_text2sql.json", "w", encoding="utf-8") as f:
-    json.dump(test, f, ensure_ascii=False, indent=2)
-
-print("Saved output files to data/processing")
\ No newline at end of file
+        validated_samples, attempt = generate_samples(
+            df_cleaned, args.num_samples, workers=args.workers, seed=args.seed,
+            constrained=args.constrained, verify=args.verify or not args.constrained, writer=writer,
+            dedup=Deduplicator(threshold=args.near_dup_threshold, max_paraphrases=args.max_paraphrases)
+        )
+    finally:
+        if writer is not None:
+            writer.close()
+
+    num_generated = len(writer) if writer is not None else len(validated_samples)
+    print(f"Generated {num_generated} valid samples after {attempt} attempts")
+    if attempt:
+        print(f"Accept ratio: {num_generated / attempt:.3f} ({attempt / max(num_generated, 1):.2f} attempts per sample)")
+
+    if writer is not None:
+        # Splits were assigned by question hash while streaming; nothing left to do
+        for line in writer.summary():
+            print(line)
+        return
+
+    # Step 3: Split into train / val / test
+    if len(validated_samples) == 0:
+        print("[ERROR] No valid samples were generated. Consider debugging generate_query() or relaxing conditions.")
+        exit(1)
+
+    train, temp = train_test_split(validated_samples, test_size=0.15, random_state=42)
+    val, test = train_test_split(temp, test_size=1/3, random_state=42)
+
+    print(f"Train set: {len(train)} samples")
+    print(f"Validation set: {len(val)} samples")
+    print(f"Test set: {len(test)} samples")
+
+    # Save to files
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    with open(f"{OUTPUT_DIR}/train_text2sql.json", "w", encoding="utf-8") as f:
+        json.dump(train, f, ensure_ascii=False, indent=2)
+    with open(f"{OUTPUT_DIR}/val_text2sql.json", "w", encoding="utf-8") as f:
+        json.dump(val, f, ensure_ascii=False, indent=2)
+    with open(f"{OUTPUT_DIR}/test_text2sql.json", "w", encoding="utf-8") as f:
+        json.dump(test, f, ensure_ascii=False, indent=2)
+
+    print(f"Saved output files to {OUTPUT_DIR}")
+
+if __name__ == "__main__":
+    main()
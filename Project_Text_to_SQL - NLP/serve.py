@@ -0,0 +1,76 @@
+"""
+File: serve.py
+
+Purpose:
+    Start the asynchronous Text-to-SQL HTTP API (realestate_text_to_sql_modules.http_service).
+
+Steps:
+    1. Warm start (realestate_text_to_sql_modules.warm_start): flattened locations, location matcher
+       and parsed schema from the versioned cache (`model/warm_start.pkl`, rebuilt when
+       `locations.json` or the schema changes), the model (PyTorch checkpoint, mapped from
+       safetensors when available, or ONNX export) behind an InferenceEngine, which groups concurrent
+       requests into micro-batches on its own thread, and one warm-up query. The time to first query
+       is printed before the port opens.
+    2. Serve POST /sql, POST /query and GET /health on an aiohttp event loop. At most
+       --max-pending requests are in flight (the rest get 503), each one is cut off after --timeout
+       seconds (504), and SQLite reads run on --db-workers threads.
+    3. On SIGINT / SIGTERM, stop accepting requests, let the in-flight ones finish and close the engine.
+
+Usage:
+    python serve.py
+    python serve.py --port 8080 --max-batch-size 16 --max-wait-ms 10 --max-pending 64 --timeout 10
+    python serve.py --backend onnx --model-dir model/Final_model_onnx_int8 --constrained
+    python serve.py --safetensors       # convert a pytorch_model.bin checkpoint once, then map it
+"""
+
+import argparse
+
+from aiohttp import web
+
+from realestate_text_to_sql_modules.http_service import (
+    DB_WORKERS,
+    MAX_PENDING,
+    MAX_ROWS,
+    REQUEST_TIMEOUT,
+    Text2SQLService,
+    create_app,
+)
+from realestate_text_to_sql_modules.inference_engine import MAX_BATCH_SIZE, MAX_WAIT_MS, MODEL_DIR
+from realestate_text_to_sql_modules.sql_utils import DEFAULT_DB_PATH
+from realestate_text_to_sql_modules.warm_start import (
+    NESTED_LOCATIONS_PATH,
+    WARM_CACHE_PATH,
+    ensure_safetensors,
+    warm_start_engine,
+)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ViT5 Text-to-SQL model over HTTP.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Checkpoint (torch) or export directory (onnx).")
+    parser.add_argument("--backend", choices=["torch", "onnx"], default="torch")
+    parser.add_argument("--constrained", action="store_true", help="Grammar-constrained decoding.")
+    parser.add_argument("--safetensors", action="store_true", help="Convert a pytorch_model.bin checkpoint to safetensors first.")
+    parser.add_argument("--locations-path", default=NESTED_LOCATIONS_PATH, help="Nested locations.json (or a flattened file).")
+    parser.add_argument("--warm-cache", default=WARM_CACHE_PATH, help="Versioned cache of the derived artifacts.")
+    parser.add_argument("--db-path", default=DEFAULT_DB_PATH, help="SQLite database queried by /query.")
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    parser.add_argument("--max-pending", type=int, default=MAX_PENDING, help="In-flight requests before answering 503.")
+    parser.add_argument("--timeout", type=float, default=REQUEST_TIMEOUT, help="Seconds before a request gets 504.")
+    parser.add_argument("--db-workers", type=int, default=DB_WORKERS, help="Threads for SQLite reads.")
+    parser.add_argument("--max-rows", type=int, default=MAX_ROWS, help="Row limit of /query results.")
+    args = parser.parse_args()
+
+    if args.safetensors and args.backend == "torch":
+        ensure_safetensors(args.model_dir)
+    engine, _ = warm_start_engine(model_dir=args.model_dir, backend=args.backend, constrained=args.constrained,
+                                  locations_path=args.locations_path, cache_path=args.warm_cache,
+                                  max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    service = Text2SQLService(engine, db_path=args.db_path, max_pending=args.max_pending,
+                              request_timeout=args.timeout, db_workers=args.db_workers, max_rows=args.max_rows)
+    web.run_app(create_app(service), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+File: tokenize_datasets.py
+
+Purpose:
+    Tokenization stage before training / evaluation: writes the tokenized Text-to-SQL splits as
+    memory-mapped Arrow shards (realestate_text_to_sql_modules.tokenized_cache) so the phase
+    notebooks and scripts load them instead of re-running tokenize_fn on every run.
+
+Steps:
+    1. Load the tokenizer of --model-dir.
+    2. For each split, compute the cache key (dataset content, tokenizer, input template, max
+       lengths) and tokenize it only when `data/tokenized/` has no entry for that key.
+    3. Print rows, columns and time per split, and whether the cached shards were reused.
+
+Usage:
+    python tokenize_datasets.py
+    python tokenize_datasets.py --model-dir model/Phase1_CEonly data/processing/phase1/train_text2sql.json data/processing/phase1/val_text2sql.json
+    python tokenize_datasets.py --padded --rebuild
+"""
+
+import argparse
+import time
+
+from transformers import T5Tokenizer
+
+from realestate_text_to_sql_modules.inference_engine import MODEL_DIR
+from realestate_text_to_sql_modules.tokenized_cache import TOKENIZED_CACHE_DIR, load_tokenized
+from realestate_text_to_sql_modules.training_data import MAX_INPUT_LENGTH, MAX_TARGET_LENGTH
+
+SPLITS = [
+    "data/processing/phase2/train_text2sql.json",
+    "data/processing/phase2/val_text2sql.json",
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-tokenize Text-to-SQL splits into a versioned Arrow cache.")
+    parser.add_argument("splits", nargs="*", default=SPLITS, help="Text-to-SQL JSON splits (Question / Schema / SQL).")
+    parser.add_argument("--model-dir", default=MODEL_DIR, help="Checkpoint whose tokenizer is used.")
+    parser.add_argument("--cache-dir", default=TOKENIZED_CACHE_DIR)
+    parser.add_argument("--max-input-length", type=int, default=MAX_INPUT_LENGTH)
+    parser.add_argument("--max-target-length", type=int, default=MAX_TARGET_LENGTH)
+    parser.add_argument("--padded", action="store_true", help="Notebook-style max_length padding.")
+    parser.add_argument("--rebuild", action="store_true", help="Re-tokenize even if a matching cache exists.")
+    args = parser.parse_args()
+
+    tokenizer = T5Tokenizer.from_pretrained(args.model_dir)
+    for split in args.splits:
+        start = time.perf_counter()
+        dataset, from_cache = load_tokenized(split, tokenizer, cache_dir=args.cache_dir,
+                                             max_input_length=args.max_input_length,
+                                             max_target_length=args.max_target_length,
+                                             padded=args.padded, rebuild=args.rebuild)
+        status = "cached" if from_cache else "tokenized"
+        print(f"[INFO] {split}: {len(dataset)} rows {dataset.column_names} "
+              f"{status} in {time.perf_counter() - start:.2f}s")
+
+if __name__ == "__main__":
+    main()